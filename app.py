@@ -3,40 +3,570 @@
 A Flask application to serve the GCP IAM audit dashboard.
 
 This version is refactored to run as a stateless service (e.g., on Cloud Run).
-It reads its data from a Google Cloud Storage (GCS) bucket instead of the
-local filesystem. The bucket name must be provided via the GCS_BUCKET_NAME
-environment variable.
+It reads its data from a Google Cloud Storage (GCS) bucket when the
+GCS_BUCKET_NAME environment variable is set. Otherwise it serves the reports
+written by `summary.py` from a local directory (DATA_DIR, default
+'scripts/json'), which is watched for changes and reloaded without a restart.
 """
 import os
 import json
-from flask import Flask, jsonify, render_template, abort
+import gzip
+import mmap
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, jsonify, render_template, request, abort
 from google.cloud import storage
 from google.api_core.exceptions import NotFound
+from werkzeug.exceptions import HTTPException
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from scripts.permission_index import PermissionIndex, PERMISSION_INDEX_FILENAME, keys_by_role, who_can, user_permissions
+from scripts.access_history import AccessHistory, COLUMNS as HISTORY_COLUMNS, DATE_PATTERN
 
 # ==============================================================================
 # 1. INITIALISATION & CONFIGURATION
 # ==============================================================================
 app = Flask(__name__)
 
-# --- GCS Configuration ---
-# Initialize the GCS client. It will automatically use the runtime
-# service account's credentials when deployed on GCP.
-try:
-    GCS_BUCKET_NAME = os.environ.get('GCS_BUCKET_NAME')
-    storage_client = storage.Client() if GCS_BUCKET_NAME else None
-except Exception as e:
-    # This might fail in a local environment without gcloud setup,
-    # but is essential for cloud deployment.
-    print(f"Warning: Could not initialize GCS client. App will not work without it. Error: {e}")
-    storage_client = None
-    GCS_BUCKET_NAME = None
+# --- Data Source Configuration ---
+# With GCS_BUCKET_NAME, the data is read from GCS. Otherwise it is read from
+# DATA_DIR on local disk (the json/ output directory of `summary.py`).
+GCS_BUCKET_NAME = os.environ.get('GCS_BUCKET_NAME')
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'json'))
+
+# --- Data Cache Configuration ---
+# The datasets change about once a day, so requests are served from memory and
+# GCS is only asked for object metadata (generations) every DATA_CACHE_TTL_SECONDS.
+DATA_CACHE_TTL_SECONDS = int(os.environ.get('DATA_CACHE_TTL_SECONDS', 60))
+# The local directory is polled in the background every DATA_POLL_SECONDS
+# instead, so requests never wait for a check.
+DATA_POLL_SECONDS = float(os.environ.get('DATA_POLL_SECONDS', 2))
+
+# --- History Configuration ---
+# The history store written by `summary.py --history-dir` (see
+# scripts/access_history.py). It is read from local (or mounted) disk.
+HISTORY_DIR = os.environ.get('HISTORY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'history'))
+
+JSON_FILES = {
+    'effective': 'effective_access_by_role_project.json',
+    'direct': 'user_direct_access.json',
+    'membership': 'user_group_membership.json',
+    'groupAccess': 'group_access_summary.json',
+    'summary': 'numerical_summary.json',
+    'userDetails': 'user_effective_access_details.json'
+}
+
+# Optional pre-merged bundle published by `summary.py --bundle`. When the gzip
+# bundle is present in the bucket it replaces the individual files above and is
+# served as-is to clients that accept its encoding.
+BUNDLE_FILES = {
+    'gzip': 'dashboard_bundle.json.gz',
+    'br': 'dashboard_bundle.json.br'
+}
+
+# Optional permission index compiled by `scripts/permission_index.py compile`,
+# optional analytics written by `summary.py --analytics`, and the per-day log
+# activity written by `summary.py --log-store`. They are loaded next to the
+# datasets (or the bundle) when present in the bucket.
+OPTIONAL_FILES = {
+    'permissions': PERMISSION_INDEX_FILENAME,
+    'analytics': 'access_analytics.json',
+    'activity': 'log_activity_by_day.json'
+}
+
+# Maps the /api/analytics/<section> lists to their key in access_analytics.json.
+ANALYTICS_SECTIONS = {
+    'redundant-grants': 'redundant_direct_grants',
+    'similar-groups': 'similar_groups',
+    'identical-profiles': 'identical_profiles'
+}
+
+# Maps the /stats/<stat_name> pages to their dictionary in numerical_summary.json.
+STAT_KEYS = {
+    'users-per-role-project': 'users_per_role_project_count',
+    'members-per-group': 'members_per_group',
+    'access-per-group': 'access_count_per_group',
+    'direct-access-count': 'direct_access_count_by_user',
+    'groups-per-user': 'groups_per_user'
+}
+
+# Pagination defaults for the query API.
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+# NDJSON streams are flushed in chunks of this size. The first chunk is small
+# so that the browser can render the first rows right away.
+STREAM_FIRST_CHUNK_BYTES = 4 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# --- Metrics ---
+# Exposed in the Prometheus text format on /metrics. The cache hit ratio is
+# hit / sum(lookups): 'revalidated' lookups cost a GCS listing, 'miss' ones a
+# full download, and 'stale' ones served old data while GCS was busy or down.
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+REQUEST_LATENCY = Histogram('iam_dashboard_request_duration_seconds', 'Request latency.', ['route', 'method', 'status'])
+RESPONSE_SIZE = Histogram('iam_dashboard_response_size_bytes', 'Response body size.', ['route'], buckets=SIZE_BUCKETS)
+GCS_FETCH_LATENCY = Histogram('iam_dashboard_gcs_fetch_duration_seconds', 'Duration of GCS calls.', ['operation'])
+GCS_DOWNLOADED_BYTES = Counter('iam_dashboard_gcs_downloaded_bytes', 'Bytes downloaded from GCS.')
+CACHE_LOOKUPS = Counter('iam_dashboard_data_cache_lookups', 'Data cache lookups by result.', ['result'])
+SNAPSHOT_SIZE = Gauge('iam_dashboard_snapshot_size_bytes', 'Size of the serialized /api/data body.', ['encoding'])
+
+
+# ==============================================================================
+# 2. DATA BACKENDS
+# Where the data files are read from. A backend lists the version of each file
+# (a cheap metadata call) and reads one file at the exact version listed.
+# ==============================================================================
+
+class GCSBackend:
+    """Data files stored as objects of a GCS bucket, versioned by generation."""
+
+    def __init__(self, client, bucket_name):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.description = f"GCS bucket '{bucket_name}'"
+
+    def list_versions(self, wanted):
+        bucket = self.client.bucket(self.bucket_name)
+        with GCS_FETCH_LATENCY.labels('list').time():
+            return {blob.name: blob.generation for blob in bucket.list_blobs(fields='items(name,generation),nextPageToken')
+                    if blob.name in wanted}
+
+    def read(self, filename, version):
+        with GCS_FETCH_LATENCY.labels('download').time():
+            data = self.client.bucket(self.bucket_name).blob(filename, generation=version).download_as_bytes()
+        GCS_DOWNLOADED_BYTES.inc(len(data))
+        return data
+
+
+class LocalBackend:
+    """
+    Data files in a local directory, versioned by (mtime, size).
+
+    Files are memory-mapped to be read in a single pass. A file replaced
+    between the listing and the read is reported as missing, so that a
+    snapshot never mixes versions.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.description = f"local directory '{directory}'"
+
+    def list_versions(self, wanted):
+        versions = {}
+        for filename in wanted:
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                continue
+            versions[filename] = (stat.st_mtime_ns, stat.st_size)
+        return versions
+
+    def read(self, filename, version):
+        with open(os.path.join(self.directory, filename), 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if (stat.st_mtime_ns, stat.st_size) != tuple(version):
+                raise NotFound(f"'{filename}' changed since it was listed")
+            if stat.st_size == 0:
+                return b''
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:]
+
+
+def create_backend():
+    """Returns the GCS backend if GCS_BUCKET_NAME is set, the local directory backend otherwise."""
+    if not GCS_BUCKET_NAME:
+        print(f"GCS_BUCKET_NAME is not set, serving data from the local directory '{DATA_DIR}'.")
+        return LocalBackend(DATA_DIR)
+    try:
+        # The client automatically uses the runtime service account's credentials on GCP.
+        return GCSBackend(storage.Client(), GCS_BUCKET_NAME)
+    except Exception as e:
+        # This might fail in a local environment without gcloud setup,
+        # but is essential for cloud deployment.
+        print(f"Warning: Could not initialize GCS client. App will not work without it. Error: {e}")
+        return None
+
+
+data_backend = create_backend()
+
+
+# ==============================================================================
+# 3. DATA CACHE
+# A process-wide cache of the parsed datasets and of the serialized API
+# response, keyed on the version (e.g. GCS generation) of every data file.
+# ==============================================================================
+
+class DataSnapshot:
+    """
+    An immutable set of parsed datasets loaded from one set of file versions.
+
+    `bodies` holds the serialized /api/data response per content encoding
+    ('identity', 'gzip' and optionally 'br'), and `etag` is a strong validator
+    derived from the uncompressed body.
+    """
+
+    def __init__(self, generations, datasets, bodies, indexes):
+        self.generations = generations
+        self.datasets = datasets
+        self.bodies = bodies
+        self.etag = hashlib.sha256(bodies['identity']).hexdigest()[:32]
+        self.indexes = indexes
+        self.checked_at = time.monotonic()
+
+    def touched(self):
+        """Returns a copy of this snapshot with a fresh `checked_at`."""
+        return DataSnapshot(self.generations, self.datasets, self.bodies, self.indexes)
+
+
+class SearchIndex:
+    """A sorted list of items with pre-lowercased search keys for filtering."""
+
+    def __init__(self, items, keys):
+        self.items = items
+        self.keys = keys
+
+    def search(self, query):
+        """Returns the items whose search key contains `query` (case-insensitive)."""
+        query = query.strip().lower()
+        if not query:
+            return self.items
+        return [item for item, key in zip(self.items, self.keys) if query in key]
+
+
+def check_datasets(datasets):
+    """Aborts if a dataset does not have the shape written by `summary.py`."""
+    for key, filename in JSON_FILES.items():
+        dataset = datasets[key]
+        if not isinstance(dataset, dict):
+            abort(500, description=f"Format error in data file: {filename} (expected a JSON object)")
+        if key in ('membership', 'effective', 'direct', 'userDetails'):
+            if not all(isinstance(value, list) for value in dataset.values()):
+                abort(500, description=f"Format error in data file: {filename} (expected lists as values)")
+    if not all(isinstance(group, str) for groups in datasets['membership'].values() for group in groups):
+        abort(500, description=f"Format error in data file: {JSON_FILES['membership']} (expected group emails)")
+    if not all(isinstance(user, str) for users in datasets['effective'].values() for user in users):
+        abort(500, description=f"Format error in data file: {JSON_FILES['effective']} (expected user emails)")
+
+
+def build_indexes(datasets):
+    """Builds the server-side lookup structures once per data load."""
+    check_datasets(datasets)
+    membership = datasets['membership']
+
+    members_by_group = {}
+    for user, groups in membership.items():
+        for group in groups:
+            members_by_group.setdefault(group, []).append(user)
+    for members in members_by_group.values():
+        members.sort()
+
+    users = sorted(set(membership) | set(datasets['direct']) | set(datasets['userDetails']))
+    groups = sorted(set(datasets['groupAccess']) | set(members_by_group))
+
+    effective_rows = []
+    effective_keys = []
+    for key, key_users in datasets['effective'].items():
+        role, _, project = key.partition('@')
+        effective_rows.append({'role': role, 'project': project, 'users': key_users})
+        effective_keys.append(f"{role}\n{project}\n{', '.join(key_users)}".lower())
+
+    return {
+        'users': SearchIndex(users, [u.lower() for u in users]),
+        'groups': SearchIndex(groups, [g.lower() for g in groups]),
+        'effective': SearchIndex(effective_rows, effective_keys),
+        'effective_keys_by_role': keys_by_role(datasets['effective']),
+        'members_by_group': members_by_group,
+    }
+
+
+class DataCache:
+    """
+    Thread-safe cache of the dashboard data.
+
+    A snapshot is trusted for `ttl` seconds. After that, a single thread checks
+    the file versions (e.g. a metadata-only GCS listing) and downloads the
+    files again only if one of them changed. While that refresh is running,
+    other threads keep serving the previous snapshot instead of queueing up.
+
+    With `watch`, the checks run in a background thread instead, and `ttl`
+    can be infinite.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+        self._stop_watching = threading.Event()
+        self._watcher = None
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.checked_at < self.ttl:
+            CACHE_LOOKUPS.labels('hit').inc()
+            return snapshot
+
+        # Collapse concurrent refreshes: only one thread talks to GCS, the
+        # others return the stale snapshot if there is one, or wait for it.
+        if snapshot is not None and not self._refresh_lock.acquire(blocking=False):
+            CACHE_LOOKUPS.labels('stale').inc()
+            return snapshot
+        if snapshot is None:
+            self._refresh_lock.acquire()
+        try:
+            current = self._snapshot
+            if current is not snapshot and current is not None:
+                CACHE_LOOKUPS.labels('hit').inc()
+                return current
+            self._snapshot = self._refresh(current)
+            return self._snapshot
+        finally:
+            self._refresh_lock.release()
+
+    def watch(self, interval):
+        """
+        Polls the file versions every `interval` seconds in a daemon thread, and
+        swaps in the new data once the versions are the same in two polls in a
+        row, so that files still being written by `summary.py` are not loaded.
+        If a load fails, the previous snapshot is kept.
+        """
+        def poll():
+            seen = None
+            failed = None
+            last_error = None
+            while not self._stop_watching.wait(interval):
+                try:
+                    with app.app_context():
+                        generations = fetch_generations(get_backend())
+                        snapshot = self._snapshot
+                        if generations != seen:
+                            seen = generations
+                        elif generations != failed and (snapshot is None or generations != snapshot.generations):
+                            # Broken files are not loaded again until they change.
+                            failed = generations
+                            with self._refresh_lock:
+                                self._snapshot = self._refresh(self._snapshot)
+                            failed = None
+                    last_error = None
+                except Exception as e:
+                    # The previous snapshot stays in place. Report each problem
+                    # once, not on every poll.
+                    error = e.description if isinstance(e, HTTPException) else repr(e)
+                    if error != last_error:
+                        print(f"Warning: Could not reload the dashboard data. Error: {error}")
+                    last_error = error
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=poll, name='data-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        """Stops the watcher thread and waits for its current poll to finish."""
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _refresh(self, current):
+        try:
+            backend = get_backend()
+            generations = fetch_generations(backend)
+        except HTTPException as e:
+            if current is None:
+                raise
+            # Keep serving the last good snapshot if the backend is temporarily unreachable.
+            print(f"Warning: Could not check data generations, serving cached data. Error: {e.description}")
+            CACHE_LOOKUPS.labels('stale').inc()
+            return current.touched()
+
+        if current is not None and generations == current.generations:
+            CACHE_LOOKUPS.labels('revalidated').inc()
+            return current.touched()
+
+        CACHE_LOOKUPS.labels('miss').inc()
+
+        print(f"Loading dashboard data from {backend.description} (versions: {generations})")
+        if BUNDLE_FILES['gzip'] in generations:
+            bodies = download_bundle(backend, generations)
+            datasets = parse_bundle(bodies['identity'])
+        else:
+            datasets = download_datasets(backend, generations)
+            payload = app.json.dumps(datasets).encode('utf-8')
+            bodies = {'identity': payload, 'gzip': gzip.compress(payload, mtime=0)}
+        for encoding, body in bodies.items():
+            SNAPSHOT_SIZE.labels(encoding).set(len(body))
+        indexes = build_indexes(datasets)
+        indexes['permissions'] = download_permission_index(backend, generations)
+        indexes['analytics'] = download_analytics(backend, generations)
+        indexes['activity'] = download_log_activity(backend, generations)
+        return DataSnapshot(generations, datasets, bodies, indexes)
+
+
+def get_backend():
+    """Returns the configured data backend, aborting if none is available."""
+    if data_backend is None:
+        abort(500, description="FATAL: The GCS client for GCS_BUCKET_NAME failed to initialize.")
+    return data_backend
+
+
+def fetch_generations(backend):
+    """
+    Returns {filename: version} for the data files, using a single metadata listing.
+
+    If the gzip bundle exists, only the bundle objects (and optional files) are returned.
+    """
+    wanted = set(JSON_FILES.values()) | set(BUNDLE_FILES.values()) | set(OPTIONAL_FILES.values())
+    try:
+        generations = backend.list_versions(wanted)
+    except Exception as e:
+        abort(500, description=f"Could not list the data files in {backend.description}. Error: {e}")
+
+    if BUNDLE_FILES['gzip'] in generations:
+        return {name: gen for name, gen in generations.items() if name not in JSON_FILES.values()}
+
+    for filename in JSON_FILES.values():
+        if filename not in generations:
+            abort(404, description=f"Data file '{filename}' not found in {backend.description}.")
+    return generations
+
+
+def download_blob(backend, filename, generation):
+    """Reads one data file at the exact version that was listed."""
+    try:
+        return backend.read(filename, generation)
+    except (NotFound, FileNotFoundError):
+        abort(404, description=f"Data file '{filename}' not found in {backend.description}.")
+    except Exception as e:
+        abort(500, description=f"An unexpected error occurred while reading '{filename}': {e}")
+
+
+def download_datasets(backend, generations):
+    """Downloads the data files concurrently and parses them."""
+    def fetch(item):
+        key, filename = item
+        data_string = download_blob(backend, filename, generations[filename])
+        try:
+            return key, json.loads(data_string)
+        except json.JSONDecodeError:
+            abort(500, description=f"Format error in data file: {filename}")
+
+    with ThreadPoolExecutor(max_workers=len(JSON_FILES)) as executor:
+        return dict(executor.map(fetch, JSON_FILES.items()))
+
+
+def download_bundle(backend, generations):
+    """Downloads the pre-compressed bundle(s) and returns the bodies per content encoding."""
+    encodings = [encoding for encoding, filename in BUNDLE_FILES.items() if filename in generations]
+    with ThreadPoolExecutor(max_workers=len(encodings)) as executor:
+        bodies = dict(zip(encodings, executor.map(
+            lambda encoding: download_blob(backend, BUNDLE_FILES[encoding], generations[BUNDLE_FILES[encoding]]),
+            encodings)))
+    try:
+        bodies['identity'] = gzip.decompress(bodies['gzip'])
+    except (OSError, EOFError):
+        abort(500, description=f"Format error in data file: {BUNDLE_FILES['gzip']}")
+    return bodies
+
+
+def download_permission_index(backend, generations):
+    """Downloads the optional permission index, or returns None if it is not in the backend."""
+    filename = OPTIONAL_FILES['permissions']
+    if filename not in generations:
+        return None
+    try:
+        return PermissionIndex.from_json(json.loads(download_blob(backend, filename, generations[filename])))
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError, AttributeError):
+        abort(500, description=f"Format error in data file: {filename}")
+
+
+def download_analytics(backend, generations):
+    """
+    Downloads the optional analytics dataset and indexes its lists for
+    filtering, or returns None if it is not in the backend.
+    """
+    filename = OPTIONAL_FILES['analytics']
+    if filename not in generations:
+        return None
+    try:
+        analytics = json.loads(download_blob(backend, filename, generations[filename]))
+        redundant = analytics[ANALYTICS_SECTIONS['redundant-grants']]
+        similar = analytics[ANALYTICS_SECTIONS['similar-groups']]
+        identical = analytics[ANALYTICS_SECTIONS['identical-profiles']]
+        return {
+            'summary': analytics.get('summary', {}),
+            'redundant-grants': SearchIndex(redundant, [
+                f"{grant['user']}\n{grant['role']}\n{grant['project']}\n{' '.join(grant['covered_by'])}".lower() for grant in redundant]),
+            'similar-groups': SearchIndex(similar, ['\n'.join(pair['groups']).lower() for pair in similar]),
+            'identical-profiles': SearchIndex(identical, [
+                '\n'.join(profile['users'] + profile['access']).lower() for profile in identical]),
+        }
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+        abort(500, description=f"Format error in data file: {filename}")
+
+
+def download_log_activity(backend, generations):
+    """
+    Downloads the optional per-day log activity ({user: {project: {day: count}}}),
+    or returns None if it is not in the backend.
+    """
+    filename = OPTIONAL_FILES['activity']
+    if filename not in generations:
+        return None
+    try:
+        activity = json.loads(download_blob(backend, filename, generations[filename]))
+        if not all(isinstance(days, dict) for projects in activity.values() for days in projects.values()):
+            raise TypeError(filename)
+        return activity
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        abort(500, description=f"Format error in data file: {filename}")
+
+
+def parse_bundle(payload):
+    """Parses the bundle body and checks that it contains every dataset."""
+    try:
+        datasets = json.loads(payload)
+    except json.JSONDecodeError:
+        abort(500, description=f"Format error in data file: {BUNDLE_FILES['gzip']}")
+    missing = [key for key in JSON_FILES if key not in datasets]
+    if missing:
+        abort(500, description=f"Data bundle '{BUNDLE_FILES['gzip']}' is missing datasets: {', '.join(missing)}")
+    return datasets
+
+
+if isinstance(data_backend, LocalBackend):
+    data_cache = DataCache(float('inf'))
+    data_cache.watch(DATA_POLL_SECONDS)
+else:
+    data_cache = DataCache(DATA_CACHE_TTL_SECONDS)
 
 
 # ==============================================================================
-# 2. FLASK ROUTES
+# 4. FLASK ROUTES
 # Each function corresponds to a page of the application.
 # ==============================================================================
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    if 'request_start' in g:
+        REQUEST_LATENCY.labels(route, request.method, response.status_code).observe(time.perf_counter() - g.request_start)
+    if response.content_length is not None:
+        RESPONSE_SIZE.labels(route).observe(response.content_length)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics of this process."""
+    return Response(generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
 @app.route('/')
 def effective_access_view():
     return render_template('effective_access.html', page='effective-access')
@@ -53,13 +583,13 @@ def by_group_view():
 def user_details_view():
     return render_template('user_details.html', page='user-details')
 
+@app.route('/analytics')
+def analytics_view():
+    return render_template('analytics.html', page='analytics')
+
 @app.route('/stats/<stat_name>')
 def summary_view(stat_name):
-    valid_stats = [
-        'users-per-role-project', 'members-per-group', 'access-per-group',
-        'direct-access-count', 'groups-per-user'
-    ]
-    if stat_name not in valid_stats:
+    if stat_name not in STAT_KEYS:
         abort(404)
 
     titles = {
@@ -76,43 +606,247 @@ def summary_view(stat_name):
 @app.route('/api/data')
 def get_all_data():
     """
-    [MODIFIED] Loads all necessary JSON data from the GCS bucket and
-    returns it as a single API response.
+    Returns all dashboard datasets as a single API response.
+
+    The response body is serialized (and compressed) once per data load and
+    served from the in-process cache. Browsers that already hold the current
+    snapshot get a `304 Not Modified` thanks to the strong ETag.
     """
-    if not GCS_BUCKET_NAME or not storage_client:
-        abort(500, description="FATAL: GCS_BUCKET_NAME environment variable is not set or client failed to initialize.")
+    snapshot = data_cache.get()
+    encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in snapshot.bodies])
+    response = Response(snapshot.bodies[encoding or 'identity'], mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f"{snapshot.etag}-{encoding}")
+    else:
+        response.set_etag(snapshot.etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# --- Query API ---
+# Granular endpoints so that each page only fetches what it renders. They are
+# answered from the indexes built once per data load.
+
+def paginate(items, **extra):
+    """Slices `items` according to the `offset` and `limit` query parameters."""
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_LIMIT, type=int), 0), MAX_PAGE_LIMIT)
+    return jsonify(dict(extra, **{
+        'total': len(items),
+        'offset': offset,
+        'limit': limit,
+        'items': items[offset:offset + limit]
+    }))
+
 
-    json_files = {
-        'effective': 'effective_access_by_role_project.json',
-        'direct': 'user_direct_access.json',
-        'membership': 'user_group_membership.json',
-        'groupAccess': 'group_access_summary.json',
-        'summary': 'numerical_summary.json',
-        'userDetails': 'user_effective_access_details.json'
+@app.route('/api/users')
+def list_users():
+    index = data_cache.get().indexes['users']
+    return paginate(index.search(request.args.get('filter', '')))
+
+
+def user_record(datasets, email):
+    return {
+        'email': email,
+        'direct': datasets['direct'].get(email, []),
+        'groups': datasets['membership'].get(email, []),
+        'effective': datasets['userDetails'].get(email, []),
+        'logCounts': datasets['summary'].get('log_counts_by_user', {}).get(email, {})
     }
-    all_json_data = {}
 
-    try:
-        bucket = storage_client.bucket(GCS_BUCKET_NAME)
-    except Exception as e:
-        abort(500, description=f"Could not connect to GCS bucket '{GCS_BUCKET_NAME}'. Error: {e}")
 
-    for key, filename in json_files.items():
-        try:
-            blob = bucket.blob(filename)
-            data_string = blob.download_as_string()
-            all_json_data[key] = json.loads(data_string)
-        except NotFound:
-            abort(404, description=f"Data file '{filename}' not found in GCS bucket '{GCS_BUCKET_NAME}'.")
-        except json.JSONDecodeError:
-            abort(500, description=f"Format error in data file: {filename}")
-        except Exception as e:
-            abort(500, description=f"An unexpected error occurred while reading '{filename}': {e}")
+@app.route('/api/users/<email>')
+def get_user(email):
+    snapshot = data_cache.get()
+    datasets = snapshot.datasets
+    if email not in datasets['membership'] and email not in datasets['direct'] and email not in datasets['userDetails']:
+        abort(404, description=f"User '{email}' not found.")
+    return jsonify(user_record(datasets, email))
+
+
+@app.route('/api/groups')
+def list_groups():
+    index = data_cache.get().indexes['groups']
+    return paginate(index.search(request.args.get('filter', '')))
+
+
+@app.route('/api/groups/<email>')
+def get_group(email):
+    snapshot = data_cache.get()
+    access = snapshot.datasets['groupAccess'].get(email)
+    members = snapshot.indexes['members_by_group'].get(email)
+    if access is None and members is None:
+        abort(404, description=f"Group '{email}' not found.")
+    return jsonify({'email': email, 'access': access or [], 'members': members or []})
+
+
+@app.route('/api/effective')
+def list_effective_access():
+    index = data_cache.get().indexes['effective']
+    return paginate(index.search(request.args.get('filter', '')))
+
+
+# --- Streaming API ---
+# Whole (filtered) collections as newline-delimited JSON, one record per line.
+# Records are serialized lazily from the cached snapshot while the response is
+# sent, so a request never holds more than one chunk of output in memory.
+
+def ndjson_stream(records):
+    """Serializes `records` as NDJSON, yielding chunks of about STREAM_CHUNK_BYTES."""
+    chunk = []
+    size = 0
+    limit = STREAM_FIRST_CHUNK_BYTES
+    for record in records:
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= limit:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+            limit = STREAM_CHUNK_BYTES
+    if chunk:
+        yield ''.join(chunk)
+
+
+@app.route('/api/stream/<dataset>')
+def stream_dataset(dataset):
+    """
+    Streams the effective access rows (`effective`) or the user records
+    (`users`) matching `?filter=`. `X-Total-Count` gives the number of records.
+    """
+    snapshot = data_cache.get()
+    query = request.args.get('filter', '')
+    if dataset == 'effective':
+        items = snapshot.indexes['effective'].search(query)
+        records = iter(items)
+    elif dataset == 'users':
+        items = snapshot.indexes['users'].search(query)
+        records = (user_record(snapshot.datasets, email) for email in items)
+    else:
+        abort(404)
+    response = Response(ndjson_stream(records), mimetype='application/x-ndjson')
+    response.headers['X-Total-Count'] = str(len(items))
+    response.cache_control.no_cache = True
+    return response
+
+
+def get_permission_index(snapshot):
+    index = snapshot.indexes.get('permissions')
+    if index is None:
+        abort(404, description=f"Permission index '{OPTIONAL_FILES['permissions']}' not found in {get_backend().description}.")
+    return index
+
+
+@app.route('/api/permissions/<permission>')
+def get_permission_holders(permission):
+    """Who holds `permission`, optionally on one project (`?project=`)."""
+    snapshot = data_cache.get()
+    index = get_permission_index(snapshot)
+    return jsonify(who_can(index, permission, snapshot.datasets['effective'], request.args.get('project') or None,
+                           snapshot.indexes['effective_keys_by_role']))
+
+
+@app.route('/api/users/<email>/permissions')
+def get_user_permissions(email):
+    """The effective permissions of a user per project, optionally on one project (`?project=`)."""
+    snapshot = data_cache.get()
+    index = get_permission_index(snapshot)
+    details = snapshot.datasets['userDetails'].get(email)
+    if details is None:
+        abort(404, description=f"User '{email}' not found.")
+    result = user_permissions(index, details, request.args.get('project') or None)
+    return jsonify(dict(result, email=email))
 
-    return jsonify(all_json_data)
+
+@app.route('/api/users/<email>/activity')
+def get_user_activity(email):
+    """Daily log entry counts of a user per project, over the log counting window."""
+    activity = data_cache.get().indexes.get('activity')
+    if activity is None:
+        abort(404, description=f"Daily log activity '{OPTIONAL_FILES['activity']}' not found in {get_backend().description}. Run summary.py with --log-store.")
+    projects = activity.get(email)
+    if projects is None:
+        abort(404, description=f"User '{email}' not found.")
+    days = sorted(set().union(*projects.values())) if projects else []
+    return jsonify({'email': email, 'days': days, 'projects': projects})
+
+
+def get_analytics(snapshot):
+    analytics = snapshot.indexes.get('analytics')
+    if analytics is None:
+        abort(404, description=f"Analytics '{OPTIONAL_FILES['analytics']}' not found in {get_backend().description}. Run summary.py with --analytics.")
+    return analytics
+
+
+@app.route('/api/analytics')
+def get_analytics_summary():
+    """Counts of redundant direct grants, near-duplicate groups and identical access profiles."""
+    return jsonify(get_analytics(data_cache.get())['summary'])
+
+
+@app.route('/api/analytics/<section>')
+def list_analytics(section):
+    """One list of the analytics (see ANALYTICS_SECTIONS), filtered and paginated."""
+    if section not in ANALYTICS_SECTIONS:
+        abort(404)
+    index = get_analytics(data_cache.get())[section]
+    return paginate(index.search(request.args.get('filter', '')))
+
+
+# --- History API ---
+# Time-travel queries on the history store. They only open the partitions of
+# the requested dates, and do not depend on the data cache.
+
+access_history = AccessHistory(HISTORY_DIR)
+
+
+def get_date_arg(name, default=None):
+    value = request.args.get(name) or default
+    if value is not None and not DATE_PATTERN.match(value):
+        abort(400, description=f"'{name}' must be a YYYY-MM-DD date.")
+    return value
+
+
+@app.route('/api/history/dates')
+def list_history_dates():
+    return jsonify({'dates': access_history.dates()})
+
+
+@app.route('/api/history/access')
+def get_history_access():
+    """
+    Access tuples as of `?date=` (latest snapshot on or before it), or seen
+    between `?start=` and `?end=`, filtered by user, project, role and source.
+    """
+    filters = {column: request.args.get(column) for column in HISTORY_COLUMNS}
+    date = get_date_arg('date')
+    start = get_date_arg('start')
+    if date:
+        snapshot, rows = access_history.at(date, **filters)
+        if snapshot is None:
+            abort(404, description=f"No snapshot on or before {date} in the history store.")
+        return paginate(rows, snapshot=snapshot)
+    if not start:
+        abort(400, description="Give either 'date', or 'start' (and optionally 'end').")
+    if not any(filters.values()):
+        abort(400, description=f"Range queries need at least one of: {', '.join(HISTORY_COLUMNS)}.")
+    end = get_date_arg('end', time.strftime('%Y-%m-%d'))
+    dates, rows = access_history.between(start, end, **filters)
+    return paginate(rows, start=start, end=end, snapshots=len(dates))
+
+
+@app.route('/api/stats/<stat_name>')
+def get_stat(stat_name):
+    if stat_name not in STAT_KEYS:
+        abort(404)
+    summary = data_cache.get().datasets['summary']
+    return jsonify(summary.get(STAT_KEYS[stat_name], {}))
 
 # ==============================================================================
-# 3. APPLICATION ENTRY POINT
+# 5. APPLICATION ENTRY POINT
 # ==============================================================================
 if __name__ == '__main__':
     # Determine the port - use PORT from environment for Cloud Run, or 8080 for local
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar history of effective access, one partition per snapshot date.
+
+Every run of 'summary.py' overwrites 'json/*.json'. This store keeps the
+effective-access tuples (date, user, project, role, source) of each snapshot
+so that "who had roles/owner on oat-prod-us last March" is a query instead of
+a re-run of the pipeline on an old export directory.
+
+Layout of the store directory:
+
+- 'dict_<column>.txt': one append-only dictionary per column, one value per
+  line. The code of a value is its line number, and never changes.
+- '<YYYY-MM-DD>/<column>.npy': one partition per snapshot date, with one
+  array of dictionary codes per column (uint16 or uint32). A partition is
+  written to a temporary directory and renamed into place.
+
+Queries only open the partitions of the requested dates. The columns that are
+filtered on are scanned in full, and the others are memory-mapped so that only
+the pages of the matching rows are read.
+
+Usage:
+    python access_history.py append --json-dir json [--date 2025-08-21] [--history-dir history]
+    python access_history.py dates
+    python access_history.py query --date 2025-03-15 --project oat-prod-us --role roles/owner
+    python access_history.py query --start 2025-03-01 --end 2025-03-31 --user user@example.com
+"""
+import os
+import re
+import json
+import shutil
+import argparse
+import datetime
+import threading
+import numpy as np
+
+# --- CONFIGURATION ---
+
+HISTORY_DIR = 'history'
+JSON_OUTPUT_DIR = 'json'
+DETAILS_FILENAME = 'user_effective_access_details.json'
+COLUMNS = ('user', 'project', 'role', 'source')
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# --- STORE ---
+
+class ColumnDictionary:
+    """Append-only value <-> code mapping of one column, backed by a text file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.values = []
+        self.codes = {}
+        self._size = 0
+
+    def refresh(self):
+        """Reads the values appended since the last call (e.g. by another process)."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size == self._size:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.seek(self._size)
+            data = f.read()
+        # A line still being written by the other process is read next time.
+        complete = data[:data.rfind('\n') + 1]
+        for value in complete.splitlines():
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+        self._size += len(complete.encode('utf-8'))
+
+    def encode(self, values):
+        """Returns the codes of `values`, appending the new values to the file."""
+        new_values = []
+        for value in values:
+            if value not in self.codes:
+                self.codes[value] = len(self.values)
+                self.values.append(value)
+                new_values.append(value)
+        if new_values:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(value + '\n' for value in new_values))
+                f.flush()
+                os.fsync(f.fileno())
+            self._size = os.path.getsize(self.path)
+        return np.fromiter((self.codes[value] for value in values), dtype=np.uint32, count=len(values))
+
+
+class AccessHistory:
+    """Reader and writer of the history store. Safe to share between threads for queries."""
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        self.dictionaries = {column: ColumnDictionary(os.path.join(root, f"dict_{column}.txt")) for column in COLUMNS}
+        self._lock = threading.Lock()
+
+    def dates(self):
+        """Returns the snapshot dates in the store, sorted."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if DATE_PATTERN.match(name) and os.path.isdir(os.path.join(self.root, name)))
+
+    def append(self, date, details):
+        """
+        Stores the snapshot of `date` from the effective access details
+        ({user: [{project, role, source}]}), replacing any previous one.
+        Returns the number of rows written.
+        """
+        rows = [(user, grant['project'], grant['role'], grant['source'])
+                for user, grants in sorted(details.items()) for grant in grants]
+        os.makedirs(self.root, exist_ok=True)
+        partition = os.path.join(self.root, date)
+        temp_partition = partition + '.tmp'
+        shutil.rmtree(temp_partition, ignore_errors=True)
+        os.makedirs(temp_partition)
+        with self._lock:
+            for i, column in enumerate(COLUMNS):
+                dictionary = self.dictionaries[column]
+                dictionary.refresh()
+                codes = dictionary.encode([row[i] for row in rows])
+                dtype = np.uint16 if len(dictionary.values) <= np.iinfo(np.uint16).max else np.uint32
+                np.save(os.path.join(temp_partition, f"{column}.npy"), codes.astype(dtype))
+        if os.path.isdir(partition):
+            old_partition = partition + '.old'
+            shutil.rmtree(old_partition, ignore_errors=True)
+            os.replace(partition, old_partition)
+            os.replace(temp_partition, partition)
+            shutil.rmtree(old_partition)
+        else:
+            os.replace(temp_partition, partition)
+        return len(rows)
+
+    def _scan(self, date, filters):
+        """Returns the row indices of a partition matching {column: value}, and a column loader."""
+        partition = os.path.join(self.root, date)
+
+        def load(column):
+            return np.load(os.path.join(partition, f"{column}.npy"), mmap_mode='r')
+
+        mask = None
+        for column, value in filters.items():
+            code = self.dictionaries[column].codes.get(value)
+            if code is None:
+                return np.empty(0, dtype=np.intp), load
+            matches = load(column) == code
+            mask = matches if mask is None else mask & matches
+        if mask is None:
+            return np.arange(len(load(COLUMNS[0]))), load
+        return np.flatnonzero(mask), load
+
+    def _rows(self, date, filters):
+        """Yields the (user, project, role, source) codes of the matching rows of one partition."""
+        indices, load = self._scan(date, filters)
+        if not len(indices):
+            return []
+        return zip(*(load(column)[indices].tolist() for column in COLUMNS))
+
+    def _refresh(self):
+        with self._lock:
+            for dictionary in self.dictionaries.values():
+                dictionary.refresh()
+
+    def snapshot_at(self, date):
+        """Returns the latest snapshot date on or before `date`, or None."""
+        earlier = [d for d in self.dates() if d <= date]
+        return earlier[-1] if earlier else None
+
+    def at(self, date, **filters):
+        """
+        Point-in-time query: the access tuples of the latest snapshot on or
+        before `date` matching the filters (user, project, role, source).
+        """
+        snapshot = self.snapshot_at(date)
+        if snapshot is None:
+            return None, []
+        self._refresh()
+        filters = {column: value for column, value in filters.items() if value}
+        values = [self.dictionaries[column].values for column in COLUMNS]
+        rows = [dict(zip(COLUMNS, (v[c] for v, c in zip(values, codes)))) for codes in self._rows(snapshot, filters)]
+        return snapshot, rows
+
+    def between(self, start, end, **filters):
+        """
+        Range query: the distinct access tuples seen in the snapshots from
+        `start` to `end` (inclusive), with the first and last snapshot they
+        were seen in and the number of snapshots.
+        """
+        self._refresh()
+        filters = {column: value for column, value in filters.items() if value}
+        seen = {}
+        dates = [d for d in self.dates() if start <= d <= end]
+        for date in dates:
+            for codes in self._rows(date, filters):
+                entry = seen.get(codes)
+                if entry is None:
+                    seen[codes] = [date, date, 1]
+                else:
+                    entry[1] = date
+                    entry[2] += 1
+        values = [self.dictionaries[column].values for column in COLUMNS]
+        rows = []
+        for codes, (first_seen, last_seen, count) in seen.items():
+            row = dict(zip(COLUMNS, (v[c] for v, c in zip(values, codes))))
+            row.update({'firstSeen': first_seen, 'lastSeen': last_seen, 'snapshots': count})
+            rows.append(row)
+        rows.sort(key=lambda row: (row['project'], row['role'], row['user'], row['source']))
+        return dates, rows
+
+# --- SCRIPT LOGIC ---
+
+def parse_date(value):
+    """argparse type for YYYY-MM-DD dates."""
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a YYYY-MM-DD date")
+
+def main():
+    """Main function to append snapshots to, and query, the history store."""
+    parser = argparse.ArgumentParser(description='Columnar history of effective access.')
+    parser.add_argument("--history-dir", default=HISTORY_DIR, help=f"History store directory (default: {HISTORY_DIR}).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    append = commands.add_parser('append', help="Append the current summary.py reports as a snapshot.")
+    append.add_argument("--json-dir", default=JSON_OUTPUT_DIR, help=f"Directory of the summary.py reports (default: {JSON_OUTPUT_DIR}).")
+    append.add_argument("--date", type=parse_date, default=datetime.date.today().isoformat(), help="Snapshot date (default: today).")
+
+    commands.add_parser('dates', help='List the snapshot dates.')
+
+    query = commands.add_parser('query', help='Point-in-time (--date) or range (--start/--end) query.')
+    query.add_argument("--date", type=parse_date, help="State as of this date (latest snapshot on or before it).")
+    query.add_argument("--start", type=parse_date, help="First date of a range query.")
+    query.add_argument("--end", type=parse_date, help="Last date of a range query (default: today).")
+    for column in COLUMNS:
+        query.add_argument(f"--{column}", help=f"Only the tuples with this {column}.")
+    args = parser.parse_args()
+
+    history = AccessHistory(args.history_dir)
+
+    if args.command == 'append':
+        details_path = os.path.join(args.json_dir, DETAILS_FILENAME)
+        if not os.path.exists(details_path):
+            print(f"ERROR: Effective access details not found at '{details_path}'. Run summary.py first.")
+            return
+        with open(details_path, 'r', encoding='utf-8') as f:
+            details = json.load(f)
+        rows = history.append(args.date, details)
+        print(f"Successfully stored {rows} access tuples for {args.date} in '{args.history_dir}'")
+        return
+
+    if args.command == 'dates':
+        for date in history.dates():
+            print(date)
+        return
+
+    filters = {column: getattr(args, column) for column in COLUMNS}
+    if args.date:
+        snapshot, rows = history.at(args.date, **filters)
+        if snapshot is None:
+            print(f"No snapshot on or before {args.date}.")
+            return
+        print(f"--- Snapshot of {snapshot} ({len(rows)} tuples) ---")
+        for row in rows:
+            print(f"{row['project']}  {row['role']}  {row['user']}  ({row['source']})")
+    elif args.start:
+        dates, rows = history.between(args.start, args.end or datetime.date.today().isoformat(), **filters)
+        print(f"--- {len(dates)} snapshots, {len(rows)} distinct tuples ---")
+        for row in rows:
+            print(f"{row['project']}  {row['role']}  {row['user']}  ({row['source']})  "
+                  f"{row['firstSeen']} -> {row['lastSeen']} ({row['snapshots']} snapshots)")
+    else:
+        print("ERROR: Give either --date, or --start (and optionally --end).")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Sparse-matrix aggregation core for the audit summaries.
+
+Users, groups and 'role@project' keys are interned into integer IDs, and the
+audit data is represented as three sparse incidence matrices:
+
+- direct:     users  x keys   (direct grants)
+- membership: users  x groups (group memberships)
+- grants:     groups x keys   (grants held by each group)
+
+Effective access is then `direct + membership @ grants`, and every count of
+'numerical_summary.json' is a row or column count of one of these matrices.
+The functions here produce exactly the same JSON structures (including key
+order) as the original dictionary-based loops in 'summary.py'.
+"""
+import numpy as np
+from scipy import sparse
+
+
+class AccessMatrix:
+    """Interned, sparse representation of the parsed audit data."""
+
+    def __init__(self, user_access, user_groups, group_access):
+        # Users are numbered in sorted order, so that the row indices of a
+        # column (sorted by SciPy) directly give a sorted list of emails.
+        self.users = sorted(set(user_access) | set(user_groups))
+        self.user_ids = {user: i for i, user in enumerate(self.users)}
+
+        self.groups = list(dict.fromkeys(
+            [group for groups in user_groups.values() for group in groups] + list(group_access)))
+        self.group_ids = {group: i for i, group in enumerate(self.groups)}
+
+        # Keys of direct grants are interned first, in first-occurrence order.
+        self.keys = []
+        self.key_ids = {}
+        direct_rows, direct_cols = [], []
+        for user, permissions in user_access.items():
+            for perm in permissions:
+                direct_rows.append(self.user_ids[user])
+                direct_cols.append(self._intern_key(perm))
+        self.direct_key_count = len(self.keys)
+
+        grant_rows, grant_cols = [], []
+        for group, permissions in group_access.items():
+            for perm in permissions:
+                grant_rows.append(self.group_ids[group])
+                grant_cols.append(self._intern_key(perm))
+
+        member_rows, member_cols = [], []
+        for user, groups in user_groups.items():
+            for group in groups:
+                member_rows.append(self.user_ids[user])
+                member_cols.append(self.group_ids[group])
+
+        n_users, n_groups, n_keys = len(self.users), len(self.groups), len(self.keys)
+        self.direct = incidence_matrix(direct_rows, direct_cols, (n_users, n_keys))
+        self.membership = incidence_matrix(member_rows, member_cols, (n_users, n_groups))
+        self.grants = incidence_matrix(grant_rows, grant_cols, (n_groups, n_keys))
+
+    def _intern_key(self, perm):
+        key = f"{perm['role']}@{perm['project']}"
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        return key_id
+
+    def inherited(self):
+        """Returns the users x keys matrix of access inherited through groups."""
+        return binarize(self.membership @ self.grants)
+
+    def effective(self):
+        """Returns the users x keys matrix of effective (direct or inherited) access."""
+        return binarize(self.direct + self.membership @ self.grants)
+
+
+def incidence_matrix(rows, cols, shape):
+    """Builds a 0/1 CSR matrix from (row, col) pairs, ignoring duplicates."""
+    data = np.ones(len(rows), dtype=np.int32)
+    matrix = sparse.csr_matrix((data, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))), shape=shape)
+    return binarize(matrix)
+
+
+def binarize(matrix):
+    """Returns a copy of a sparse matrix with every stored non-zero set to 1."""
+    matrix = sparse.csr_matrix(matrix, dtype=np.int32)
+    matrix.eliminate_zeros()
+    matrix.data[:] = 1
+    matrix.sort_indices()
+    return matrix
+
+
+def row_counts(matrix):
+    """Number of non-zeros per row of a CSR matrix."""
+    return np.diff(matrix.indptr)
+
+
+def effective_key_order(matrix, user_groups, group_access):
+    """
+    Returns the key IDs of the effective access in the order the original loops
+    first met them: direct keys first, then inherited-only keys by the first
+    user (in `user_groups` order) who inherits them.
+    """
+    inherited = matrix.inherited().tocsc()
+    order = list(range(matrix.direct_key_count))
+
+    # For every inherited-only key, find the first user in `user_groups` order.
+    user_rank = np.full(len(matrix.users), np.iinfo(np.int64).max, dtype=np.int64)
+    for rank, user in enumerate(user_groups):
+        user_rank[matrix.user_ids[user]] = rank
+    first_rank = {}
+    for key_id in range(matrix.direct_key_count, len(matrix.keys)):
+        rows = inherited.indices[inherited.indptr[key_id]:inherited.indptr[key_id + 1]]
+        if len(rows):
+            first_rank[key_id] = int(user_rank[rows].min())
+
+    # Only the users who introduce a key need their groups walked in order.
+    users_by_rank = list(user_groups.items())
+    for rank in sorted(set(first_rank.values())):
+        user, groups = users_by_rank[rank]
+        for group in groups:
+            for perm in group_access.get(group, []):
+                key_id = matrix.key_ids[f"{perm['role']}@{perm['project']}"]
+                if first_rank.get(key_id) == rank:
+                    order.append(key_id)
+                    del first_rank[key_id]
+    return order
+
+
+def aggregate_access(user_access, user_groups, group_access):
+    """
+    Computes the effective access, per-user details and numerical counts.
+
+    Returns a dict with 'effective_users' ({'role@project': sorted users}),
+    'user_details' ({user: [{project, role, source}]}), 'user_projects'
+    ({user: set of projects}) and the count dictionaries of the numerical summary.
+    The details of a user list the direct grants first, then the inherited ones
+    by group, in the order the groups were first seen.
+    """
+    matrix = AccessMatrix(user_access, user_groups, group_access)
+    effective = matrix.effective().tocsc()
+    effective.sort_indices()
+
+    effective_users = {}
+    for key_id in effective_key_order(matrix, user_groups, group_access):
+        rows = effective.indices[effective.indptr[key_id]:effective.indptr[key_id + 1]]
+        effective_users[matrix.keys[key_id]] = [matrix.users[row] for row in rows]
+
+    # Inherited detail entries are the (group, grant) pairs, numbered group by
+    # group in the order of each group's grants. The users x entries product
+    # gives the entries of every user at once; they are only decoded at the end.
+    entries, entry_groups = [], []
+    for group_id, group in enumerate(matrix.groups):
+        for perm in group_access.get(group, []):
+            entries.append({"project": perm['project'], "role": perm['role'], "source": f"group: {group}"})
+            entry_groups.append(group_id)
+    group_entries = incidence_matrix(entry_groups, range(len(entries)), (len(matrix.groups), len(entries)))
+    inherited_entries = binarize(matrix.membership @ group_entries)
+
+    user_details = {}
+    user_projects = {}
+    for user, permissions in user_access.items():
+        user_details[user] = [{"project": perm['project'], "role": perm['role'], "source": "direct"} for perm in permissions]
+    indptr, indices = inherited_entries.indptr, inherited_entries.indices
+    for user in user_groups:
+        user_id = matrix.user_ids[user]
+        entry_ids = indices[indptr[user_id]:indptr[user_id + 1]]
+        if len(entry_ids):
+            user_details.setdefault(user, []).extend(entries[entry_id] for entry_id in entry_ids.tolist())
+    for user, details in user_details.items():
+        user_projects[user] = {entry['project'] for entry in details}
+
+    users_per_key = np.diff(effective.indptr)
+    members_per_group = np.asarray(matrix.membership.sum(axis=0)).ravel()
+    direct_counts = row_counts(matrix.direct)
+    grant_counts = row_counts(matrix.grants)
+    group_counts = row_counts(matrix.membership)
+
+    return {
+        'effective_users': effective_users,
+        'user_details': user_details,
+        'user_projects': user_projects,
+        'users_per_role_project_count': {key: int(users_per_key[matrix.key_ids[key]]) for key in effective_users},
+        'members_per_group': {group: int(members_per_group[i]) for i, group in enumerate(matrix.groups) if members_per_group[i]},
+        'direct_access_count_by_user': {user: int(direct_counts[matrix.user_ids[user]]) for user in user_access},
+        'access_count_per_group': {group: int(grant_counts[matrix.group_ids[group]]) for group in group_access},
+        'groups_per_user': {user: int(group_counts[matrix.user_ids[user]]) for user in user_groups},
+    }
+
+
+# --- ANALYTICS ---
+# Redundant and over-broad grants, for 'summary.py --analytics'. Every pass
+# works on the sparse matrices, never on pairs of Python dictionaries.
+
+SIMILARITY_THRESHOLD = 0.8
+# Groups are compared by blocks of rows, so that the groups x groups product
+# never has to be held in memory at once.
+SIMILARITY_BLOCK_ROWS = 2000
+
+
+def redundant_direct_grants(matrix):
+    """
+    Returns the direct grants that the user also inherits through a group, as
+    [{user, project, role, covered_by: [groups]}] sorted by user.
+    """
+    covered = matrix.direct.multiply(matrix.inherited()).tocsr()
+    covered.eliminate_zeros()
+    covered.sort_indices()
+    membership = matrix.membership
+    grants = matrix.grants.tocsc()
+    grants.sort_indices()
+
+    redundant = []
+    for user_id in range(len(matrix.users)):
+        keys = covered.indices[covered.indptr[user_id]:covered.indptr[user_id + 1]]
+        if not len(keys):
+            continue
+        user_groups = membership.indices[membership.indptr[user_id]:membership.indptr[user_id + 1]]
+        for key_id in keys:
+            key_groups = grants.indices[grants.indptr[key_id]:grants.indptr[key_id + 1]]
+            role, _, project = matrix.keys[key_id].partition('@')
+            redundant.append({
+                'user': matrix.users[user_id],
+                'project': project,
+                'role': role,
+                'covered_by': sorted(matrix.groups[g] for g in np.intersect1d(user_groups, key_groups, assume_unique=True))
+            })
+    return redundant
+
+
+def similar_groups(matrix, threshold=SIMILARITY_THRESHOLD):
+    """
+    Returns the pairs of groups whose sets of grants have a Jaccard similarity
+    of at least `threshold`, as [{groups: [a, b], similarity, shared, only_first,
+    only_second}] sorted by decreasing similarity.
+
+    The intersections of all pairs are the sparse product grants @ grants.T,
+    so only the pairs sharing at least one grant are ever considered.
+    """
+    grants = matrix.grants
+    sizes = row_counts(grants)
+    transposed = grants.T.tocsc()
+    pairs = []
+    for start in range(0, grants.shape[0], SIMILARITY_BLOCK_ROWS):
+        block = (grants[start:start + SIMILARITY_BLOCK_ROWS] @ transposed).tocoo()
+        rows = block.row + start
+        upper = block.col > rows
+        rows, cols, shared = rows[upper], block.col[upper], block.data[upper]
+        similarity = shared / (sizes[rows] + sizes[cols] - shared)
+        keep = similarity >= threshold
+        pairs.extend(zip(rows[keep].tolist(), cols[keep].tolist(), shared[keep].tolist(), similarity[keep].tolist()))
+
+    def group_keys(group_id):
+        return grants.indices[grants.indptr[group_id]:grants.indptr[group_id + 1]]
+
+    similar = []
+    for first, second, shared, similarity in pairs:
+        a, b = sorted((first, second), key=lambda g: matrix.groups[g])
+        keys_a, keys_b = group_keys(a), group_keys(b)
+        similar.append({
+            'groups': [matrix.groups[a], matrix.groups[b]],
+            'similarity': round(similarity, 4),
+            'shared': int(shared),
+            'only_first': sorted(matrix.keys[k] for k in np.setdiff1d(keys_a, keys_b, assume_unique=True)),
+            'only_second': sorted(matrix.keys[k] for k in np.setdiff1d(keys_b, keys_a, assume_unique=True))
+        })
+    similar.sort(key=lambda pair: (-pair['similarity'], pair['groups']))
+    return similar
+
+
+def identical_profiles(matrix):
+    """
+    Returns the sets of two or more users with exactly the same (non-empty)
+    effective access, as [{users, access}] sorted by decreasing number of users.
+    Each row of the effective matrix is hashed by its sorted key IDs.
+    """
+    effective = matrix.effective()
+    profiles = {}
+    for user_id in range(len(matrix.users)):
+        keys = effective.indices[effective.indptr[user_id]:effective.indptr[user_id + 1]]
+        if len(keys):
+            profiles.setdefault(keys.tobytes(), []).append(user_id)
+
+    identical = []
+    for user_ids in profiles.values():
+        if len(user_ids) > 1:
+            user_id = user_ids[0]
+            keys = effective.indices[effective.indptr[user_id]:effective.indptr[user_id + 1]]
+            identical.append({
+                'users': [matrix.users[u] for u in user_ids],
+                'access': sorted(matrix.keys[k] for k in keys)
+            })
+    identical.sort(key=lambda profile: (-len(profile['users']), profile['users'][0]))
+    return identical
+
+
+def access_analytics(user_access, user_groups, group_access, threshold=SIMILARITY_THRESHOLD):
+    """Runs the analytics passes and returns the 'access_analytics.json' dataset."""
+    matrix = AccessMatrix(user_access, user_groups, group_access)
+    redundant = redundant_direct_grants(matrix)
+    similar = similar_groups(matrix, threshold)
+    identical = identical_profiles(matrix)
+    return {
+        'summary': {
+            'redundant_direct_grants': len(redundant),
+            'users_with_redundant_grants': len({grant['user'] for grant in redundant}),
+            'similar_group_pairs': len(similar),
+            'similarity_threshold': threshold,
+            'identical_profiles': len(identical),
+            'users_in_identical_profiles': sum(len(profile['users']) for profile in identical),
+        },
+        'redundant_direct_grants': redundant,
+        'similar_groups': similar,
+        'identical_profiles': identical,
+    }
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the audit pipeline on synthetic organizations.
+
+For each scale (number of users), a synthetic org is generated with
+'synthetic_org.py' and every stage of the pipeline is timed on it, offline:
+
+- building and loading the IAM cache ('create_iam_cache.py', 'load_iam_cache'),
+- the audit loop of 'gdpr-access-audit-local-json.py' against a fake Admin SDK,
+  with a CSV, then with several overlapping sources (CSV, group and all users),
+- parsing the audit output ('parse_audit_reports' and 'parse_audit_records'),
+- the aggregation ('aggregate_access') and the whole 'summary.py' main,
+- '/api/data' through Flask's test client, backed by a fake GCS bucket and
+  by the local directory backend.
+
+Results are written as JSON. With '--baseline', the timings are compared
+with a previous results file so that regressions stand out.
+
+Usage:
+    python benchmark.py [--scales 1000,10000,100000] [--output benchmark_results.json] [--baseline previous.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import contextlib
+import importlib.util
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+
+import summary
+import create_iam_cache
+from access_matrix import aggregate_access
+from synthetic_org import generate_org, write_org, FakeAdminService, FakeStorageClient
+
+# --- CONFIGURATION ---
+
+DEFAULT_SCALES = '1000,10000,100000'
+RESULTS_PATH = 'benchmark_results.json'
+# A phase slower than the baseline by more than this ratio is reported as a regression.
+REGRESSION_THRESHOLD = 1.2
+# Differences below this many seconds are noise and never reported.
+REGRESSION_MIN_SECONDS = 0.01
+# Polling interval and patience of the local-directory watcher check.
+WATCH_POLL_SECONDS = 0.05
+WATCH_TIMEOUT_SECONDS = 10
+
+# --- SCRIPT LOGIC ---
+
+def load_script(name, filename):
+    """Imports a script whose file name is not a valid module name (e.g. 'gdpr-access-audit-local-json.py')."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPTS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_quietly(func, *args):
+    """Runs `func`, discarding its progress output."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return func(*args)
+
+def run_main(module, argv):
+    """Runs a script's main() with the given command line arguments."""
+    saved_argv = sys.argv
+    sys.argv = [module.__name__] + argv
+    try:
+        run_quietly(module.main)
+    finally:
+        sys.argv = saved_argv
+
+class Timer:
+    """Collects the duration of named phases, in seconds."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        yield
+        self.timings[name] = round(time.perf_counter() - start, 6)
+
+def strip_source(records_path):
+    with open(records_path, 'r', encoding='utf-8') as f:
+        return [dict(json.loads(line), source=None) for line in f if line.strip()]
+
+def benchmark_scale(num_users, workdir, seed, audit_module):
+    """Generates an org of `num_users` users in `workdir` and times each pipeline stage."""
+    timer = Timer()
+    with timer.phase('generate_org'):
+        org = generate_org(num_users, seed=seed)
+        policy_dir = write_org(org, workdir)
+
+    cache_db = os.path.join(workdir, 'iam_cache.db')
+    cache_json = os.path.join(workdir, 'iam_cache.json')
+    policy_files = create_iam_cache.list_policy_files(policy_dir)
+    with timer.phase('build_iam_cache_sqlite'):
+        run_quietly(create_iam_cache.build_sqlite_cache, policy_files, cache_db)
+    with timer.phase('build_iam_cache_json'):
+        run_quietly(create_iam_cache.build_json_cache, policy_files, cache_json)
+    with timer.phase('load_iam_cache_sqlite'):
+        run_quietly(audit_module.load_iam_cache, cache_db)
+    with timer.phase('load_iam_cache_json'):
+        run_quietly(audit_module.load_iam_cache, cache_json)
+
+    # The audit script writes relative paths: run the pipeline from the org directory.
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        admin = FakeAdminService(org)
+        audit_module.get_gws_service = lambda: admin
+        with timer.phase('audit_loop'):
+            run_main(audit_module, ['--users-csv', 'users.csv', '--iam-cache', 'iam_cache.db', '--output-dir', 'bench-audit'])
+        admin_api_calls = admin.calls
+
+        with timer.phase('audit_multi_source'):
+            run_main(audit_module, ['--users-csv', 'users.csv', '--all-users', '--group-email', next(iter(org['groups'])),
+                                    '--iam-cache', 'iam_cache.db', '--output-dir', 'bench-audit-multi', '--output-format', 'jsonl'])
+        with open(os.path.join('bench-audit-multi', summary.AUDIT_RECORDS_FILENAME), 'r', encoding='utf-8') as f:
+            multi_source_users = [json.loads(line)['user'] for line in f]
+
+        with timer.phase('parse_audit_reports'):
+            report_data = run_quietly(summary.parse_audit_reports, 'bench-audit')
+        with timer.phase('parse_audit_records'):
+            user_access, user_groups, group_access = run_quietly(
+                summary.parse_audit_records, os.path.join('bench-audit', summary.AUDIT_RECORDS_FILENAME))
+        with timer.phase('aggregate_access'):
+            aggregate_access(user_access, user_groups, group_access)
+
+        open('empty_logs.jsonl', 'w').close()
+        with timer.phase('summary_main'):
+            run_main(summary, ['--audit-dir', 'bench-audit', '--log-entries-file', 'empty_logs.jsonl'])
+
+        checks = {
+            'admin_api_calls': admin_api_calls,
+            'audit_matches_generator': strip_source(os.path.join('bench-audit', summary.AUDIT_RECORDS_FILENAME))
+                                       == strip_source(os.path.join('audit', summary.AUDIT_RECORDS_FILENAME)),
+            'reports_match_records': report_data == (user_access, user_groups, group_access),
+            'audit_multi_source_deduplicated': sorted(multi_source_users) == sorted(org['users']),
+        }
+        timer.timings.update(benchmark_api(os.path.join(workdir, summary.JSON_OUTPUT_DIR), checks))
+    finally:
+        os.chdir(previous_cwd)
+
+    bindings = sum(len(binding['members']) for policy in org['policies'].values() for binding in policy['bindings'])
+    return {
+        'users': len(org['users']),
+        'groups': len(org['groups']),
+        'projects': len(org['policies']),
+        'bindings': bindings,
+        'timings': timer.timings,
+        'checks': checks
+    }
+
+def benchmark_api(json_dir, checks):
+    """
+    Times /api/data through Flask's test client, with the summary outputs in a
+    fake GCS bucket, then on local disk, and the NDJSON stream of /api/stream/effective.
+    """
+    import app as dashboard
+
+    # Without GCS_BUCKET_NAME, the app watches its local directory from import
+    # time: stop that watcher, as the backend is replaced below.
+    dashboard.data_cache.stop_watching()
+    client = FakeStorageClient()
+    for filename in dashboard.JSON_FILES.values():
+        with open(os.path.join(json_dir, filename), 'rb') as f:
+            client.put(filename, f.read())
+    dashboard.data_backend = dashboard.GCSBackend(client, 'benchmark')
+    dashboard.data_cache = dashboard.DataCache(ttl=3600)
+    test_client = dashboard.app.test_client()
+
+    timer = Timer()
+    with timer.phase('api_data_cold'):
+        response = run_quietly(test_client.get, '/api/data')
+    with timer.phase('api_data_warm'):
+        test_client.get('/api/data')
+    with timer.phase('api_data_gzip'):
+        gzip_response = test_client.get('/api/data', headers={'Accept-Encoding': 'gzip'})
+    with timer.phase('api_data_not_modified'):
+        not_modified = test_client.get('/api/data', headers={'If-None-Match': response.headers['ETag']})
+    checks['api_data_bytes'] = len(response.data)
+    checks['api_data_gzip_bytes'] = len(gzip_response.data)
+    checks['api_data_not_modified'] = not_modified.status_code == 304
+
+    dashboard.data_backend = dashboard.LocalBackend(json_dir)
+    dashboard.data_cache = dashboard.DataCache(ttl=3600)
+    with timer.phase('api_data_cold_local'):
+        local_response = run_quietly(test_client.get, '/api/data')
+    checks['api_data_local_matches_gcs'] = local_response.data == response.data
+
+    with timer.phase('api_stream_first_chunk'):
+        stream = test_client.get('/api/stream/effective')
+        first_chunk = next(stream.iter_encoded())
+    with timer.phase('api_stream_full'):
+        streamed = test_client.get('/api/stream/effective').get_data(as_text=True).splitlines()
+    first_page = test_client.get('/api/effective', query_string={'limit': 1}).get_json()
+    checks['api_stream_first_chunk_bytes'] = len(first_chunk)
+    checks['api_stream_complete'] = len(streamed) == int(stream.headers['X-Total-Count']) == first_page['total']
+    checks['api_stream_matches_effective'] = json.loads(streamed[0]) == first_page['items'][0]
+
+    checks['api_watch_survives_bad_file'] = check_hot_reload(dashboard, test_client, json_dir)
+    return timer.timings
+
+def check_hot_reload(dashboard, test_client, json_dir):
+    """
+    Checks that the local-directory watcher keeps serving the last good data
+    when a file has the wrong shape, and still loads the next valid version.
+    """
+    watch_dir = json_dir + '-watch'
+    shutil.copytree(json_dir, watch_dir)
+    membership_path = os.path.join(watch_dir, dashboard.JSON_FILES['membership'])
+    dashboard.data_backend = dashboard.LocalBackend(watch_dir)
+    dashboard.data_cache = dashboard.DataCache(float('inf'))
+
+    def run():
+        known_user = test_client.get('/api/users', query_string={'limit': 1}).get_json()['items'][0]
+        dashboard.data_cache.watch(WATCH_POLL_SECONDS)
+        with open(membership_path, 'w', encoding='utf-8') as f:
+            f.write('["oops"]')
+        time.sleep(WATCH_POLL_SECONDS * 10)
+        kept = test_client.get(f'/api/users/{known_user}').status_code == 200
+        with open(membership_path, 'w', encoding='utf-8') as f:
+            json.dump({'reloaded@example.com': []}, f)
+        deadline = time.monotonic() + WATCH_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            if test_client.get('/api/users/reloaded@example.com').status_code == 200:
+                return kept
+            time.sleep(WATCH_POLL_SECONDS)
+        return False
+
+    try:
+        return run_quietly(run)
+    finally:
+        dashboard.data_cache.stop_watching()
+
+def compare_with_baseline(results, baseline):
+    """Prints the ratio of each timing to the baseline, flagging regressions."""
+    print("\n--- Comparison with baseline ---")
+    for scale, result in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if not previous:
+            continue
+        for phase, seconds in result['timings'].items():
+            before = previous['timings'].get(phase)
+            if not before:
+                continue
+            ratio = seconds / before
+            flag = '  <-- REGRESSION' if ratio > REGRESSION_THRESHOLD and seconds - before > REGRESSION_MIN_SECONDS else ''
+            print(f"  {scale:>7} users  {phase:<24} {before:9.4f}s -> {seconds:9.4f}s  (x{ratio:.2f}){flag}")
+
+def main():
+    """Main function to run the benchmarks."""
+    parser = argparse.ArgumentParser(description='Benchmark the audit pipeline on synthetic organizations.')
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help=f"Comma-separated numbers of users (default: {DEFAULT_SCALES}).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic orgs (default: 0).")
+    parser.add_argument("--output", default=RESULTS_PATH, help=f"Results file (default: {RESULTS_PATH}).")
+    parser.add_argument("--baseline", help="Previous results file to compare with.")
+    parser.add_argument("--keep-workdir", action='store_true', help="Keep the generated orgs and outputs (printed path).")
+    args = parser.parse_args()
+
+    audit_module = load_script('gdpr_access_audit', 'gdpr-access-audit-local-json.py')
+    results = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'scales': {}
+    }
+    workdir = tempfile.mkdtemp(prefix='iam-benchmark-')
+    try:
+        for scale in [int(value) for value in args.scales.split(',') if value.strip()]:
+            print(f"\n--- Benchmarking {scale} users ---")
+            scale_dir = os.path.join(workdir, str(scale))
+            os.makedirs(scale_dir)
+            result = benchmark_scale(scale, scale_dir, args.seed, audit_module)
+            results['scales'][str(scale)] = result
+            for phase, seconds in result['timings'].items():
+                print(f"  {phase:<24} {seconds:9.4f}s")
+            failed = [name for name, value in result['checks'].items() if value is False]
+            if failed:
+                print(f"  WARNING: Failed checks: {', '.join(failed)}")
+    finally:
+        if args.keep_workdir:
+            print(f"\nGenerated files kept in '{workdir}'")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nBenchmark results saved to '{args.output}'")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            compare_with_baseline(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Builds the local IAM cache used by the audit script.
+
+This script reads the policy files exported by 'gcp-iam-export.py' (one
+'<project>-<date>.json' file per project) and compiles every binding into a
+compact, indexed SQLite store ('iam_cache.db'):
+
+- a string table interning every project, role and identity once,
+- a bindings table of integer IDs, indexed by (identity type, identity),
+- the SHA-256 of each project's policy, so that a rebuild from a newer
+  snapshot directory only re-indexes the projects whose policy changed.
+
+'user:', 'group:', 'serviceAccount:' and 'domain:' members are indexed under
+the 'users', 'groups', 'serviceAccounts' and 'domains' cache types. Looking up
+an identity is a single indexed query, so loading the cache costs milliseconds
+whatever its size.
+
+With an output path ending in '.json', the legacy 'iam_cache.json' format
+({cache_type: {identity: [{project, role}]}}) is written instead.
+
+Usage:
+    python create_iam_cache.py --policy-dir <date_directory> [--output iam_cache.db]
+"""
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import argparse
+
+# --- CONFIGURATION ---
+
+IAM_CACHE_DB_PATH = 'iam_cache.db'
+MEMBER_TYPES = {
+    'user': 'users',
+    'group': 'groups',
+    'serviceAccount': 'serviceAccounts',
+    'domain': 'domains',
+}
+POLICY_FILE_PATTERN = re.compile(r'^(?P<project>.+?)(-\d{4}-\d{2}-\d{2})?\.json$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS strings (
+    id    INTEGER PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS policies (
+    project_id INTEGER PRIMARY KEY,
+    sha256     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bindings (
+    cache_type  TEXT NOT NULL,
+    identity_id INTEGER NOT NULL,
+    project_id  INTEGER NOT NULL,
+    role_id     INTEGER NOT NULL,
+    PRIMARY KEY (cache_type, identity_id, project_id, role_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bindings_by_project ON bindings (project_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# --- SCRIPT LOGIC ---
+
+def list_policy_files(policy_dir):
+    """Returns {project_id: file path} for the policy files of a snapshot directory."""
+    files = {}
+    for filename in sorted(os.listdir(policy_dir)):
+        match = POLICY_FILE_PATTERN.match(filename)
+        if match:
+            files[match.group('project')] = os.path.join(policy_dir, filename)
+    return files
+
+def iter_policy_bindings(policy):
+    """Yields (cache_type, identity, role) for every supported member of a policy."""
+    for binding in policy.get('bindings', []):
+        role = binding.get('role')
+        for member in binding.get('members', []):
+            prefix, _, identity = member.partition(':')
+            cache_type = MEMBER_TYPES.get(prefix)
+            if cache_type and identity and role:
+                yield cache_type, identity, role
+
+def intern(conn, value, string_ids):
+    """Returns the ID of a string in the string table, adding it if needed."""
+    string_id = string_ids.get(value)
+    if string_id is None:
+        conn.execute("INSERT OR IGNORE INTO strings (value) VALUES (?)", (value,))
+        string_id = conn.execute("SELECT id FROM strings WHERE value = ?", (value,)).fetchone()[0]
+        string_ids[value] = string_id
+    return string_id
+
+def build_sqlite_cache(policy_files, output_path):
+    """Incrementally updates the SQLite cache from the policy files. Returns (changed, removed) project counts."""
+    conn = sqlite3.connect(output_path)
+    try:
+        conn.executescript(SCHEMA)
+        string_ids = dict((value, string_id) for string_id, value in conn.execute("SELECT id, value FROM strings"))
+        known = {project: sha for project, sha in conn.execute(
+            "SELECT s.value, p.sha256 FROM policies p JOIN strings s ON s.id = p.project_id")}
+
+        changed = 0
+        with conn:
+            for project, path in policy_files.items():
+                with open(path, 'rb') as f:
+                    content = f.read()
+                sha = hashlib.sha256(content).hexdigest()
+                if known.get(project) == sha:
+                    continue
+                try:
+                    policy = json.loads(content)
+                except ValueError:
+                    # Never keep serving the grants of an older version of the policy.
+                    print(f"  - WARNING: Could not decode JSON from '{path}'. Skipping, and removing the project's cached bindings.")
+                    if project in known:
+                        project_id = string_ids[project]
+                        conn.execute("DELETE FROM bindings WHERE project_id = ?", (project_id,))
+                        conn.execute("DELETE FROM policies WHERE project_id = ?", (project_id,))
+                        changed += 1
+                    continue
+                project_id = intern(conn, project, string_ids)
+                conn.execute("DELETE FROM bindings WHERE project_id = ?", (project_id,))
+                rows = {
+                    (cache_type, intern(conn, identity, string_ids), project_id, intern(conn, role, string_ids))
+                    for cache_type, identity, role in iter_policy_bindings(policy)
+                }
+                conn.executemany(
+                    "INSERT INTO bindings (cache_type, identity_id, project_id, role_id) VALUES (?, ?, ?, ?)", rows)
+                conn.execute("INSERT OR REPLACE INTO policies (project_id, sha256) VALUES (?, ?)", (project_id, sha))
+                print(f"  - Indexed {len(rows)} bindings for project '{project}'")
+                changed += 1
+
+            removed = [project for project in known if project not in policy_files]
+            for project in removed:
+                project_id = string_ids[project]
+                conn.execute("DELETE FROM bindings WHERE project_id = ?", (project_id,))
+                conn.execute("DELETE FROM policies WHERE project_id = ?", (project_id,))
+                print(f"  - Removed project '{project}' (no longer in the snapshot)")
+
+            if changed or removed:
+                version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                             (str(int(version[0]) + 1 if version else 1),))
+        conn.execute("ANALYZE")
+        return changed, len(removed)
+    finally:
+        conn.close()
+
+def build_json_cache(policy_files, output_path):
+    """Writes the legacy iam_cache.json format."""
+    cache = {cache_type: {} for cache_type in MEMBER_TYPES.values()}
+    for project, path in policy_files.items():
+        with open(path, 'r', encoding='utf-8') as f:
+            policy = json.load(f)
+        for cache_type, identity, role in iter_policy_bindings(policy):
+            entry = {'project': project, 'role': role}
+            permissions = cache[cache_type].setdefault(identity, [])
+            if entry not in permissions:
+                permissions.append(entry)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+
+def main():
+    """Main function to build the IAM cache."""
+    parser = argparse.ArgumentParser(description='Build the local IAM cache from exported policy files.')
+    parser.add_argument("--policy-dir", required=True, help="Dated directory written by gcp-iam-export.py.")
+    parser.add_argument("--output", default=IAM_CACHE_DB_PATH, help=f"Cache file to create or update (default: {IAM_CACHE_DB_PATH}; use a .json path for the legacy format).")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.policy_dir):
+        print(f"ERROR: Directory not found at '{args.policy_dir}'")
+        return
+    policy_files = list_policy_files(args.policy_dir)
+    print(f"Found {len(policy_files)} policy files in '{args.policy_dir}'.")
+
+    if args.output.endswith('.json'):
+        build_json_cache(policy_files, args.output)
+        print(f"Successfully created IAM cache at '{args.output}'")
+    else:
+        changed, removed = build_sqlite_cache(policy_files, args.output)
+        print(f"Successfully updated IAM cache at '{args.output}' "
+              f"({changed} projects re-indexed, {removed} removed, {len(policy_files) - changed} unchanged).")
+
+if __name__ == '__main__':
+    main()
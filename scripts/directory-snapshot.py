@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Takes a one-shot snapshot of the Google Workspace directory.
+
+This script bulk-pulls every user and the membership of every Google Group
+(paging with the maximum page size, groups fetched in parallel), and stores the
+result as a local membership graph in 'directory_snapshot.json'.
+
+Nested groups are resolved once here: the transitive closure user -> groups is
+computed over the group graph, collapsing membership cycles (strongly connected
+components) so they cannot loop forever. The audit script can then resolve every
+user offline with '--directory-snapshot' instead of calling the API per user.
+
+Usage:
+    python directory-snapshot.py [--output directory_snapshot.json] [--workers 8]
+"""
+import json
+import argparse
+import datetime
+from workspace_api import (get_gws_service, list_all_pages, map_with_service, WorkspaceServiceError,
+                           USERS_PAGE_SIZE, GROUPS_PAGE_SIZE, MEMBERS_PAGE_SIZE)
+from run_metrics import run_metrics
+
+# --- CONFIGURATION ---
+
+SNAPSHOT_PATH = 'directory_snapshot.json'
+
+# --- SCRIPT LOGIC ---
+
+def list_all_users(service):
+    """Lists every user of the customer with their given and family names."""
+    return list_all_pages(lambda page_token: service.users().list(
+        customer='my_customer',
+        maxResults=USERS_PAGE_SIZE,
+        pageToken=page_token,
+        fields='nextPageToken,users(primaryEmail,name(givenName,familyName))'
+    ), 'users')
+
+def list_all_groups(service):
+    """Lists every group of the customer."""
+    return list_all_pages(lambda page_token: service.groups().list(
+        customer='my_customer',
+        maxResults=GROUPS_PAGE_SIZE,
+        pageToken=page_token,
+        fields='nextPageToken,groups(email,name)'
+    ), 'groups')
+
+def list_group_members(service, group_email):
+    """Lists the direct members (users and groups) of one group."""
+    members = list_all_pages(lambda page_token: service.members().list(
+        groupKey=group_email,
+        maxResults=MEMBERS_PAGE_SIZE,
+        pageToken=page_token,
+        fields='nextPageToken,members(email,type)'
+    ), 'members')
+    return [{'email': m.get('email'), 'type': m.get('type')} for m in members if m.get('email')]
+
+def strongly_connected_components(nodes, edges):
+    """
+    Returns the SCCs of a directed graph with Tarjan's algorithm (iterative).
+
+    Components are returned in reverse topological order: a component is
+    always listed after every component it has an edge to.
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(edges.get(root, ())))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, neighbours = work[-1]
+            for neighbour in neighbours:
+                if neighbour not in index:
+                    index[neighbour] = lowlink[neighbour] = counter
+                    counter += 1
+                    stack.append(neighbour)
+                    on_stack.add(neighbour)
+                    work.append((neighbour, iter(edges.get(neighbour, ()))))
+                    break
+                if neighbour in on_stack:
+                    lowlink[node] = min(lowlink[node], index[neighbour])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+def compute_group_ancestors(groups):
+    """
+    Returns {group: set of groups it is transitively a member of}.
+
+    Edges go from a nested group to the groups containing it. Tarjan's algorithm
+    yields the containing (parent) components first, so each component's
+    ancestors are computed once from its already-resolved parents.
+    """
+    parents = {email: set() for email in groups}
+    for group_email, group in groups.items():
+        for member in group['members']:
+            if member['type'] == 'GROUP' and member['email'] in groups:
+                parents[member['email']].add(group_email)
+
+    ancestors = {}
+    for component in strongly_connected_components(list(groups), parents):
+        members = set(component)
+        # Groups in a membership cycle all contain each other.
+        shared = set(members) if len(component) > 1 or any(g in parents[g] for g in component) else set()
+        for group_email in component:
+            for parent in parents[group_email]:
+                if parent not in members:
+                    shared.add(parent)
+                    shared |= ancestors[parent]
+        for group_email in component:
+            ancestors[group_email] = shared
+    return ancestors
+
+def compute_user_groups(groups):
+    """Returns {user email: sorted list of all groups (direct and nested) it belongs to}."""
+    ancestors = compute_group_ancestors(groups)
+    user_groups = {}
+    for group_email, group in groups.items():
+        for member in group['members']:
+            if member['type'] == 'USER':
+                user_groups.setdefault(member['email'], set()).update({group_email}, ancestors[group_email])
+    return {user: sorted(groups_) for user, groups_ in sorted(user_groups.items())}
+
+def main():
+    """Main function to build and save the directory snapshot."""
+    parser = argparse.ArgumentParser(description='Snapshot Google Workspace users and (nested) group memberships.')
+    parser.add_argument("--output", default=SNAPSHOT_PATH, help=f"Path of the snapshot file to write (default: {SNAPSHOT_PATH}).")
+    parser.add_argument("--workers", type=int, default=8, help='Number of groups whose members are fetched concurrently (default: 8).')
+    parser.add_argument("--run-summary", help="Write the run summary (phase timings, API calls, retries, throttles, slowest groups) to this JSON file.")
+    args = parser.parse_args()
+    run_metrics.start('directory-snapshot')
+
+    gws_service = get_gws_service()
+    if not gws_service:
+        return
+
+    print("Listing users...")
+    with run_metrics.phase('list_users'):
+        users = {
+            u['primaryEmail']: {
+                'givenName': u.get('name', {}).get('givenName'),
+                'familyName': u.get('name', {}).get('familyName')
+            }
+            for u in list_all_users(gws_service)
+        }
+    print(f"Found {len(users)} users.")
+
+    print("Listing groups...")
+    with run_metrics.phase('list_groups'):
+        group_list = list_all_groups(gws_service)
+    print(f"Found {len(group_list)} groups. Fetching members with {args.workers} worker(s)...")
+
+    def fetch_members(service, group):
+        with run_metrics.timed_item('groups', group['email']):
+            return list_group_members(service, group['email'])
+
+    with run_metrics.phase('fetch_members'):
+        try:
+            members_by_group = map_with_service(fetch_members, group_list, gws_service, args.workers)
+        except WorkspaceServiceError as e:
+            print(f"ERROR: {e}")
+            return
+    groups = {
+        group['email']: {'name': group.get('name'), 'members': members}
+        for group, members in zip(group_list, members_by_group)
+    }
+
+    print("Resolving nested group memberships...")
+    with run_metrics.phase('resolve_nesting'):
+        user_groups = compute_user_groups(groups)
+
+    snapshot = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'users': users,
+        'groups': groups,
+        'user_groups': user_groups
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=4)
+    print(f"Successfully created directory snapshot at '{args.output}' "
+          f"({len(users)} users, {len(groups)} groups, {len(user_groups)} users with memberships).")
+    run_metrics.increment('users', len(users))
+    run_metrics.increment('groups', len(groups))
+    run_metrics.report(args.run_summary)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of Admin SDK (Directory API) responses across audit runs.
+
+Name -> email lookups and group memberships barely change from one day to the
+next, so 'gdpr-access-audit-local-json.py' can keep the answers in a local
+SQLite database keyed by (kind, query):
+
+- every kind of answer has its own time-to-live, and "no unique user" answers
+  are cached too, with a shorter one,
+- the database is capped to a number of entries, the least recently used ones
+  being evicted first,
+- with 'refresh', nothing is read from the cache but the fresh answers are
+  still written to it.
+
+API errors are never cached.
+"""
+import json
+import time
+import sqlite3
+import threading
+from run_metrics import run_metrics
+
+# --- CONFIGURATION ---
+
+DIRECTORY_CACHE_PATH = 'directory_cache.db'
+DAY_SECONDS = 24 * 3600
+
+# Time-to-live per kind of answer, in seconds.
+DEFAULT_TTLS = {
+    'user_email': 30 * DAY_SECONDS,   # name -> primary email
+    'user_groups': DAY_SECONDS,       # groups of a user
+    'group_members': DAY_SECONDS,     # members of a group
+}
+# "No unique user" answers: the user may be created (or the duplicate removed) soon.
+NEGATIVE_TTL = DAY_SECONDS
+DEFAULT_MAX_ENTRIES = 200000
+# Writes are committed in batches, and the size cap is enforced at each commit.
+COMMIT_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    kind       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    used_at    REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+"""
+
+
+class DirectoryCache:
+    """SQLite-backed Directory API answers with per-kind TTLs and an LRU size cap."""
+
+    def __init__(self, path=DIRECTORY_CACHE_PATH, ttls=None, negative_ttl=NEGATIVE_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES, refresh=False):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.refresh = refresh
+        # Shared by the audit worker threads.
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def get(self, kind, key):
+        """Returns (True, value) for a fresh cached answer, (False, None) otherwise."""
+        if self.refresh:
+            run_metrics.increment('api_cache_misses')
+            return False, None
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT value, fetched_at FROM responses WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                ttl = self.negative_ttl if value is None else self.ttls[kind]
+                if now - row[1] < ttl:
+                    self.conn.execute("UPDATE responses SET used_at = ? WHERE kind = ? AND key = ?", (now, kind, key))
+                    self._written()
+                    run_metrics.increment('api_cache_hits')
+                    return True, value
+        run_metrics.increment('api_cache_misses')
+        return False, None
+
+    def put(self, kind, key, value):
+        """Stores an answer (None for a negative one)."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO responses (kind, key, value, fetched_at, used_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET value = excluded.value, fetched_at = excluded.fetched_at, used_at = excluded.used_at",
+                (kind, key, json.dumps(value), now, now))
+            self._written()
+
+    def _written(self):
+        self._pending_writes += 1
+        if self._pending_writes >= COMMIT_EVERY:
+            self._commit()
+
+    def _commit(self):
+        evicted = self.conn.execute(
+            "DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)).rowcount
+        if evicted:
+            run_metrics.increment('api_cache_evictions', evicted)
+        self.conn.commit()
+        self._pending_writes = 0
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self.conn.close()
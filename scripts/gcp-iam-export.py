@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Exports the IAM policies of GCP projects into a dated directory.
+
+Projects are discovered from a file (one project ID per line), or from every
+project under a folder or organization (folders are walked recursively). Their
+policies are then fetched concurrently through the Resource Manager API on a
+bounded worker pool, and written as '<date>/<project>-<date>.json' in the same
+format as 'gcloud projects get-iam-policy --format=json'.
+
+The export is incremental and resumable:
+- Projects already exported today (e.g. by an interrupted run) are skipped.
+- If a policy's 'etag' is the same as in the previous dated snapshot, the
+  previous file is linked instead of being rewritten.
+- Files are written to a temporary file and renamed, so a crash never leaves a
+  truncated policy behind.
+
+The API access goes through a pluggable transport: '--fake-api-dir' serves
+projects and policies from local '<project>.json' files instead of the API.
+
+Usage:
+    python gcp-iam-export.py --projects-file projects.txt
+    python gcp-iam-export.py --folder 123456789 --workers 16
+    python gcp-iam-export.py --organization 987654321
+"""
+import os
+import re
+import json
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import google.auth
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from workspace_api import execute_with_backoff
+from run_metrics import run_metrics
+
+# --- CONFIGURATION ---
+
+SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+DEFAULT_PROJECTS_FILE = 'projects.txt'
+DEFAULT_WORKERS = 8
+PAGE_SIZE = 1000
+DATE_DIR_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# --- TRANSPORTS ---
+
+class PolicyTransport:
+    """Interface of the API used to discover projects and read their IAM policies."""
+
+    def list_projects(self, parent):
+        """Returns the IDs of the active projects under `parent` ('folders/ID' or 'organizations/ID'), recursively."""
+        raise NotImplementedError
+
+    def get_iam_policy(self, project_id):
+        """Returns the IAM policy of a project as a dict (bindings, etag, version)."""
+        raise NotImplementedError
+
+
+class ResourceManagerTransport(PolicyTransport):
+    """Cloud Resource Manager v3 API, with one service object per thread."""
+
+    def __init__(self):
+        self.credentials, _ = google.auth.default(scopes=SCOPES)
+        self._local = threading.local()
+
+    def _service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = build('cloudresourcemanager', 'v3', credentials=self.credentials, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def _list_all(self, collection, item_key, parent):
+        items = []
+        page_token = None
+        while True:
+            results = execute_with_backoff(collection.list(parent=parent, pageSize=PAGE_SIZE, pageToken=page_token))
+            items.extend(results.get(item_key, []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return items
+
+    def list_projects(self, parent):
+        service = self._service()
+        project_ids = []
+        parents = [parent]
+        while parents:
+            current = parents.pop()
+            for project in self._list_all(service.projects(), 'projects', current):
+                if project.get('state') == 'ACTIVE':
+                    project_ids.append(project['projectId'])
+            parents.extend(folder['name'] for folder in self._list_all(service.folders(), 'folders', current)
+                           if folder.get('state') == 'ACTIVE')
+        return project_ids
+
+    def get_iam_policy(self, project_id):
+        return execute_with_backoff(self._service().projects().getIamPolicy(resource=f"projects/{project_id}", body={}))
+
+
+class LocalDirectoryTransport(PolicyTransport):
+    """Fake API serving '<project>.json' policy files from a local directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def list_projects(self, parent):
+        return sorted(name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def get_iam_policy(self, project_id):
+        with open(os.path.join(self.directory, f"{project_id}.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+# --- SCRIPT LOGIC ---
+
+def read_projects_file(file_path):
+    """Reads project IDs from a file, one per line ('#' starts a comment)."""
+    if not os.path.exists(file_path):
+        print(f"ERROR: Projects file not found at '{file_path}'")
+        return None
+    with open(file_path, 'r', encoding='utf-8') as f:
+        projects = [line.split('#', 1)[0].strip() for line in f]
+    return [project for project in projects if project]
+
+def find_previous_snapshot(output_root, date):
+    """Returns the most recent dated snapshot directory before `date`, or None."""
+    if not os.path.isdir(output_root):
+        return None
+    previous = sorted(name for name in os.listdir(output_root)
+                      if DATE_DIR_PATTERN.match(name) and name < date and os.path.isdir(os.path.join(output_root, name)))
+    return previous[-1] if previous else None
+
+def policy_path(output_root, date, project_id):
+    return os.path.join(output_root, date, f"{project_id}-{date}.json")
+
+def read_policy_etag(path):
+    """Returns the etag stored in an exported policy file, or None."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('etag')
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def write_json_atomically(path, data):
+    """Writes JSON to a temporary file and renames it into place."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def link_or_copy_atomically(source, path):
+    """Hard-links (or copies, if linking is not possible) `source` to `path` atomically."""
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+            dst.write(src.read())
+    os.replace(tmp_path, path)
+
+def export_project(transport, project_id, output_root, date, previous_date):
+    """Exports the policy of one project. Returns 'resumed', 'unchanged', 'written' or 'failed'."""
+    path = policy_path(output_root, date, project_id)
+    if os.path.exists(path):
+        return 'resumed'
+    try:
+        with run_metrics.timed_item('projects', project_id):
+            policy = transport.get_iam_policy(project_id)
+        if not isinstance(policy, dict):
+            raise ValueError(f"expected a JSON object, got {type(policy).__name__}")
+    except (HttpError, OSError, ValueError) as e:
+        print(f"  ERROR: Could not read the IAM policy of '{project_id}': {e}")
+        return 'failed'
+
+    try:
+        if previous_date:
+            previous_path = policy_path(output_root, previous_date, project_id)
+            if policy.get('etag') and read_policy_etag(previous_path) == policy.get('etag'):
+                link_or_copy_atomically(previous_path, path)
+                return 'unchanged'
+        write_json_atomically(path, policy)
+    except OSError as e:
+        print(f"  ERROR: Could not write the IAM policy of '{project_id}' to '{path}': {e}")
+        return 'failed'
+    print(f"  - Exported policy of '{project_id}' to '{path}'")
+    return 'written'
+
+def main():
+    """Main function to discover projects and export their IAM policies."""
+    parser = argparse.ArgumentParser(description='Export GCP project IAM policies into a dated directory.')
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument("--projects-file", help=f"File with one project ID per line (default: '{DEFAULT_PROJECTS_FILE}').")
+    scope.add_argument("--folder", help="Export every active project under this folder ID (recursively).")
+    scope.add_argument("--organization", help="Export every active project under this organization ID (recursively).")
+    parser.add_argument("--output-root", default='.', help="Directory in which the dated snapshot directory is created (default: current directory).")
+    parser.add_argument("--date", default=datetime.date.today().isoformat(), help="Snapshot date, YYYY-MM-DD (default: today).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of policies fetched concurrently (default: {DEFAULT_WORKERS}).")
+    parser.add_argument("--fake-api-dir", help="Serve projects and policies from '<project>.json' files in this directory instead of the API.")
+    parser.add_argument("--run-summary", help="Write the run summary (phase timings, API calls, retries, throttles, slowest projects) to this JSON file.")
+    args = parser.parse_args()
+    run_metrics.start('gcp-iam-export')
+
+    transport = LocalDirectoryTransport(args.fake_api_dir) if args.fake_api_dir else ResourceManagerTransport()
+
+    with run_metrics.phase('discover_projects'):
+        if args.folder:
+            print(f"Discovering projects under folder {args.folder}...")
+            projects = transport.list_projects(f"folders/{args.folder}")
+        elif args.organization:
+            print(f"Discovering projects under organization {args.organization}...")
+            projects = transport.list_projects(f"organizations/{args.organization}")
+        elif args.fake_api_dir and not args.projects_file:
+            projects = transport.list_projects(None)
+        else:
+            projects = read_projects_file(args.projects_file or DEFAULT_PROJECTS_FILE)
+    if projects is None:
+        return
+    projects = sorted(set(projects))
+    print(f"Found {len(projects)} projects.")
+
+    os.makedirs(os.path.join(args.output_root, args.date), exist_ok=True)
+    previous_date = find_previous_snapshot(args.output_root, args.date)
+    if previous_date:
+        print(f"Comparing etags with the previous snapshot '{previous_date}'.")
+
+    with run_metrics.phase('export_policies'), ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        statuses = list(executor.map(
+            lambda project_id: export_project(transport, project_id, args.output_root, args.date, previous_date),
+            projects))
+
+    counts = {status: statuses.count(status) for status in ('written', 'unchanged', 'resumed', 'failed')}
+    for status, count in counts.items():
+        run_metrics.increment(f"projects_{status}", count)
+    print(f"\n--- Export Complete: {counts['written']} written, {counts['unchanged']} unchanged, "
+          f"{counts['resumed']} already exported, {counts['failed']} failed ---")
+    run_metrics.report(args.run_summary)
+
+if __name__ == '__main__':
+    main()
@@ -2,17 +2,21 @@
 """
 GDPR Access Audit Using a Pre-built IAM Cache.
 
-This script performs an audit for a list of users provided either from a CSV file
-or a Google Group. The audit process is:
-1.  **Google Workspace:** Identifies the users to audit and finds all their Google Group memberships.
+This script performs an audit for a list of users provided from CSV files, Google
+Groups, email lists and/or the whole domain. The audit process is:
+1.  **Google Workspace:** Identifies the users to audit, once each across all the
+    sources, and finds all their Google Group memberships.
 2.  **Local IAM Cache:** Looks up the GCP project roles for the user and each of their
-    groups in a pre-compiled 'iam_cache.json' file.
+    groups in the cache pre-compiled by 'create_iam_cache.py' ('iam_cache.db', or
+    the legacy 'iam_cache.json').
+3.  **Output:** Writes one JSON record per user to 'audit/audit_records.jsonl' (read by
+    'summary.py') and/or a human-readable .txt report per user.
 
 This approach avoids making live calls to the GCP Asset Inventory API, thus bypassing
 API quotas and speeding up the process significantly.
 
 Prerequisites:
-- An 'iam_cache.json' file generated by the 'create_iam_cache.py' script.
+- An 'iam_cache.db' (or 'iam_cache.json') file generated by the 'create_iam_cache.py' script.
 - Python 3.7+
 - Google Workspace client library: pip install --upgrade google-api-python-client google-auth-httplib2 google-auth-oauthlib
 - Google Cloud SDK (gcloud CLI) installed and configured.
@@ -25,39 +29,49 @@ Setup for Local Testing:
 3. Enable the Admin SDK API in your GCP project:
    gcloud services enable admin.googleapis.com
 
-4. Run the script from your terminal using one of the two modes:
+4. Run the script from your terminal with one or more sources of users:
    - By CSV: python this_script_name.py --users-csv /path/to/users.csv
    - By Group: python this_script_name.py --group-email group@example.com
+   - By email list: python this_script_name.py --users-file affected_users.txt
+   - Whole domain: python this_script_name.py --all-users
+
+   The sources can be repeated and combined, e.g.
+   '--group-email a@example.com --group-email b@example.com --users-csv extra.csv':
+   a user found in several of them is audited once.
+
+   Add '--workers N' to run the Admin SDK lookups on N concurrent threads, or
+   '--directory-snapshot directory_snapshot.json' (see 'directory-snapshot.py')
+   to resolve users and their nested group memberships offline. With
+   '--api-cache directory_cache.db', the Admin SDK answers are kept across
+   runs (see 'directory_cache.py'); '--refresh' fetches them again.
+
+   Progress is checkpointed in 'audit/audit_manifest.jsonl' every batch of
+   users. If a run dies halfway, re-run the same command with '--resume' to
+   skip the users already audited.
 """
 import os
 import csv
 import argparse
 import json
-import google.auth
-from googleapiclient.discovery import build
+import hashlib
+import sqlite3
 from googleapiclient.errors import HttpError
+from workspace_api import (get_gws_service, execute_with_backoff, list_all_pages, map_with_service, replace_file,
+                           WorkspaceServiceError, USERS_PAGE_SIZE, GROUPS_PAGE_SIZE, MEMBERS_PAGE_SIZE)
+from directory_cache import DirectoryCache, DIRECTORY_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from run_metrics import run_metrics
 
 # --- CONFIGURATION ---
 
-SCOPES = [
-    'https://www.googleapis.com/auth/admin.directory.user.readonly',
-    'https://www.googleapis.com/auth/admin.directory.group.readonly',
-    'https://www.googleapis.com/auth/admin.directory.group.member.readonly',
-]
-IAM_CACHE_PATH = 'iam_cache.json'
+IAM_CACHE_PATH = 'iam_cache.db'
+LEGACY_IAM_CACHE_PATH = 'iam_cache.json'
+AUDIT_RECORDS_FILENAME = 'audit_records.jsonl'
+MANIFEST_FILENAME = 'audit_manifest.jsonl'
+# The manifest is saved after every batch of users, so a crash loses at most one batch.
+CHECKPOINT_BATCH_SIZE = 100
 
 # --- SCRIPT LOGIC ---
 
-def get_gws_service():
-    """Builds the Google Workspace Admin SDK service object."""
-    try:
-        creds, _ = google.auth.default(scopes=SCOPES)
-        service = build('admin', 'directory_v1', credentials=creds)
-        return service
-    except Exception as e:
-        print(f"ERROR: Could not build Google Workspace service: {e}")
-        return None
-
 def read_users_from_csv(file_path):
     """Reads user names from a CSV file."""
     if not os.path.exists(file_path):
@@ -78,17 +92,34 @@ def read_users_from_csv(file_path):
         print(f"An error occurred reading the CSV file: {e}")
         return None
 
-def find_user_email(service, first_name, last_name):
+def read_users_from_file(file_path):
+    """Reads user emails from a text file, one per line (e.g. 'affected_users.txt' from snapshot-diff.py)."""
+    if not os.path.exists(file_path):
+        print(f"ERROR: Users file not found at '{file_path}'")
+        return None
+    with open(file_path, 'r', encoding='utf-8') as f:
+        emails = [line.strip() for line in f if line.strip()]
+    print(f"Successfully read {len(emails)} users from '{file_path}'.")
+    return emails
+
+def find_user_email(service, first_name, last_name, cache=None):
     """Finds a user's primary email by their first and last name."""
+    query = f"givenName:'{first_name}' familyName:'{last_name}'"
+    if cache:
+        cached, email = cache.get('user_email', query)
+        if cached:
+            if not email:
+                print(f"  INFO: Could not find a unique user for {first_name} {last_name} (cached). Skipping.")
+            return email
     try:
-        query = f"givenName:'{first_name}' familyName:'{last_name}'"
-        results = service.users().list(query=query, customer='my_customer', maxResults=2, fields='users(primaryEmail)').execute()
+        results = execute_with_backoff(service.users().list(query=query, customer='my_customer', maxResults=2, fields='users(primaryEmail)'))
         users = results.get('users', [])
-        if len(users) == 1:
-            return users[0].get('primaryEmail')
-        else:
+        email = users[0].get('primaryEmail') if len(users) == 1 else None
+        if cache:
+            cache.put('user_email', query, email)
+        if not email:
             print(f"  INFO: Could not find a unique user for {first_name} {last_name}. Skipping.")
-            return None
+        return email
     except HttpError as error:
         print(f"  ERROR: An API error occurred searching for {first_name} {last_name}: {error}")
         return None
@@ -96,25 +127,23 @@ def find_user_email(service, first_name, last_name):
         print(f"  ERROR: A network timeout occurred while searching for {first_name} {last_name}. Skipping.")
         return None
 
-def get_all_group_members(service, group_key):
+def get_all_group_members(service, group_key, cache=None):
     """Fetches all members from a given Google Group."""
-    members = []
-    page_token = None
+    if cache:
+        cached, members = cache.get('group_members', group_key)
+        if cached:
+            print(f"Found {len(members)} user members in group '{group_key}' (cached).")
+            return members
     try:
-        while True:
-            results = service.members().list(
-                groupKey=group_key,
-                pageToken=page_token,
-                fields='nextPageToken,members(email,id,type)'
-            ).execute()
-            
-            group_members = results.get('members', [])
-            if group_members:
-                members.extend([m for m in group_members if m.get('type') == 'USER'])
-
-            page_token = results.get('nextPageToken')
-            if not page_token:
-                break
+        members = list_all_pages(lambda page_token: service.members().list(
+            groupKey=group_key,
+            maxResults=MEMBERS_PAGE_SIZE,
+            pageToken=page_token,
+            fields='nextPageToken,members(email,id,type)'
+        ), 'members')
+        members = [m for m in members if m.get('type') == 'USER']
+        if cache:
+            cache.put('group_members', group_key, members)
         print(f"Found {len(members)} user members in group '{group_key}'.")
         return members
     except HttpError as error:
@@ -124,144 +153,580 @@ def get_all_group_members(service, group_key):
         print(f"  ERROR: A network timeout occurred while fetching members for group '{group_key}'.")
         return []
 
-def get_groups_for_user(service, user_key):
-    """Retrieves all groups a specific user is a member of."""
+def get_groups_for_user(service, user_key, cache=None):
+    """
+    Retrieves all groups a specific user is a member of. Returns None if they
+    could not be fetched, which is not the same as a member of no groups.
+    """
+    if cache:
+        cached, groups = cache.get('user_groups', user_key)
+        if cached:
+            return groups
     try:
-        results = service.groups().list(userKey=user_key, fields='groups(name,email)').execute()
-        return results.get('groups', [])
+        groups = list_all_pages(lambda page_token: service.groups().list(
+            userKey=user_key,
+            maxResults=GROUPS_PAGE_SIZE,
+            pageToken=page_token,
+            fields='nextPageToken,groups(name,email)'
+        ), 'groups')
+        if cache:
+            cache.put('user_groups', user_key, groups)
+        return groups
     except HttpError as error:
         print(f"  ERROR fetching groups for {user_key}: {error}")
-        return []
+        return None
     except TimeoutError:
         print(f"  ERROR: A network timeout occurred while fetching groups for {user_key}. Skipping.")
-        return []
+        return None
+
+def get_all_users(service):
+    """Lists the primary email of every user of the customer. Returns None on error."""
+    try:
+        users = list_all_pages(lambda page_token: service.users().list(
+            customer='my_customer',
+            maxResults=USERS_PAGE_SIZE,
+            pageToken=page_token,
+            fields='nextPageToken,users(primaryEmail)'
+        ), 'users')
+        print(f"Found {len(users)} users in the domain.")
+        return [user['primaryEmail'] for user in users]
+    except HttpError as error:
+        print(f"ERROR: An API error occurred listing the users of the domain: {error}")
+        return None
+    except TimeoutError:
+        print("ERROR: A network timeout occurred while listing the users of the domain.")
+        return None
+
+
+class DirectorySnapshot:
+    """
+    Offline view of the directory built by 'directory-snapshot.py'.
+
+    Answers the same questions as the Admin SDK helpers above, but from the
+    local membership graph, including groups inherited through nested groups.
+    """
+
+    def __init__(self, snapshot):
+        self.groups = snapshot.get('groups', {})
+        self.users = snapshot.get('users', {})
+        self.user_groups = snapshot.get('user_groups', {})
+        self.emails_by_name = {}
+        for email, name in snapshot.get('users', {}).items():
+            key = ((name.get('givenName') or '').casefold(), (name.get('familyName') or '').casefold())
+            self.emails_by_name.setdefault(key, []).append(email)
+
+    def find_user_email(self, first_name, last_name):
+        emails = self.emails_by_name.get((first_name.casefold(), last_name.casefold()), [])
+        if len(emails) == 1:
+            return emails[0]
+        print(f"  INFO: Could not find a unique user for {first_name} {last_name}. Skipping.")
+        return None
+
+    def get_all_group_members(self, group_key):
+        members = [{'email': user, 'type': 'USER'} for user, groups in self.user_groups.items() if group_key in groups]
+        print(f"Found {len(members)} user members (including nested groups) in group '{group_key}'.")
+        return members
+
+    def get_groups_for_user(self, user_key):
+        return [{'email': g, 'name': self.groups.get(g, {}).get('name')} for g in self.user_groups.get(user_key, [])]
+
+    def get_all_users(self):
+        print(f"Found {len(self.users)} users in the domain.")
+        return list(self.users)
+
+def load_directory_snapshot(snapshot_path):
+    """Loads a directory snapshot file written by 'directory-snapshot.py'."""
+    if not os.path.exists(snapshot_path):
+        print(f"ERROR: Directory snapshot not found at '{snapshot_path}'")
+        print("Please run the 'directory-snapshot.py' script first.")
+        return None
+    try:
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            print(f"Loading directory snapshot from '{snapshot_path}'...")
+            return DirectorySnapshot(json.load(f))
+    except json.JSONDecodeError:
+        print(f"ERROR: Could not decode JSON from '{snapshot_path}'. The file may be corrupt.")
+        return None
+
+class JsonIamCache:
+    """IAM cache loaded in memory from the legacy 'iam_cache.json' format."""
 
+    def __init__(self, data):
+        self.data = data
+        self.version = None
+
+    def lookup(self, cache_type, identity):
+        return self.data.get(cache_type, {}).get(identity) or []
+
+class SqliteIamCache:
+    """
+    Read-only view of the indexed 'iam_cache.db' store.
+
+    Nothing is loaded up front: each lookup is one query on the
+    (cache_type, identity) index, and the file is memory-mapped by SQLite.
+    """
+
+    LOOKUP_QUERY = """
+        SELECT p.value, r.value
+        FROM bindings b
+        JOIN strings p ON p.id = b.project_id
+        JOIN strings r ON r.id = b.role_id
+        WHERE b.cache_type = ? AND b.identity_id = (SELECT id FROM strings WHERE value = ?)
+        ORDER BY p.value, r.value
+    """
+
+    def __init__(self, cache_path):
+        self.conn = sqlite3.connect(f"file:{cache_path}?mode=ro", uri=True)
+        self.conn.execute("PRAGMA mmap_size = 268435456")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        self.version = row[0] if row else None
+
+    def lookup(self, cache_type, identity):
+        return [{'project': project, 'role': role} for project, role in self.conn.execute(self.LOOKUP_QUERY, (cache_type, identity))]
 
 def load_iam_cache(cache_path):
-    """Loads the IAM permissions cache from a JSON file."""
+    """Opens the IAM permissions cache (SQLite store, or legacy JSON file)."""
     if not os.path.exists(cache_path):
         print(f"ERROR: IAM cache file not found at '{cache_path}'")
         print("Please run the 'create_iam_cache.py' script first.")
         return None
+    if not cache_path.endswith('.json'):
+        try:
+            print(f"Opening IAM cache '{cache_path}'...")
+            return SqliteIamCache(cache_path)
+        except sqlite3.DatabaseError as e:
+            print(f"ERROR: Could not open the IAM cache '{cache_path}'. The file may be corrupt. Details: {e}")
+            return None
     try:
         with open(cache_path, 'r', encoding='utf-8') as f:
             print(f"Loading IAM cache from '{cache_path}'...")
-            return json.load(f)
+            return JsonIamCache(json.load(f))
     except json.JSONDecodeError:
         print(f"ERROR: Could not decode JSON from '{cache_path}'. The file may be corrupt.")
         return None
 
 def get_permissions_from_cache(identity_email, cache_type, iam_cache):
-    """Looks up permissions for a user or group in the cache and formats them."""
-    report_lines = []
-    permissions = iam_cache.get(cache_type, {}).get(identity_email)
+    """Looks up the permissions of a user or group in the cache."""
+    permissions = iam_cache.lookup(cache_type, identity_email)
+    return [{'project': perm.get('project'), 'role': perm.get('role')} for perm in permissions]
 
+def format_permissions(permissions):
+    """Formats a list of permissions for the .txt report."""
     if not permissions:
-        report_lines.append("  -> No GCP access found in cache.")
-        return "\n".join(report_lines)
+        return "  -> No GCP access found in cache."
 
+    report_lines = []
     for perm in permissions:
         report_lines.append(f"\n  Project: {perm.get('project')}")
         report_lines.append(f"    - Role: {perm.get('role')}")
-    
     return "\n".join(report_lines)
 
+def build_user_record(user_data, audit_source_info, user_groups, iam_cache):
+    """Builds the structured audit record of one user from already-fetched data."""
+    user_email = user_data['email']
+    first_name = user_data.get('FirstName')
+    last_name = user_data.get('LastName')
+    if first_name and last_name:
+        display_name = f"{first_name} {last_name} ({user_email})"
+    else:
+        display_name = user_email
+
+    return {
+        'user': user_email,
+        'first_name': first_name,
+        'last_name': last_name,
+        'display_name': display_name,
+        'source': audit_source_info,
+        'direct': get_permissions_from_cache(user_email, "users", iam_cache),
+        'groups': [
+            {
+                'email': group.get('email'),
+                'name': group.get('name'),
+                'access': get_permissions_from_cache(group.get('email'), "groups", iam_cache)
+            }
+            for group in sorted(user_groups, key=lambda g: g.get('email') or '')
+        ]
+    }
+
+def write_user_report(output_dir, record):
+    """Renders the human-readable .txt audit report of one user."""
+    first_name = record['first_name']
+    last_name = record['last_name']
+    if first_name and last_name:
+        report_filename = f"{first_name}_{last_name}.txt"
+    else:
+        report_filename = f"{record['user'].split('@')[0]}.txt"
+
+    report_filepath = os.path.join(output_dir, report_filename)
+    replace_file(report_filepath, lambda path: render_user_report(path, record))
+    print(f"  -> Report saved to: {report_filepath}")
+
+def render_user_report(report_filepath, record):
+    with open(report_filepath, 'w', encoding='utf-8') as f:
+        f.write(f"Access Report for: {record['display_name']}\n")
+        f.write(f"{record['source']}\n")
+        f.write("="*60 + "\n")
+
+        # 1. User's direct GCP access from the cache
+        f.write("\n1. Direct GCP Access (from cache)\n")
+        f.write("----------------------------------\n")
+        f.write(format_permissions(record['direct']))
+        f.write("\n")
+
+        # 2. GCP access of the user's groups from the cache
+        f.write("\n2. Inherited GCP Access via Google Groups (from cache)\n")
+        f.write("-----------------------------------------------------\n")
+
+        if not record['groups']:
+            f.write("User is not a member of any Google Groups.\n")
+        else:
+            for group in record['groups']:
+                f.write(f"\nAccess for Group: '{group['name']}' ({group['email']})\n")
+                f.write(format_permissions(group['access']))
+                f.write("\n")
+
+# --- RUN MANIFEST ---
+# The manifest is an append-only JSONL file: a header with the version of the
+# IAM cache the records are built from, then one line per audited user with a
+# fingerprint of their group memberships, and a last line once the run is
+# complete. '--resume' skips the listed users if the IAM cache is unchanged.
+
+def membership_fingerprint(user_groups):
+    emails = sorted(group.get('email') or '' for group in user_groups)
+    return hashlib.sha256('\n'.join(emails).encode('utf-8')).hexdigest()[:16]
+
+def iam_cache_fingerprint(cache_path, iam_cache):
+    """The version stored in the SQLite cache, or the modification time of a legacy JSON cache."""
+    if iam_cache.version is not None:
+        return str(iam_cache.version)
+    return f"mtime:{os.path.getmtime(cache_path)}"
+
+def read_manifest(manifest_path):
+    """Returns the manifest header and {email: entry} of the audited users, or (None, {})."""
+    if not os.path.exists(manifest_path):
+        return None, {}
+    header = None
+    users = {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Line cut short by a crash.
+            if header is None:
+                header = entry
+            elif 'user' in entry:
+                # Manifests written before emails were casefolded may hold other forms.
+                entry['user'] = entry['user'].casefold()
+                users[entry['user']] = entry
+    return header, users
+
+def read_completed_manifest(manifest_path, cache_version, output_format):
+    """Returns {email: {'user', 'groups', 'name'}} of the users a previous run completed."""
+    header, users = read_manifest(manifest_path)
+    if header is None:
+        print(f"No run manifest found at '{manifest_path}', starting from the first user.")
+        return {}
+    if header.get('iam_cache_version') != cache_version:
+        print("WARNING: The IAM cache changed since the previous run. Auditing all users again.")
+        return {}
+    if header.get('output_format') != output_format:
+        print(f"WARNING: The previous run wrote '{header.get('output_format')}' output. Auditing all users again.")
+        return {}
+    return users
+
+def start_manifest(manifest_path, header, completed):
+    """Rewrites the manifest with the users kept from the previous run, and opens it for appending."""
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header) + "\n")
+            f.writelines(json.dumps(entry) + "\n" for entry in completed.values())
+    replace_file(manifest_path, write)
+    return open(manifest_path, 'a', encoding='utf-8')
+
+def sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+def read_completed_records(paths, users):
+    """
+    Returns the JSONL lines of the first valid record of each of `users`, from
+    the first existing file in `paths`. A line cut short by a crash is dropped.
+    """
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        lines = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    user = json.loads(line)['user'].casefold()
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue
+                if user in users and user not in lines:
+                    lines[user] = line if line.endswith('\n') else line + '\n'
+        return lines
+    return {}
+
 def main():
     """Main function to orchestrate the audit process."""
     parser = argparse.ArgumentParser(description='GDPR Access Audit using a pre-built IAM cache.')
-    group = parser.add_mutually_exclusive_group(required=True)
-    group.add_argument("--users-csv", help='Path to the input CSV file with FirstName and LastName columns.')
-    group.add_argument("--group-email", help='Email address of a Google Group to audit its members.')
+    sources = parser.add_argument_group('users to audit', 'At least one source; sources can be repeated and combined, each user is audited once.')
+    sources.add_argument("--users-csv", action='append', help='Path to an input CSV file with FirstName and LastName columns.')
+    sources.add_argument("--group-email", action='append', help='Email address of a Google Group to audit its members.')
+    sources.add_argument("--users-file", action='append', help='Path to a text file with one user email per line (e.g. from snapshot-diff.py).')
+    sources.add_argument("--all-users", action='store_true', help='Audit every user of the domain.')
+    parser.add_argument("--workers", type=int, default=1, help='Number of concurrent Admin SDK requests (default: 1, sequential).')
+    parser.add_argument("--output-format", choices=['both', 'jsonl', 'txt'], default='both',
+                        help=f"Write the machine-readable '{AUDIT_RECORDS_FILENAME}' stream, the .txt reports, or both (default).")
+    parser.add_argument("--iam-cache", help=f"IAM cache built by create_iam_cache.py (default: '{IAM_CACHE_PATH}', or '{LEGACY_IAM_CACHE_PATH}' if it does not exist).")
+    parser.add_argument("--directory-snapshot", help='Resolve users and groups offline from this snapshot (see directory-snapshot.py) instead of the Admin SDK.')
+    parser.add_argument("--api-cache", nargs='?', const=DIRECTORY_CACHE_PATH,
+                        help=f"Keep the Admin SDK answers across runs in this SQLite file (default if no path is given: '{DIRECTORY_CACHE_PATH}').")
+    parser.add_argument("--api-cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help=f"Maximum number of cached answers, least recently used first out (default: {DEFAULT_MAX_ENTRIES}).")
+    parser.add_argument("--refresh", action='store_true', help="Ignore the cached Admin SDK answers, fetch them again and update the cache.")
+    parser.add_argument("--output-dir", default='audit', help="Directory in which the reports are written (default: 'audit').")
+    parser.add_argument("--resume", action='store_true',
+                        help=f"Skip the users already audited by an interrupted run, as listed in '<output-dir>/{MANIFEST_FILENAME}'.")
+    parser.add_argument("--run-summary", help="Write the run summary (phase timings, API calls, retries, throttles) to this JSON file.")
     
     args = parser.parse_args()
+    if not (args.users_csv or args.group_email or args.users_file or args.all_users):
+        parser.error("give at least one of --users-csv, --group-email, --users-file or --all-users")
+    run_metrics.start('gdpr-access-audit')
 
     # Create output directory
-    output_dir = "audit"
+    output_dir = args.output_dir
     os.makedirs(output_dir, exist_ok=True)
     print(f"Audit reports will be saved in the '{output_dir}/' directory.")
 
     # Load the IAM cache
-    iam_cache = load_iam_cache(IAM_CACHE_PATH)
+    iam_cache_path = args.iam_cache or (IAM_CACHE_PATH if os.path.exists(IAM_CACHE_PATH) else LEGACY_IAM_CACHE_PATH)
+    with run_metrics.phase('load_iam_cache'):
+        iam_cache = load_iam_cache(iam_cache_path)
     if not iam_cache:
         return
 
-    # Initialize Workspace service
-    gws_service = get_gws_service()
-    if not gws_service:
-        return
-
-    # --- Determine list of users to process based on mode ---
-    users_to_audit = []
-    audit_source_info = ""
-    if args.users_csv:
-        audit_source_info = f"Source: CSV file '{args.users_csv}'"
-        users_from_csv = read_users_from_csv(args.users_csv)
-        if not users_from_csv:
+    # Initialize Workspace service, or the offline directory snapshot
+    gws_service = None
+    directory = None
+    api_cache = None
+    if args.directory_snapshot:
+        directory = load_directory_snapshot(args.directory_snapshot)
+        if not directory:
             return
-        for user_info in users_from_csv:
-            email = find_user_email(gws_service, user_info['FirstName'], user_info['LastName'])
-            if email:
-                users_to_audit.append({'email': email, 'FirstName': user_info['FirstName'], 'LastName': user_info['LastName']})
-    
-    elif args.group_email:
-        audit_source_info = f"Source: Google Group '{args.group_email}'"
-        members = get_all_group_members(gws_service, args.group_email)
-        for member in members:
-            users_to_audit.append({'email': member.get('email'), 'FirstName': None, 'LastName': None})
-
-    print("\n--- Starting Audit from Cache ---")
-    for user_data in users_to_audit:
-        user_email = user_data['email']
-        first_name = user_data.get('FirstName')
-        last_name = user_data.get('LastName')
+    else:
+        gws_service = get_gws_service()
+        if not gws_service:
+            return
+        if args.api_cache:
+            print(f"Using the Admin SDK answer cache '{args.api_cache}'" + (" (refresh)." if args.refresh else "."))
+            api_cache = DirectoryCache(args.api_cache, max_entries=args.api_cache_max_entries, refresh=args.refresh)
 
-        if not user_email:
-            continue
+    try:
+        finished = run_audit(args, output_dir, iam_cache, gws_service, directory, api_cache,
+                             iam_cache_fingerprint(iam_cache_path, iam_cache))
+    except WorkspaceServiceError as e:
+        print(f"ERROR: {e} The users audited so far are kept for '--resume'.")
+        return
+    finally:
+        if api_cache:
+            api_cache.close()
+    if not finished:
+        return
 
-        # Determine filename and display name
-        if first_name and last_name:
-            display_name = f"{first_name} {last_name} ({user_email})"
-            report_filename = f"{first_name}_{last_name}.txt"
+    print("\n--- Audit Complete ---")
+    run_metrics.report(args.run_summary)
+
+def source_labels(args):
+    """The input sources of the run, in the order they are read."""
+    labels = ([f"CSV file '{path}'" for path in args.users_csv or []]
+              + [f"users file '{path}'" for path in args.users_file or []]
+              + [f"Google Group '{group_email}'" for group_email in args.group_email or []]
+              + (["all users"] if args.all_users else []))
+    return list(dict.fromkeys(labels))
+
+def collect_users(args, gws_service, directory, api_cache, completed):
+    """
+    Resolves the users of every input source, deduplicated by email (case-insensitive)
+    before any per-user work, in order of first appearance. Emails are casefolded
+    once here, so the manifest, the resume lookups and the records all use the same
+    form. Each user lists the sources it was found in. Returns None if an input
+    could not be read.
+    """
+    users = {}
+    collected = 0
+
+    def add(email, source, first_name=None, last_name=None):
+        nonlocal collected
+        if not email:
+            return
+        collected += 1
+        email = email.casefold()
+        user_data = users.setdefault(email, {'email': email, 'FirstName': None, 'LastName': None, 'sources': []})
+        if first_name and not user_data['FirstName']:
+            user_data['FirstName'], user_data['LastName'] = first_name, last_name
+        if source not in user_data['sources']:
+            user_data['sources'].append(source)
+
+    # Read every input file before the first API call.
+    csv_rows = []
+    for path in args.users_csv or []:
+        rows = read_users_from_csv(path)
+        if not rows:
+            return None
+        csv_rows.extend((path, (row['FirstName'], row['LastName'])) for row in rows)
+    file_emails = []
+    for path in args.users_file or []:
+        emails = read_users_from_file(path)
+        if emails is None:
+            return None
+        file_emails.append((path, emails))
+
+    with run_metrics.phase('resolve_users'):
+        # Each distinct name is looked up once, and the names already resolved
+        # by an interrupted run are not looked up again.
+        resolved = {tuple(entry['name']): email for email, entry in completed.items() if entry.get('name')}
+        to_resolve = [name for name in dict.fromkeys(name for _, name in csv_rows) if name not in resolved]
+        if directory:
+            emails = [directory.find_user_email(first_name, last_name) for first_name, last_name in to_resolve]
+        else:
+            emails = map_with_service(
+                lambda service, name: find_user_email(service, name[0], name[1], api_cache),
+                to_resolve, gws_service, args.workers)
+        resolved.update(zip(to_resolve, emails))
+
+        # Groups are listed concurrently, each one once.
+        group_emails = list(dict.fromkeys(args.group_email or []))
+        if directory:
+            members_by_group = [directory.get_all_group_members(group_email) for group_email in group_emails]
         else:
-            display_name = user_email
-            report_filename = f"{user_email.split('@')[0]}.txt"
-        
-        print(f"\nProcessing user: {display_name}")
-        
-        report_filepath = os.path.join(output_dir, report_filename)
-        
-        with open(report_filepath, 'w', encoding='utf-8') as f:
-            f.write(f"Access Report for: {display_name}\n")
-            f.write(f"{audit_source_info}\n")
-            f.write("="*60 + "\n")
-
-            # 1. Look up user's direct GCP access in the cache
-            f.write("\n1. Direct GCP Access (from cache)\n")
-            f.write("----------------------------------\n")
-            user_access_report = get_permissions_from_cache(user_email, "users", iam_cache)
-            f.write(user_access_report)
-            f.write("\n")
-
-            # 2. Get user's groups and look up their GCP access in the cache
-            f.write("\n2. Inherited GCP Access via Google Groups (from cache)\n")
-            f.write("-----------------------------------------------------\n")
-            user_groups = get_groups_for_user(gws_service, user_email)
-
-            if not user_groups:
-                f.write("User is not a member of any Google Groups.\n")
-            else:
-                for group in user_groups:
-                    group_email = group.get('email')
-                    group_name = group.get('name')
-                    f.write(f"\nAccess for Group: '{group_name}' ({group_email})\n")
-                    
-                    group_access_report = get_permissions_from_cache(group_email, "groups", iam_cache)
-                    f.write(group_access_report)
-                    f.write("\n")
-        
-        print(f"  -> Report saved to: {report_filepath}")
+            members_by_group = map_with_service(
+                lambda service, group_email: get_all_group_members(service, group_email, api_cache),
+                group_emails, gws_service, args.workers)
+
+        all_users = []
+        if args.all_users:
+            all_users = directory.get_all_users() if directory else get_all_users(gws_service)
+            if all_users is None:
+                return None
 
-    print("\n--- Audit Complete ---")
+    for path, name in csv_rows:
+        add(resolved[name], f"CSV file '{path}'", *name)
+    for path, emails in file_emails:
+        for email in emails:
+            add(email, f"users file '{path}'")
+    for group_email, members in zip(group_emails, members_by_group):
+        for member in members:
+            add(member.get('email'), f"Google Group '{group_email}'")
+    for email in all_users:
+        add(email, "all users")
+
+    if collected > len(users):
+        print(f"{len(users)} distinct users to audit ({collected - len(users)} duplicates removed).")
+    return list(users.values())
+
+def run_audit(args, output_dir, iam_cache, gws_service, directory, api_cache, cache_version):
+    """Resolves the users to audit, fetches their groups and writes the reports. Returns False if the input could not be read."""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    completed = read_completed_manifest(manifest_path, cache_version, args.output_format) if args.resume else {}
+
+    users_to_audit = collect_users(args, gws_service, directory, api_cache, completed)
+    if users_to_audit is None:
+        return False
+    audit_source_info = "Source: " + ", ".join(source_labels(args))
+
+    # --- Resume: keep the users completed by the previous run ---
+    emails_to_audit = {user_data['email'] for user_data in users_to_audit}
+    completed = {email: entry for email, entry in completed.items() if email in emails_to_audit}
+    if completed and directory:
+        # Offline lookups are free: audit again the users whose groups changed since.
+        completed = {email: entry for email, entry in completed.items()
+                     if entry.get('groups') == membership_fingerprint(directory.get_groups_for_user(email))}
+
+    records_file = None
+    records_path = os.path.join(output_dir, AUDIT_RECORDS_FILENAME)
+    partial_path = records_path + '.partial'
+    if args.output_format in ('both', 'jsonl'):
+        # Records are appended to a partial file, renamed into place once all users are done.
+        kept_records = read_completed_records([partial_path, records_path], completed)
+        completed = {email: entry for email, entry in completed.items() if email in kept_records}
+        def write_kept_records(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(kept_records[user_data['email']] for user_data in users_to_audit if user_data['email'] in kept_records)
+        replace_file(partial_path, write_kept_records)
+        records_file = open(partial_path, 'a', encoding='utf-8')
+
+    pending = [user_data for user_data in users_to_audit if user_data['email'] not in completed]
+    if args.resume:
+        print(f"Resuming: {len(completed)} users already audited, {len(pending)} to go.")
+        run_metrics.increment('users_resumed', len(completed))
+    header = {'source': audit_source_info, 'output_format': args.output_format, 'iam_cache_version': cache_version}
+    manifest_file = start_manifest(manifest_path, header, completed)
+    audited = len(completed)
+    failed = []
+
+    # --- Fetch and report stages, one batch at a time, in input order so the output is deterministic ---
+    try:
+        for start in range(0, len(pending), CHECKPOINT_BATCH_SIZE):
+            batch = pending[start:start + CHECKPOINT_BATCH_SIZE]
+            with run_metrics.phase('fetch_groups'):
+                if directory:
+                    print(f"\n--- Resolving Group Memberships offline ({len(batch)} users) ---")
+                    groups_by_user = [directory.get_groups_for_user(user_data['email']) for user_data in batch]
+                else:
+                    print(f"\n--- Fetching Group Memberships ({len(batch)} users, {args.workers} worker(s)) ---")
+                    groups_by_user = map_with_service(
+                        lambda service, user_data: get_groups_for_user(service, user_data['email'], api_cache),
+                        batch, gws_service, args.workers)
+            # Users whose groups could not be fetched get no record and stay out
+            # of the manifest, so that '--resume' audits them again.
+            failed.extend(user_data['email'] for user_data, user_groups in zip(batch, groups_by_user) if user_groups is None)
+            fetched = [(user_data, user_groups) for user_data, user_groups in zip(batch, groups_by_user) if user_groups is not None]
+            run_metrics.increment('users_failed', len(batch) - len(fetched))
+            batch = [user_data for user_data, _ in fetched]
+            groups_by_user = [user_groups for _, user_groups in fetched]
+
+            print("\n--- Starting Audit from Cache ---")
+            with run_metrics.phase('write_reports'):
+                for user_data, user_groups in zip(batch, groups_by_user):
+                    record = build_user_record(user_data, "Source: " + ", ".join(user_data['sources']), user_groups, iam_cache)
+                    print(f"\nProcessing user: {record['display_name']}")
+                    if records_file:
+                        records_file.write(json.dumps(record) + "\n")
+                    if args.output_format in ('both', 'txt'):
+                        write_user_report(output_dir, record)
+                    run_metrics.increment('records_written')
+                # The records must be on disk before the manifest lists their users.
+                if records_file:
+                    sync(records_file)
+                for user_data, user_groups in zip(batch, groups_by_user):
+                    manifest_file.write(json.dumps({
+                        'user': user_data['email'],
+                        'groups': membership_fingerprint(user_groups),
+                        'name': [user_data['FirstName'], user_data['LastName']] if user_data['FirstName'] else None
+                    }) + "\n")
+                sync(manifest_file)
+            # Counted once on disk, so that an interrupted run reports what it really did.
+            run_metrics.increment('users_audited', len(batch))
+            audited += len(batch)
+            print(f"\nCheckpoint: {audited}/{len(users_to_audit)} users audited.")
+
+        if records_file:
+            records_file.close()
+            os.replace(partial_path, records_path)
+            print(f"\nAudit records saved to: {records_path}")
+        if not failed:
+            manifest_file.write(json.dumps({'complete': True}) + "\n")
+    finally:
+        if records_file:
+            records_file.close()
+        manifest_file.close()
+    if failed:
+        print(f"\nWARNING: The groups of {len(failed)} users could not be fetched, so they were not audited "
+              f"(e.g. {', '.join(failed[:5])}). Re-run the same command with '--resume' to audit them.")
+    return True
 
 if __name__ == '__main__':
     main()
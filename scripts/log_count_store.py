@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent, incremental store of log activity counts for 'summary.py'.
+
+Counts are kept in a local SQLite database per (project, principal, day), with
+a per-project high-water mark. A later run only fetches the entries written
+since that checkpoint, and the window rolls forward by dropping day buckets
+older than the window. Principals that were not tracked yet for a project are
+backfilled once over the whole window.
+"""
+import sqlite3
+import datetime
+
+# --- CONFIGURATION ---
+
+LOG_STORE_PATH = 'log_counts.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_counts (
+    project   TEXT NOT NULL,
+    principal TEXT NOT NULL,
+    day       TEXT NOT NULL,
+    count     INTEGER NOT NULL,
+    PRIMARY KEY (project, principal, day)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    project    TEXT PRIMARY KEY,
+    high_water TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracked_principals (
+    project   TEXT NOT NULL,
+    principal TEXT NOT NULL,
+    PRIMARY KEY (project, principal)
+);
+"""
+
+
+def parse_timestamp(value):
+    return datetime.datetime.fromisoformat(value)
+
+
+class LogCountStore:
+    """SQLite-backed daily log counts with per-project checkpoints."""
+
+    def __init__(self, path=LOG_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get_checkpoint(self, project):
+        row = self.conn.execute("SELECT high_water FROM checkpoints WHERE project = ?", (project,)).fetchone()
+        return parse_timestamp(row[0]) if row else None
+
+    def get_tracked(self, project):
+        rows = self.conn.execute("SELECT principal FROM tracked_principals WHERE project = ?", (project,))
+        return {row[0] for row in rows}
+
+    def apply(self, project, daily_counts, principals, high_water, reset=False):
+        """
+        Adds {(principal, day): count} to the store and moves the project checkpoint.
+
+        `principals` becomes the set of tracked principals for the project; the
+        buckets of principals that are no longer tracked are dropped. With
+        `reset`, all previous buckets of the project are dropped first.
+        """
+        with self.conn:
+            if reset:
+                self.conn.execute("DELETE FROM daily_counts WHERE project = ?", (project,))
+            previous = self.get_tracked(project)
+            for principal in previous - set(principals):
+                self.conn.execute("DELETE FROM daily_counts WHERE project = ? AND principal = ?", (project, principal))
+            self.conn.executemany(
+                "INSERT INTO daily_counts (project, principal, day, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (project, principal, day) DO UPDATE SET count = count + excluded.count",
+                [(project, principal, day, count) for (principal, day), count in daily_counts.items()])
+            self.conn.execute("DELETE FROM tracked_principals WHERE project = ?", (project,))
+            self.conn.executemany("INSERT INTO tracked_principals (project, principal) VALUES (?, ?)",
+                                  [(project, principal) for principal in principals])
+            self.conn.execute(
+                "INSERT INTO checkpoints (project, high_water) VALUES (?, ?) "
+                "ON CONFLICT (project) DO UPDATE SET high_water = excluded.high_water",
+                (project, high_water.isoformat()))
+
+    def drop_before(self, first_day):
+        """Rolls the window forward by deleting the day buckets older than `first_day`."""
+        with self.conn:
+            self.conn.execute("DELETE FROM daily_counts WHERE day < ?", (first_day,))
+
+    def daily_series(self, first_day):
+        """Returns {(project, principal): {day: count}} for the days since `first_day`."""
+        series = {}
+        rows = self.conn.execute(
+            "SELECT project, principal, day, count FROM daily_counts WHERE day >= ? ORDER BY project, principal, day",
+            (first_day,))
+        for project, principal, day, count in rows:
+            series.setdefault((project, principal), {})[day] = count
+        return series
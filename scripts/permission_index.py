@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Permission-level index: "who can do X on project Y".
+
+The audit reports stop at role names. This module expands them into IAM
+permissions with an offline role catalogue ({role: [permissions]}) exported
+once from the IAM API, and compiled into a bitset index:
+
+- every permission gets an integer ID,
+- every role is stored as an integer with one bit set per permission it
+  includes, so the permissions of several roles are a bitwise OR, and testing
+  whether a role grants a permission is a single AND.
+
+The compiled index ('json/permission_index.json') is read by 'app.py' and by
+the queries below, which answer from the reports written by 'summary.py'.
+
+Usage:
+    python permission_index.py export --output role_catalogue.json [--projects-file projects.txt] [--organization ID]
+    python permission_index.py compile --catalogue role_catalogue.json
+    python permission_index.py who-can --permission storage.objects.get --project oat-prod-eu
+    python permission_index.py user-permissions --email user@example.com [--project oat-prod-eu]
+"""
+import os
+import json
+import argparse
+
+# --- CONFIGURATION ---
+
+ROLE_CATALOGUE_PATH = 'role_catalogue.json'
+PERMISSION_INDEX_FILENAME = 'permission_index.json'
+JSON_OUTPUT_DIR = 'json'
+PAGE_SIZE = 1000
+
+# --- INDEX ---
+
+class PermissionIndex:
+    """Role -> permissions bitsets, with forward and reverse lookups."""
+
+    def __init__(self, permissions, role_bits):
+        self.permissions = permissions
+        self.permission_ids = {permission: i for i, permission in enumerate(permissions)}
+        self.role_bits = role_bits
+        # Reverse index, so that "which roles grant X" is a lookup, not a scan of every role.
+        self.roles_by_permission = [[] for _ in permissions]
+        for role, bits in role_bits.items():
+            while bits:
+                low_bit = bits & -bits
+                self.roles_by_permission[low_bit.bit_length() - 1].append(role)
+                bits ^= low_bit
+
+    @classmethod
+    def from_catalogue(cls, catalogue):
+        """Compiles a {role: [permissions]} catalogue."""
+        permissions = sorted(set().union(*catalogue.values())) if catalogue else []
+        permission_ids = {permission: i for i, permission in enumerate(permissions)}
+        role_bits = {}
+        for role, role_permissions in catalogue.items():
+            bits = 0
+            for permission in role_permissions:
+                bits |= 1 << permission_ids[permission]
+            role_bits[role] = bits
+        return cls(permissions, role_bits)
+
+    @classmethod
+    def from_json(cls, data):
+        """Loads an index serialized by `to_json` (bitsets are hex strings)."""
+        return cls(data['permissions'], {role: int(bits, 16) for role, bits in data['roles'].items()})
+
+    def to_json(self):
+        return {
+            'permissions': self.permissions,
+            'roles': {role: format(bits, 'x') for role, bits in sorted(self.role_bits.items())}
+        }
+
+    def roles_mask(self, roles):
+        """Returns the union bitset of `roles` (unknown roles are ignored)."""
+        mask = 0
+        for role in roles:
+            mask |= self.role_bits.get(role, 0)
+        return mask
+
+    def decode(self, mask):
+        """Returns the sorted permission names of a bitset."""
+        permissions = []
+        while mask:
+            low_bit = mask & -mask
+            permissions.append(self.permissions[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return permissions
+
+    def permissions_of(self, roles):
+        return self.decode(self.roles_mask(roles))
+
+    def roles_with(self, permission):
+        """Returns the roles that include `permission`."""
+        permission_id = self.permission_ids.get(permission)
+        if permission_id is None:
+            return []
+        return list(self.roles_by_permission[permission_id])
+
+    def unknown_roles(self, roles):
+        return sorted(set(roles) - set(self.role_bits))
+
+
+def load_role_catalogue(path):
+    """
+    Reads a role catalogue: either {role: [permissions]}, or the list of role
+    resources returned by the IAM API ([{"name": ..., "includedPermissions": [...]}]).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return {role['name']: role.get('includedPermissions', []) for role in data}
+    return data
+
+def load_permission_index(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return PermissionIndex.from_json(json.load(f))
+
+# --- QUERIES ---
+
+def keys_by_role(effective):
+    """Groups the 'role@project' keys of the effective access report by role."""
+    keys = {}
+    for key in effective:
+        keys.setdefault(key.partition('@')[0], []).append(key)
+    return keys
+
+def who_can(index, permission, effective, project=None, role_keys=None):
+    """
+    Returns the principals holding `permission`, from the effective access
+    report ({'role@project': [users]}), optionally restricted to one project.
+    `role_keys` is `keys_by_role(effective)`, built once by callers that
+    answer many queries.
+    """
+    roles = index.roles_with(permission)
+    if project is not None:
+        keys = [f"{role}@{project}" for role in roles]
+    else:
+        if role_keys is None:
+            role_keys = keys_by_role(effective)
+        keys = [key for role in roles for key in role_keys.get(role, [])]
+    grants = []
+    users = set()
+    for key in keys:
+        key_users = effective.get(key)
+        if key_users:
+            role, _, key_project = key.partition('@')
+            grants.append({'role': role, 'project': key_project, 'users': key_users})
+            users.update(key_users)
+    grants.sort(key=lambda grant: (grant['project'], grant['role']))
+    return {
+        'permission': permission,
+        'project': project,
+        'known': permission in index.permission_ids,
+        'grants': grants,
+        'users': sorted(users)
+    }
+
+def user_permissions(index, details, project=None):
+    """
+    Returns {project: [permissions]} for a user's effective access details
+    ([{project, role, source}]), and the roles missing from the catalogue.
+    """
+    roles_by_project = {}
+    for grant in details:
+        if project is None or grant['project'] == project:
+            roles_by_project.setdefault(grant['project'], set()).add(grant['role'])
+    all_roles = set().union(*roles_by_project.values()) if roles_by_project else set()
+    return {
+        'permissions': {p: index.permissions_of(roles) for p, roles in sorted(roles_by_project.items())},
+        'unknownRoles': index.unknown_roles(all_roles)
+    }
+
+# --- CATALOGUE EXPORT ---
+
+def export_role_catalogue(project_ids=(), organization=None):
+    """Fetches the predefined roles, and the custom roles of the given projects/organization, from the IAM API."""
+    import google.auth
+    from googleapiclient.discovery import build
+    from workspace_api import execute_with_backoff
+
+    credentials, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
+    service = build('iam', 'v1', credentials=credentials, cache_discovery=False)
+
+    def list_roles(collection, parent=None):
+        roles = []
+        page_token = None
+        while True:
+            kwargs = {'view': 'FULL', 'pageSize': PAGE_SIZE, 'pageToken': page_token}
+            if parent:
+                kwargs['parent'] = parent
+            results = execute_with_backoff(collection.list(**kwargs))
+            roles.extend(results.get('roles', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return roles
+
+    roles = list_roles(service.roles())
+    print(f"Found {len(roles)} predefined roles.")
+    if organization:
+        roles.extend(list_roles(service.organizations().roles(), f"organizations/{organization}"))
+    for project_id in project_ids:
+        roles.extend(list_roles(service.projects().roles(), f"projects/{project_id}"))
+    return {role['name']: sorted(role.get('includedPermissions', [])) for role in roles}
+
+# --- SCRIPT LOGIC ---
+
+def main():
+    """Main function to export, compile and query the permission index."""
+    parser = argparse.ArgumentParser(description='Permission-level index of the audited IAM access.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='Export the role catalogue from the IAM API.')
+    export.add_argument("--output", default=ROLE_CATALOGUE_PATH, help=f"Catalogue file to write (default: {ROLE_CATALOGUE_PATH}).")
+    export.add_argument("--projects-file", help="Also export the custom roles of the projects listed in this file.")
+    export.add_argument("--organization", help="Also export the custom roles of this organization ID.")
+
+    compile_ = commands.add_parser('compile', help='Compile a role catalogue into the bitset index.')
+    compile_.add_argument("--catalogue", default=ROLE_CATALOGUE_PATH, help=f"Role catalogue to compile (default: {ROLE_CATALOGUE_PATH}).")
+    compile_.add_argument("--output", default=os.path.join(JSON_OUTPUT_DIR, PERMISSION_INDEX_FILENAME), help="Index file to write.")
+
+    who = commands.add_parser('who-can', help='List the users holding a permission.')
+    who.add_argument("--permission", required=True, help="IAM permission, e.g. storage.objects.get.")
+    who.add_argument("--project", help="Restrict the answer to one project.")
+
+    user = commands.add_parser('user-permissions', help="List a user's effective permissions.")
+    user.add_argument("--email", required=True, help="User email.")
+    user.add_argument("--project", help="Restrict the answer to one project.")
+
+    for query in (who, user):
+        query.add_argument("--index", default=os.path.join(JSON_OUTPUT_DIR, PERMISSION_INDEX_FILENAME), help="Compiled permission index.")
+        query.add_argument("--json-dir", default=JSON_OUTPUT_DIR, help=f"Directory of the summary.py reports (default: {JSON_OUTPUT_DIR}).")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        project_ids = []
+        if args.projects_file:
+            with open(args.projects_file, 'r', encoding='utf-8') as f:
+                project_ids = [line.split('#', 1)[0].strip() for line in f if line.split('#', 1)[0].strip()]
+        catalogue = export_role_catalogue(project_ids, args.organization)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(catalogue, f, indent=2, sort_keys=True)
+        print(f"Successfully exported {len(catalogue)} roles to '{args.output}'")
+        return
+
+    if args.command == 'compile':
+        if not os.path.exists(args.catalogue):
+            print(f"ERROR: Role catalogue not found at '{args.catalogue}'")
+            return
+        index = PermissionIndex.from_catalogue(load_role_catalogue(args.catalogue))
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(index.to_json(), f, separators=(',', ':'))
+        print(f"Successfully compiled {len(index.role_bits)} roles and {len(index.permissions)} permissions into '{args.output}'")
+        return
+
+    if not os.path.exists(args.index):
+        print(f"ERROR: Permission index not found at '{args.index}'. Run the 'compile' command first.")
+        return
+    index = load_permission_index(args.index)
+
+    if args.command == 'who-can':
+        with open(os.path.join(args.json_dir, 'effective_access_by_role_project.json'), 'r', encoding='utf-8') as f:
+            effective = json.load(f)
+        result = who_can(index, args.permission, effective, args.project)
+        if not result['known']:
+            print(f"WARNING: Permission '{args.permission}' is not in the role catalogue.")
+        for grant in result['grants']:
+            print(f"{grant['project']}  {grant['role']}: {', '.join(grant['users'])}")
+        print(f"\n{len(result['users'])} users can '{args.permission}'" + (f" on '{args.project}'." if args.project else "."))
+    else:
+        with open(os.path.join(args.json_dir, 'user_effective_access_details.json'), 'r', encoding='utf-8') as f:
+            details = json.load(f).get(args.email, [])
+        result = user_permissions(index, details, args.project)
+        for project, permissions in result['permissions'].items():
+            print(f"--- {project} ({len(permissions)} permissions) ---")
+            for permission in permissions:
+                print(f"  {permission}")
+        if result['unknownRoles']:
+            print(f"WARNING: Roles not in the catalogue: {', '.join(result['unknownRoles'])}")
+
+if __name__ == '__main__':
+    main()
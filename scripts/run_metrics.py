@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Per-phase timers and counters for the batch scripts.
+
+A script times its phases (e.g. 'fetch', 'report'), counts what it does (API
+calls, retries, throttled requests, records processed) and times each unit of
+work (a project, a group...) so that the slowest ones stand out. At the end of
+the run, a short summary is printed and, with '--run-summary <path>', written
+as JSON for later comparison.
+
+The metrics are process-wide so that shared helpers ('workspace_api.py')
+count the API calls of whichever script is running.
+"""
+import json
+import time
+import datetime
+import threading
+import contextlib
+
+# --- CONFIGURATION ---
+
+SLOWEST_ITEMS = 10
+
+
+class RunMetrics:
+    """Thread-safe phase timers, counters and per-item durations of one run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start('')
+
+    def start(self, script):
+        """Resets the metrics for a new run of `script`."""
+        with self._lock:
+            self.script = script
+            self.started = datetime.datetime.now(datetime.timezone.utc)
+            self._start_time = time.perf_counter()
+            self.phases = {}
+            self.counters = {}
+            self.items = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextlib.contextmanager
+    def timed_item(self, category, key):
+        """Records how long one unit of work (e.g. a project) took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.items.setdefault(category, []).append((time.perf_counter() - start, key))
+
+    def summary(self):
+        with self._lock:
+            return {
+                'script': self.script,
+                'started': self.started.isoformat(),
+                'duration_seconds': round(time.perf_counter() - self._start_time, 3),
+                'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                'counters': dict(sorted(self.counters.items())),
+                'slowest': {
+                    category: [{'key': key, 'seconds': round(seconds, 3)}
+                               for seconds, key in sorted(items, reverse=True)[:SLOWEST_ITEMS]]
+                    for category, items in self.items.items()
+                }
+            }
+
+    def report(self, path=None):
+        """Prints the run summary, and writes it as JSON to `path` if given."""
+        summary = self.summary()
+        print(f"\n--- Run Summary ({summary['duration_seconds']}s) ---")
+        for name, seconds in summary['phases'].items():
+            print(f"  {name:<28} {seconds:9.3f}s")
+        for name, count in summary['counters'].items():
+            print(f"  {name:<28} {count:>9}")
+        for category, items in summary['slowest'].items():
+            if items:
+                print(f"  slowest {category}: " + ', '.join(f"{item['key']} ({item['seconds']}s)" for item in items[:3]))
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            print(f"Run summary saved to '{path}'")
+        return summary
+
+
+run_metrics = RunMetrics()
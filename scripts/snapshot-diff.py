@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Compares two IAM policy snapshots and lists the users whose access changed.
+
+This script compares two dated directories written by 'gcp-iam-export.py'.
+Projects whose policy file has the same content hash are skipped; for the
+others, the (project, role, member) bindings are compared as sets. It writes:
+
+- a "what changed" feed ('json/access_changes.json') with the added and
+  removed grants and the affected principals,
+- the minimal list of users to re-audit ('affected_users.txt'): direct 'user:'
+  members of changed bindings, plus every (transitive) member of the changed
+  'group:' members, resolved with the directory snapshot.
+
+The affected users can then be re-audited and merged into the existing
+dashboard data:
+
+    python snapshot-diff.py --old-dir 2025-08-20 --new-dir 2025-08-21 --directory-snapshot directory_snapshot.json
+    python create_iam_cache.py --policy-dir 2025-08-21
+    python gdpr-access-audit-local-json.py --users-file affected_users.txt --output-dir audit-delta --directory-snapshot directory_snapshot.json
+    python summary.py --audit-dir audit-delta --patch
+"""
+import os
+import json
+import hashlib
+import argparse
+from create_iam_cache import list_policy_files
+
+# --- CONFIGURATION ---
+
+CHANGES_OUTPUT_PATH = os.path.join('json', 'access_changes.json')
+AFFECTED_USERS_PATH = 'affected_users.txt'
+
+# --- SCRIPT LOGIC ---
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def read_bindings(path, project):
+    """Returns the set of (project, role, member) bindings of one policy file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        policy = json.load(f)
+    return {
+        (project, binding.get('role'), member)
+        for binding in policy.get('bindings', [])
+        for member in binding.get('members', [])
+    }
+
+def diff_snapshots(old_dir, new_dir):
+    """Returns (added, removed) sorted lists of (project, role, member) bindings."""
+    old_files = list_policy_files(old_dir)
+    new_files = list_policy_files(new_dir)
+    added, removed = set(), set()
+    for project in sorted(set(old_files) | set(new_files)):
+        old_path, new_path = old_files.get(project), new_files.get(project)
+        if old_path and new_path and file_sha256(old_path) == file_sha256(new_path):
+            continue
+        old_bindings = read_bindings(old_path, project) if old_path else set()
+        new_bindings = read_bindings(new_path, project) if new_path else set()
+        added |= new_bindings - old_bindings
+        removed |= old_bindings - new_bindings
+    return sorted(added), sorted(removed)
+
+def find_affected_users(changed_bindings, user_groups):
+    """
+    Returns (affected users, changed groups). `user_groups` is the transitive
+    user -> groups closure of the directory snapshot, or None.
+    """
+    users, groups = set(), set()
+    for _, _, member in changed_bindings:
+        prefix, _, identity = member.partition(':')
+        if prefix == 'user':
+            users.add(identity)
+        elif prefix == 'group':
+            groups.add(identity)
+    if groups and user_groups is not None:
+        users |= {user for user, user_groups_ in user_groups.items() if groups.intersection(user_groups_)}
+    return sorted(users), sorted(groups)
+
+def as_grants(bindings):
+    return [{'project': project, 'role': role, 'member': member} for project, role, member in bindings]
+
+def main():
+    """Main function to compare two policy snapshots."""
+    parser = argparse.ArgumentParser(description='Diff two IAM policy snapshots and list the users to re-audit.')
+    parser.add_argument("--old-dir", required=True, help="Previous dated policy directory.")
+    parser.add_argument("--new-dir", required=True, help="New dated policy directory.")
+    parser.add_argument("--directory-snapshot", help="Directory snapshot (directory-snapshot.py) used to expand changed groups into their members.")
+    parser.add_argument("--changes-output", default=CHANGES_OUTPUT_PATH, help=f"Path of the changes feed (default: {CHANGES_OUTPUT_PATH}).")
+    parser.add_argument("--affected-users", default=AFFECTED_USERS_PATH, help=f"Path of the list of users to re-audit (default: {AFFECTED_USERS_PATH}).")
+    args = parser.parse_args()
+
+    for directory in (args.old_dir, args.new_dir):
+        if not os.path.isdir(directory):
+            print(f"ERROR: Directory not found at '{directory}'")
+            return
+
+    user_groups = None
+    if args.directory_snapshot:
+        with open(args.directory_snapshot, 'r', encoding='utf-8') as f:
+            user_groups = json.load(f).get('user_groups', {})
+
+    print(f"Comparing '{args.old_dir}' with '{args.new_dir}'...")
+    added, removed = diff_snapshots(args.old_dir, args.new_dir)
+    users, groups = find_affected_users(added + removed, user_groups)
+    if groups and user_groups is None:
+        print(f"WARNING: {len(groups)} groups changed but no --directory-snapshot was given: their members are not listed.")
+    if any(member.startswith('domain:') for _, _, member in added + removed):
+        print("WARNING: A 'domain:' grant changed. It applies to every user of the domain: consider a full audit.")
+
+    changes = {
+        'old_snapshot': os.path.basename(os.path.normpath(args.old_dir)),
+        'new_snapshot': os.path.basename(os.path.normpath(args.new_dir)),
+        'added': as_grants(added),
+        'removed': as_grants(removed),
+        'affected_groups': groups,
+        'affected_users': users
+    }
+    os.makedirs(os.path.dirname(args.changes_output) or '.', exist_ok=True)
+    with open(args.changes_output, 'w', encoding='utf-8') as f:
+        json.dump(changes, f, indent=4)
+    with open(args.affected_users, 'w', encoding='utf-8') as f:
+        f.writelines(f"{user}\n" for user in users)
+
+    print(f"{len(added)} grants added, {len(removed)} removed, {len(groups)} groups and {len(users)} users affected.")
+    print(f"Changes saved to '{args.changes_output}', users to re-audit saved to '{args.affected_users}'.")
+
+if __name__ == '__main__':
+    main()
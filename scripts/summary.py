@@ -2,8 +2,9 @@
 """
 Summarizes individual audit reports into multiple, dimension-specific files.
 
-This script reads all '.txt' files from a specified audit directory, parses them,
-and aggregates the data to create multiple distinct reports.
+This script reads the 'audit_records.jsonl' stream (or, for older audits, all
+'.txt' files) from a specified audit directory, parses it, and aggregates the
+data to create multiple distinct reports.
 
 It now also queries the Google Cloud Logging API to count user activity per project.
 """
@@ -11,21 +12,50 @@ import os
 import json
 import argparse
 import re
+import gzip
 import datetime
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import logging
 from google.api_core import exceptions as gcp_exceptions
+from access_matrix import aggregate_access, access_analytics, SIMILARITY_THRESHOLD
+from log_sources import CloudLoggingSource, LocalFileLogSource
+from log_count_store import LogCountStore, LOG_STORE_PATH
+from access_history import AccessHistory, HISTORY_DIR, parse_date
+from run_metrics import run_metrics
+from workspace_api import replace_file
 
 # --- CONFIGURATION ---
 JSON_OUTPUT_DIR = 'json'
 # ... (noms de fichiers)
+BUNDLE_FILENAME = 'dashboard_bundle.json'
+AUDIT_RECORDS_FILENAME = 'audit_records.jsonl'
+LOG_COUNT_DAYS = 30
+LOG_COUNT_WORKERS = 8
+# Entries can reach Cloud Logging a few minutes late: incremental runs stop
+# this far before "now" so the next checkpoint does not skip them.
+LOG_INGESTION_DELAY = datetime.timedelta(minutes=5)
+
+try:
+    import brotli  # Optionnel : ajoute une variante .br du bundle
+except ImportError:
+    brotli = None
 
 # --- NOUVELLE FONCTION POUR COMPTER LES LOGS ---
+def log_window_start(days):
+    """
+    Start of the log counting window: midnight UTC, `days` days ago. Every
+    counting mode uses it, so that the daily buckets of the incremental store
+    cover exactly the same window as a full recount.
+    """
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return datetime.datetime.combine(today - datetime.timedelta(days=days), datetime.time(), tzinfo=datetime.timezone.utc)
+
 def count_user_logs_for_project(project_id: str, user_email: str, days: int = 30) -> int:
     """Counts log entries for a specific user in a given project."""
     try:
         client = logging.Client(project=project_id)
-        start_date = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+        start_date = log_window_start(days)
         start_time_str = start_date.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
         
         filter_str = (
@@ -46,7 +76,148 @@ def count_user_logs_for_project(project_id: str, user_email: str, days: int = 30
         print(f"    - WARNING: An error occurred fetching logs for {user_email} in {project_id}: {e}")
         return -1
 
+def count_log_error(error):
+    """Counts a failed log query, separating quota errors from the others."""
+    run_metrics.increment('log_throttled' if isinstance(error, gcp_exceptions.ResourceExhausted) else 'log_errors')
+
+def count_project_logs(log_source, project_id, principals, start_time):
+    """Counts the log entries of all `principals` in one project with a single pass."""
+    counts = dict.fromkeys(principals, 0)
+    try:
+        with run_metrics.timed_item('projects', project_id):
+            for principal, _ in log_source.iter_entries(project_id, principals, start_time):
+                if principal in counts:
+                    counts[principal] += 1
+        print(f"    - Counted {sum(counts.values())} log entries for {len(principals)} users in project {project_id}")
+        run_metrics.increment('log_entries', sum(counts.values()))
+        return counts
+    except gcp_exceptions.PermissionDenied:
+        print(f"    - WARNING: Permission denied to read logs in project '{project_id}'. Skipping log count.")
+        run_metrics.increment('log_permission_denied')
+    except Exception as e:
+        print(f"    - WARNING: An error occurred fetching logs in {project_id}: {e}")
+        count_log_error(e)
+    return dict.fromkeys(principals, -1) # Code pour indiquer une erreur
+
+def count_logs_per_project(user_projects, log_source, days=LOG_COUNT_DAYS, workers=LOG_COUNT_WORKERS):
+    """
+    Counts log entries for every (user, project) pair with one pass per project.
+
+    Projects are processed in parallel and share the same log source (and client).
+    Returns {user: {project: count}} in the same order as `user_projects`.
+    """
+    start_time = log_window_start(days)
+    principals_by_project = defaultdict(set)
+    for user, projects in user_projects.items():
+        for project in projects:
+            principals_by_project[project].add(user)
+
+    projects = sorted(principals_by_project)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        counts_by_project = dict(zip(projects, executor.map(
+            lambda project: count_project_logs(log_source, project, principals_by_project[project], start_time),
+            projects)))
+
+    return {
+        user: {project: counts_by_project[project][user] for project in projects_}
+        for user, projects_ in user_projects.items()
+    }
+
+def fetch_daily_log_counts(log_source, project_id, ranges):
+    """
+    Fetches {(principal, day): count} for one project over a list of
+    (principals, start_time, end_time) ranges. Returns None if the logs cannot be read.
+    """
+    counts = defaultdict(int)
+    try:
+        with run_metrics.timed_item('projects', project_id):
+            for principals, start_time, end_time in ranges:
+                for principal, timestamp in log_source.iter_entries(project_id, principals, start_time, end_time):
+                    if principal in principals:
+                        day = timestamp.astimezone(datetime.timezone.utc).date().isoformat()
+                        counts[(principal, day)] += 1
+        print(f"    - Fetched {sum(counts.values())} new log entries in project {project_id}")
+        run_metrics.increment('log_entries', sum(counts.values()))
+        return counts
+    except gcp_exceptions.PermissionDenied:
+        print(f"    - WARNING: Permission denied to read logs in project '{project_id}'. Skipping log count.")
+        run_metrics.increment('log_permission_denied')
+    except Exception as e:
+        print(f"    - WARNING: An error occurred fetching logs in {project_id}: {e}")
+        count_log_error(e)
+    return None
+
+def count_logs_incremental(user_projects, log_source, store, days=LOG_COUNT_DAYS, workers=LOG_COUNT_WORKERS):
+    """
+    Counts log entries per (user, project) from the persistent daily store.
+
+    Only the entries written since each project's checkpoint are fetched (plus a
+    one-time backfill of the whole window for newly audited users). The window
+    rolls forward by whole days. Returns ({user: {project: count}},
+    {user: {project: {day: count}}}).
+    """
+    end_time = datetime.datetime.now(datetime.timezone.utc) - LOG_INGESTION_DELAY
+    window_start = log_window_start(days)
+    first_day = window_start.date().isoformat()
+
+    principals_by_project = defaultdict(set)
+    for user, projects in user_projects.items():
+        for project in projects:
+            principals_by_project[project].add(user)
+
+    plans = {}
+    for project, principals in principals_by_project.items():
+        checkpoint = store.get_checkpoint(project)
+        if checkpoint is None or checkpoint < window_start:
+            plans[project] = ([(principals, window_start, end_time)], True)
+        else:
+            ranges = [(principals, checkpoint, end_time)]
+            new_principals = principals - store.get_tracked(project)
+            if new_principals:
+                ranges.insert(0, (new_principals, window_start, checkpoint))
+            plans[project] = (ranges, False)
+
+    projects = sorted(plans)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(lambda project: fetch_daily_log_counts(log_source, project, plans[project][0]), projects))
+
+    failed_projects = set()
+    for project, daily_counts in zip(projects, results):
+        if daily_counts is None:
+            failed_projects.add(project)
+            continue
+        store.apply(project, daily_counts, principals_by_project[project], end_time, reset=plans[project][1])
+    store.drop_before(first_day)
+
+    series = store.daily_series(first_day)
+    log_counts_by_user = {}
+    log_activity_by_day = {}
+    for user, projects_ in user_projects.items():
+        log_counts_by_user[user] = {}
+        log_activity_by_day[user] = {}
+        for project in projects_:
+            days_ = series.get((project, user), {})
+            log_counts_by_user[user][project] = -1 if project in failed_projects else sum(days_.values())
+            log_activity_by_day[user][project] = days_
+    return log_counts_by_user, log_activity_by_day
+
+def count_logs_per_user(user_projects, days=LOG_COUNT_DAYS):
+    """Legacy mode: one full Cloud Logging scan per (user, project) pair."""
+    log_counts_by_user = defaultdict(dict)
+    for user, projects in user_projects.items():
+        for project in projects:
+            count = count_user_logs_for_project(project, user, days)
+            log_counts_by_user[user][project] = count
+    return dict(log_counts_by_user)
+
 # --- LOGIQUE PRINCIPALE (MISE À JOUR) ---
+def add_grant(grants_by_identity, seen_grants, identity, project, role):
+    """Appends a grant to an identity's list unless it is already there (O(1) set lookup)."""
+    marker = (identity, project, role)
+    if marker not in seen_grants:
+        seen_grants.add(marker)
+        grants_by_identity[identity[1]].append({"project": project, "role": role})
+
 def parse_audit_reports(audit_dir):
     # ... (le reste de la fonction parse_audit_reports reste identique)
     if not os.path.isdir(audit_dir):
@@ -55,6 +226,7 @@ def parse_audit_reports(audit_dir):
     direct_access_by_user = defaultdict(list)
     group_membership_by_user = defaultdict(set)
     access_by_group = defaultdict(list)
+    seen_grants = set()
     print(f"Scanning directory '{audit_dir}' for audit reports...")
     for filename in os.listdir(audit_dir):
         if filename.endswith(".txt"):
@@ -72,6 +244,7 @@ def parse_audit_reports(audit_dir):
                 print(f"  - WARNING: Could not identify user in '{filename}'. Skipping.")
                 continue
             print(f"  - Processing report for: {current_user_email}")
+            run_metrics.increment('records_parsed')
             for line in content:
                 line = line.strip()
                 if "Direct GCP Access" in line:
@@ -92,73 +265,222 @@ def parse_audit_reports(audit_dir):
                 elif "Role:" in line:
                     role = line.split(":", 1)[1].strip()
                     if parsing_direct_access:
-                        entry = {"project": project_id, "role": role}
-                        if entry not in direct_access_by_user[current_user_email]:
-                            direct_access_by_user[current_user_email].append(entry)
+                        add_grant(direct_access_by_user, seen_grants, ('user', current_user_email), project_id, role)
                     elif parsing_group_access and current_group_email:
-                        entry = {"project": project_id, "role": role}
-                        if entry not in access_by_group[current_group_email]:
-                            access_by_group[current_group_email].append(entry)
+                        add_grant(access_by_group, seen_grants, ('group', current_group_email), project_id, role)
     return dict(direct_access_by_user), dict(group_membership_by_user), dict(access_by_group)
 
+def parse_audit_records(records_path):
+    """
+    Reads the JSONL audit stream written by the audit script in a single pass.
+
+    Returns the same structures as `parse_audit_reports`, one record (user) at a time.
+    """
+    direct_access_by_user = defaultdict(list)
+    group_membership_by_user = defaultdict(set)
+    access_by_group = defaultdict(list)
+    seen_grants = set()
+    print(f"Reading audit records from '{records_path}'...")
+    with open(records_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"  - WARNING: Could not decode record on line {line_number}. Skipping.")
+                continue
+            user_email = record['user']
+            print(f"  - Processing record for: {user_email}")
+            run_metrics.increment('records_parsed')
+            for perm in record['direct']:
+                add_grant(direct_access_by_user, seen_grants, ('user', user_email), perm['project'], perm['role'])
+            for group in record['groups']:
+                group_membership_by_user[user_email].add(group['email'])
+                for perm in group['access']:
+                    add_grant(access_by_group, seen_grants, ('group', group['email']), perm['project'], perm['role'])
+    return dict(direct_access_by_user), dict(group_membership_by_user), dict(access_by_group)
+
+def load_audit_data(audit_dir):
+    """Loads the audit data, preferring the JSONL stream over the .txt reports."""
+    records_path = os.path.join(audit_dir, AUDIT_RECORDS_FILENAME)
+    if os.path.isfile(records_path):
+        return parse_audit_records(records_path)
+    return parse_audit_reports(audit_dir)
+
+def read_audited_users(records_path):
+    """Returns the set of users with a record in a JSONL audit stream, including users left without any access."""
+    with open(records_path, 'r', encoding='utf-8') as f:
+        return {json.loads(line)['user'] for line in f if line.strip()}
+
+def load_json_report(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def patch_audit_data(delta, delta_users):
+    """
+    Merges a partial audit (e.g. of the users listed by snapshot-diff.py) into
+    the reports of the previous run in JSON_OUTPUT_DIR.
+
+    The audited users replace their previous entries, and the groups they are
+    members of get their grants replaced by the ones from the delta. Returns
+    (user_access, user_groups, group_access, previous log counts by user).
+    """
+    delta_access, delta_groups, delta_group_access = delta
+    user_access = load_json_report(os.path.join(JSON_OUTPUT_DIR, 'user_direct_access.json'))
+    user_groups = load_json_report(os.path.join(JSON_OUTPUT_DIR, 'user_group_membership.json'))
+    group_access = load_json_report(os.path.join(JSON_OUTPUT_DIR, 'group_access_summary.json'))
+    numerical_summary = load_json_report(os.path.join(JSON_OUTPUT_DIR, 'numerical_summary.json'))
+
+    user_access = {user: grants for user, grants in user_access.items() if user not in delta_users}
+    user_access.update(delta_access)
+    user_groups = {user: set(groups) for user, groups in user_groups.items() if user not in delta_users}
+    user_groups.update(delta_groups)
+    for group in set().union(*delta_groups.values()):
+        if group in delta_group_access:
+            group_access[group] = delta_group_access[group]
+        else:
+            group_access.pop(group, None)
+    print(f"Patched the previous reports with {len(delta_users)} re-audited users "
+          f"({len(user_access)} users with direct access, {len(user_groups)} with group memberships).")
+    return user_access, user_groups, group_access, numerical_summary.get('log_counts_by_user', {})
+
 def save_json_report(filename, data, description):
     """Saves a dictionary to a JSON file."""
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4)
+    try:
+        replace_file(filename, write)
         print(f"Successfully created {description} report at '{filename}'")
     except IOError as e:
         print(f"ERROR: Could not save report to '{filename}'. Details: {e}")
 
+def save_bundle(datasets):
+    """
+    Saves all dashboard datasets as a single pre-merged, compressed bundle.
+
+    The app streams this object as-is to browsers, so it is compressed once here
+    instead of being re-encoded on every request. A brotli variant is written
+    too when the 'brotli' package is installed.
+    """
+    payload = json.dumps(datasets, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    outputs = {BUNDLE_FILENAME + '.gz': gzip.compress(payload, mtime=0)}
+    if brotli is not None:
+        outputs[BUNDLE_FILENAME + '.br'] = brotli.compress(payload)
+    for filename, data in outputs.items():
+        path = os.path.join(JSON_OUTPUT_DIR, filename)
+        def write(temp_path, data=data):
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+        try:
+            replace_file(path, write)
+            print(f"Successfully created dashboard bundle at '{path}' ({len(data)} bytes)")
+        except IOError as e:
+            print(f"ERROR: Could not save bundle to '{path}'. Details: {e}")
+    remove_stale_bundle(set(outputs))
+
+def remove_stale_bundle(keep=()):
+    """
+    Deletes the bundle files of a previous run that this run did not write.
+    The app prefers the bundle over the individual reports, so an old bundle
+    would hide them.
+    """
+    for filename in (BUNDLE_FILENAME + '.gz', BUNDLE_FILENAME + '.br'):
+        path = os.path.join(JSON_OUTPUT_DIR, filename)
+        if filename in keep or not os.path.exists(path):
+            continue
+        try:
+            os.remove(path)
+            print(f"Removed the stale dashboard bundle '{path}'")
+        except OSError as e:
+            print(f"ERROR: Could not remove the stale bundle '{path}'. Details: {e}")
+
 def main():
     parser = argparse.ArgumentParser(description='Summarize GCP IAM audit reports into multiple files.')
-    parser.add_argument("--audit-dir", required=True, help="Path to the directory containing the individual .txt audit reports.")
+    parser.add_argument("--audit-dir", required=True, help=f"Path to the audit directory ('{AUDIT_RECORDS_FILENAME}' or individual .txt reports).")
+    parser.add_argument("--bundle", action='store_true', help="Also write a pre-merged, compressed bundle of all reports for the dashboard.")
+    parser.add_argument("--log-count-mode", choices=['per-project', 'per-user'], default='per-project',
+                        help="Count log entries with one pass per project for all users (default), or one scan per (user, project) pair.")
+    parser.add_argument("--log-workers", type=int, default=LOG_COUNT_WORKERS, help=f"Number of projects whose logs are counted in parallel (default: {LOG_COUNT_WORKERS}).")
+    parser.add_argument("--log-store", help=f"Keep daily log counts in this SQLite store (e.g. '{LOG_STORE_PATH}') and only fetch entries newer than the last run (per-project mode).")
+    parser.add_argument("--log-entries-file", help="Read log entries from this local JSONL file instead of Cloud Logging (per-project mode).")
+    parser.add_argument("--patch", action='store_true', help=f"Merge a partial audit (see snapshot-diff.py) into the existing reports in '{JSON_OUTPUT_DIR}/' instead of replacing them.")
+    parser.add_argument("--analytics", action='store_true',
+                        help="Also write 'access_analytics.json': redundant direct grants, near-duplicate groups and identical access profiles.")
+    parser.add_argument("--similarity-threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help=f"Minimum Jaccard similarity of the grants of two groups to report them as near-duplicates (default: {SIMILARITY_THRESHOLD}).")
+    parser.add_argument("--history-dir", nargs='?', const=HISTORY_DIR,
+                        help=f"Also append the effective access to this history store (default if no path is given: '{HISTORY_DIR}', see access_history.py).")
+    parser.add_argument("--snapshot-date", type=parse_date, default=datetime.date.today().isoformat(),
+                        help="Date of the snapshot in the history store (default: today). Use the date of the policy export when summarizing an old one.")
+    parser.add_argument("--run-summary", help="Write the run summary (phase timings, records, log entries, slowest projects) to this JSON file.")
     args = parser.parse_args()
+    run_metrics.start('summary')
 
     os.makedirs(JSON_OUTPUT_DIR, exist_ok=True)
-    user_access, user_groups, group_access = parse_audit_reports(args.audit_dir)
+    previous_log_counts = None
+    delta_users = set()
+    if args.patch:
+        records_path = os.path.join(args.audit_dir, AUDIT_RECORDS_FILENAME)
+        if not os.path.isfile(records_path):
+            print(f"ERROR: --patch needs the JSONL audit stream '{records_path}'.")
+            return
+        with run_metrics.phase('parse_audit'):
+            delta_users = read_audited_users(records_path)
+            try:
+                user_access, user_groups, group_access, previous_log_counts = patch_audit_data(
+                    parse_audit_records(records_path), delta_users)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"ERROR: Could not read the previous reports to patch in '{JSON_OUTPUT_DIR}/'. Details: {e}")
+                return
+    else:
+        with run_metrics.phase('parse_audit'):
+            user_access, user_groups, group_access = load_audit_data(args.audit_dir)
 
     if user_access is not None:
         print("\n--- Generating Reports ---")
         
         # --- Calcul des données effectives et numériques ---
-        effective_users_per_role_project = defaultdict(set)
-        user_effective_access_details = defaultdict(list)
-        all_user_project_pairs = defaultdict(set)
-
-        for user, permissions in user_access.items():
-            for perm in permissions:
-                key = f"{perm['role']}@{perm['project']}"
-                effective_users_per_role_project[key].add(user)
-                user_effective_access_details[user].append({"project": perm['project'], "role": perm['role'], "source": "direct"})
-                all_user_project_pairs[user].add(perm['project'])
-        
-        for user, groups in user_groups.items():
-            for group_email in groups:
-                group_permissions = group_access.get(group_email, [])
-                for perm in group_permissions:
-                    key = f"{perm['role']}@{perm['project']}"
-                    effective_users_per_role_project[key].add(user)
-                    user_effective_access_details[user].append({"project": perm['project'], "role": perm['role'], "source": f"group: {group_email}"})
-                    all_user_project_pairs[user].add(perm['project'])
+        with run_metrics.phase('aggregate'):
+            aggregates = aggregate_access(user_access, user_groups, group_access)
+        user_effective_access_details = aggregates['user_details']
+        all_user_project_pairs = aggregates['user_projects']
+        # En mode patch, seuls les utilisateurs ré-audités sont recomptés (sauf avec le store, déjà incrémental)
+        pairs_to_count = all_user_project_pairs
+        if previous_log_counts is not None and not args.log_store:
+            pairs_to_count = {user: projects for user, projects in all_user_project_pairs.items()
+                              if user in delta_users or user not in previous_log_counts}
 
         # --- NOUVEAU : Récupération des décomptes de logs ---
         print("\n--- Fetching User Log Counts (this may take a while) ---")
-        log_counts_by_user = defaultdict(dict)
-        for user, projects in all_user_project_pairs.items():
-            for project in projects:
-                count = count_user_logs_for_project(project, user)
-                log_counts_by_user[user][project] = count
+        with run_metrics.phase('count_logs'):
+            log_activity_by_day = None
+            if args.log_count_mode == 'per-user':
+                log_counts_by_user = count_logs_per_user(pairs_to_count)
+            else:
+                log_source = LocalFileLogSource(args.log_entries_file) if args.log_entries_file else CloudLoggingSource()
+                if args.log_store:
+                    store = LogCountStore(args.log_store)
+                    try:
+                        log_counts_by_user, log_activity_by_day = count_logs_incremental(
+                            pairs_to_count, log_source, store, workers=args.log_workers)
+                    finally:
+                        store.close()
+                else:
+                    log_counts_by_user = count_logs_per_project(pairs_to_count, log_source, workers=args.log_workers)
+        if pairs_to_count is not all_user_project_pairs:
+            log_counts_by_user = {
+                user: log_counts_by_user[user] if user in pairs_to_count else previous_log_counts[user]
+                for user in all_user_project_pairs
+            }
 
         # --- Calcul des données numériques ---
-        users_per_role_project_count = {key: len(users) for key, users in effective_users_per_role_project.items()}
-        members_per_group = defaultdict(int)
-        for groups in user_groups.values():
-            for group in groups:
-                members_per_group[group] += 1
-        direct_access_count_by_user = {user: len(perms) for user, perms in user_access.items()}
-        access_count_per_group = {group: len(perms) for group, perms in group_access.items()}
-        groups_per_user = {user: len(groups) for user, groups in user_groups.items()}
+        users_per_role_project_count = aggregates['users_per_role_project_count']
+        members_per_group = aggregates['members_per_group']
+        direct_access_count_by_user = aggregates['direct_access_count_by_user']
+        access_count_per_group = aggregates['access_count_per_group']
+        groups_per_user = aggregates['groups_per_user']
 
         numerical_summary = {
             "members_per_group": dict(sorted(members_per_group.items())),
@@ -179,14 +501,45 @@ def main():
         user_effective_access_path = os.path.join(JSON_OUTPUT_DIR, 'user_effective_access_details.json')
         
         user_groups_serializable = {user: sorted(list(groups)) for user, groups in user_groups.items()}
-        effective_access_serializable = {key: sorted(list(users)) for key, users in effective_users_per_role_project.items()}
-
-        save_json_report(user_access_path, user_access, "user direct access")
-        save_json_report(user_groups_path, user_groups_serializable, "user group membership")
-        save_json_report(group_access_path, group_access, "group access summary")
-        save_json_report(numerical_summary_path, numerical_summary, "numerical summary")
-        save_json_report(effective_access_path, effective_access_serializable, "effective access by role/project")
-        save_json_report(user_effective_access_path, dict(user_effective_access_details), "user effective access details")
+        effective_access_serializable = aggregates['effective_users']
+
+        with run_metrics.phase('save_reports'):
+            save_json_report(user_access_path, user_access, "user direct access")
+            save_json_report(user_groups_path, user_groups_serializable, "user group membership")
+            save_json_report(group_access_path, group_access, "group access summary")
+            save_json_report(numerical_summary_path, numerical_summary, "numerical summary")
+            save_json_report(effective_access_path, effective_access_serializable, "effective access by role/project")
+            save_json_report(user_effective_access_path, dict(user_effective_access_details), "user effective access details")
+            log_activity_path = os.path.join(JSON_OUTPUT_DIR, 'log_activity_by_day.json')
+            if log_activity_by_day is not None:
+                save_json_report(log_activity_path, log_activity_by_day, "daily log activity")
+            elif os.path.exists(log_activity_path):
+                # The dashboard charts this file: never leave one from an older run behind.
+                os.remove(log_activity_path)
+                print(f"Removed the stale daily log activity report '{log_activity_path}'")
+
+            if args.bundle:
+                save_bundle({
+                    'effective': effective_access_serializable,
+                    'direct': user_access,
+                    'membership': user_groups_serializable,
+                    'groupAccess': group_access,
+                    'summary': numerical_summary,
+                    'userDetails': dict(user_effective_access_details)
+                })
+            else:
+                remove_stale_bundle()
+
+        if args.analytics:
+            with run_metrics.phase('analytics'):
+                analytics = access_analytics(user_access, user_groups, group_access, args.similarity_threshold)
+                save_json_report(os.path.join(JSON_OUTPUT_DIR, 'access_analytics.json'), analytics, "access analytics")
+
+        if args.history_dir:
+            with run_metrics.phase('append_history'):
+                rows = AccessHistory(args.history_dir).append(args.snapshot_date, user_effective_access_details)
+            print(f"Successfully stored {rows} access tuples for {args.snapshot_date} in the history store '{args.history_dir}'")
+        run_metrics.report(args.run_summary)
     else:
         print("\nReport generation failed due to errors.")
 
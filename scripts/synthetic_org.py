@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Generates a synthetic organization to exercise and benchmark the pipeline.
+
+The fake org has N users, M groups with nested membership and skewed
+(Pareto-distributed) sizes, and K projects whose IAM policies grant roles
+mostly to groups, sometimes to users and service accounts. It is written as
+the files the real pipeline consumes or produces:
+
+- '<date>/<project>-<date>.json': policies, as 'gcloud projects get-iam-policy' writes them,
+- 'directory_snapshot.json': the directory, as 'directory-snapshot.py' writes it,
+- 'users.csv': the users, as expected by the audit script's '--users-csv' mode,
+- 'audit/audit_records.jsonl': the audit records matching the above.
+
+The module also provides in-memory fakes of the Admin SDK Directory service
+and of the GCS client, answering from a synthetic org, for 'benchmark.py'.
+
+Usage:
+    python synthetic_org.py --users 10000 --output-dir synthetic-org [--groups 1000] [--projects 200] [--seed 42]
+"""
+import os
+import re
+import csv
+import json
+import base64
+import random
+import hashlib
+import argparse
+import datetime
+
+# --- CONFIGURATION ---
+
+DOMAIN = 'example.com'
+SNAPSHOT_DATE = '2025-01-01'
+FIRST_NAMES = ['Alice', 'Bruno', 'Chloe', 'David', 'Emma', 'Farid', 'Gabrielle', 'Hugo', 'Ines', 'Jules',
+               'Karim', 'Lea', 'Manon', 'Nathan', 'Oceane', 'Paul', 'Quentin', 'Rose', 'Sofia', 'Theo']
+LAST_NAMES = ['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy', 'Moreau',
+              'Simon', 'Laurent', 'Lefebvre', 'Michel', 'Garcia', 'David', 'Bertrand', 'Roux', 'Vincent', 'Fournier']
+ROLES = ['roles/viewer', 'roles/editor', 'roles/owner', 'roles/browser', 'roles/storage.objectViewer',
+         'roles/storage.objectAdmin', 'roles/bigquery.dataViewer', 'roles/bigquery.user', 'roles/bigquery.dataEditor',
+         'roles/compute.viewer', 'roles/compute.instanceAdmin.v1', 'roles/logging.viewer', 'roles/monitoring.viewer',
+         'roles/iam.serviceAccountUser', 'roles/cloudsql.client', 'roles/secretmanager.secretAccessor']
+# Pareto shape of the group sizes: most groups are small, a few are very large.
+GROUP_SIZE_SHAPE = 1.2
+GROUP_SIZE_SCALE = 5
+NESTED_GROUP_RATIO = 0.2
+
+# --- GENERATOR ---
+
+def generate_org(num_users, num_groups=None, num_projects=None, seed=0):
+    """
+    Returns a synthetic org:
+    {'users': {email: {givenName, familyName}},
+     'groups': {email: {'name', 'members': [{email, type}]}},
+     'policies': {project: policy}}
+    """
+    rng = random.Random(seed)
+    num_groups = num_groups or max(1, num_users // 10)
+    num_projects = num_projects or max(1, num_users // 50)
+
+    user_emails = [f"user{i:06d}@{DOMAIN}" for i in range(num_users)]
+    users = {
+        email: {'givenName': rng.choice(FIRST_NAMES), 'familyName': f"{rng.choice(LAST_NAMES)}-{i}"}
+        for i, email in enumerate(user_emails)
+    }
+
+    # Groups only nest groups with a higher index, so the membership graph has no cycles.
+    group_emails = [f"group{i:05d}@{DOMAIN}" for i in range(num_groups)]
+    groups = {}
+    for i, email in enumerate(group_emails):
+        size = min(num_users, int(rng.paretovariate(GROUP_SIZE_SHAPE) * GROUP_SIZE_SCALE))
+        members = [{'email': user, 'type': 'USER'} for user in sorted(rng.sample(user_emails, size))]
+        if i + 1 < num_groups and rng.random() < NESTED_GROUP_RATIO:
+            children = rng.sample(group_emails[i + 1:], min(rng.randint(1, 2), num_groups - i - 1))
+            members.extend({'email': child, 'type': 'GROUP'} for child in sorted(children))
+        groups[email] = {'name': f"Group {i}", 'members': members}
+
+    policies = {}
+    for i in range(num_projects):
+        project = f"project-{i:05d}"
+        bindings = []
+        for role in sorted(rng.sample(ROLES, rng.randint(3, 8))):
+            members = {f"group:{group}" for group in rng.sample(group_emails, min(rng.randint(1, 3), num_groups))}
+            members.update(f"user:{user}" for user in rng.sample(user_emails, min(rng.randint(0, 3), num_users)))
+            if rng.random() < 0.3:
+                members.add(f"serviceAccount:sa-{rng.randint(0, 9)}@{project}.iam.gserviceaccount.com")
+            bindings.append({'members': sorted(members), 'role': role})
+        etag = base64.b64encode(hashlib.sha256(json.dumps(bindings).encode('utf-8')).digest()[:8]).decode('ascii')
+        policies[project] = {'bindings': bindings, 'etag': etag, 'version': 1}
+
+    return {'users': users, 'groups': groups, 'policies': policies}
+
+def index_grants(policies):
+    """Returns {(cache_type, identity): [{project, role}]} sorted like the SQLite IAM cache."""
+    grants = {}
+    for project, policy in policies.items():
+        for binding in policy['bindings']:
+            for member in binding['members']:
+                prefix, _, identity = member.partition(':')
+                if prefix in ('user', 'group'):
+                    grants.setdefault((prefix + 's', identity), set()).add((project, binding['role']))
+    return {key: [{'project': p, 'role': r} for p, r in sorted(values)] for key, values in grants.items()}
+
+def groups_by_member(org):
+    """Returns {member email: [groups it directly belongs to]}."""
+    index = {}
+    for group, data in sorted(org['groups'].items()):
+        for member in data['members']:
+            index.setdefault(member['email'], []).append(group)
+    return index
+
+def compute_user_groups(org):
+    """Returns {user: sorted groups}, including groups inherited through nested groups."""
+    parents = groups_by_member(org)
+    ancestors = {}
+
+    def group_ancestors(group):
+        # Parents always have a lower index: visiting groups in order keeps the recursion shallow.
+        if group not in ancestors:
+            result = {group}
+            for parent in parents.get(group, []):
+                result |= group_ancestors(parent)
+            ancestors[group] = result
+        return ancestors[group]
+
+    for group in sorted(org['groups']):
+        group_ancestors(group)
+    user_groups = {}
+    for user in org['users']:
+        closure = set()
+        for group in parents.get(user, []):
+            closure |= ancestors[group]
+        if closure:
+            user_groups[user] = sorted(closure)
+    return user_groups
+
+def build_audit_records(org, source='Source: CSV file'):
+    """Builds the records the audit script writes for every user (direct group memberships, as from the Admin SDK)."""
+    grants = index_grants(org['policies'])
+    parents = groups_by_member(org)
+    records = []
+    for user, name in org['users'].items():
+        first_name, last_name = name['givenName'], name['familyName']
+        records.append({
+            'user': user,
+            'first_name': first_name,
+            'last_name': last_name,
+            'display_name': f"{first_name} {last_name} ({user})",
+            'source': source,
+            'direct': grants.get(('users', user), []),
+            'groups': [
+                {'email': group, 'name': org['groups'][group]['name'], 'access': grants.get(('groups', group), [])}
+                for group in sorted(parents.get(user, []))
+            ]
+        })
+    return records
+
+def write_org(org, output_dir, date=SNAPSHOT_DATE):
+    """Writes the org as policy files, directory snapshot, users CSV and audit records."""
+    policy_dir = os.path.join(output_dir, date)
+    os.makedirs(policy_dir, exist_ok=True)
+    for project, policy in org['policies'].items():
+        with open(os.path.join(policy_dir, f"{project}-{date}.json"), 'w', encoding='utf-8') as f:
+            json.dump(policy, f, indent=2, sort_keys=True)
+
+    snapshot = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'users': org['users'],
+        'groups': org['groups'],
+        'user_groups': compute_user_groups(org)
+    }
+    with open(os.path.join(output_dir, 'directory_snapshot.json'), 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+
+    csv_path = os.path.join(output_dir, 'users.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['FirstName', 'LastName'])
+        writer.writerows([name['givenName'], name['familyName']] for name in org['users'].values())
+
+    audit_dir = os.path.join(output_dir, 'audit')
+    os.makedirs(audit_dir, exist_ok=True)
+    with open(os.path.join(audit_dir, 'audit_records.jsonl'), 'w', encoding='utf-8') as f:
+        for record in build_audit_records(org, f"Source: CSV file '{csv_path}'"):
+            f.write(json.dumps(record) + "\n")
+    return policy_dir
+
+# --- FAKE ADMIN SDK ---
+
+class _FakeRequest:
+    def __init__(self, service, response):
+        self.service = service
+        self.response = response
+
+    def execute(self):
+        self.service.calls += 1
+        return self.response
+
+
+class _FakeCollection:
+    def __init__(self, service, list_function):
+        self.service = service
+        self.list_function = list_function
+
+    def list(self, **kwargs):
+        return _FakeRequest(self.service, self.list_function(**kwargs))
+
+
+class FakeAdminService:
+    """
+    In-memory stand-in for the Admin SDK Directory service, answering from a
+    synthetic org. Supports the calls made by the audit and directory scripts.
+    """
+
+    QUERY_PATTERN = re.compile(r"givenName:'(?P<given>[^']*)' familyName:'(?P<family>[^']*)'")
+
+    def __init__(self, org, page_size=200):
+        self.org = org
+        self.page_size = page_size
+        self.calls = 0
+        self.emails_by_name = {}
+        for email, name in org['users'].items():
+            self.emails_by_name.setdefault((name['givenName'], name['familyName']), []).append(email)
+        self.groups_by_member = groups_by_member(org)
+
+    def _page(self, items, key, pageToken=None, maxResults=None):
+        start = int(pageToken or 0)
+        end = start + (maxResults or self.page_size)
+        page = {key: items[start:end]}
+        if end < len(items):
+            page['nextPageToken'] = str(end)
+        return page
+
+    def _list_users(self, query=None, maxResults=None, pageToken=None, **kwargs):
+        if query:
+            match = self.QUERY_PATTERN.search(query)
+            emails = self.emails_by_name.get((match.group('given'), match.group('family')), []) if match else []
+            return {'users': [{'primaryEmail': email} for email in emails[:maxResults]]}
+        users = [{'primaryEmail': email, 'name': name} for email, name in sorted(self.org['users'].items())]
+        return self._page(users, 'users', pageToken, maxResults)
+
+    def _list_groups(self, userKey=None, maxResults=None, pageToken=None, **kwargs):
+        emails = self.groups_by_member.get(userKey, []) if userKey else sorted(self.org['groups'])
+        groups = [{'email': email, 'name': self.org['groups'][email]['name']} for email in emails]
+        return self._page(groups, 'groups', pageToken, maxResults)
+
+    def _list_members(self, groupKey=None, maxResults=None, pageToken=None, **kwargs):
+        members = [dict(member, id=member['email']) for member in self.org['groups'][groupKey]['members']]
+        return self._page(members, 'members', pageToken, maxResults)
+
+    def users(self):
+        return _FakeCollection(self, self._list_users)
+
+    def groups(self):
+        return _FakeCollection(self, self._list_groups)
+
+    def members(self):
+        return _FakeCollection(self, self._list_members)
+
+# --- FAKE GCS ---
+
+class _FakeBlob:
+    def __init__(self, client, name, generation):
+        self.client = client
+        self.name = name
+        self.generation = generation
+
+    def download_as_bytes(self, **kwargs):
+        self.client.downloads += 1
+        return self.client.objects[self.name]
+
+
+class _FakeBucket:
+    def __init__(self, client):
+        self.client = client
+
+    def list_blobs(self, **kwargs):
+        return [_FakeBlob(self.client, name, generation) for name, generation in self.client.generations.items()]
+
+    def blob(self, name, generation=None):
+        return _FakeBlob(self.client, name, generation)
+
+
+class FakeStorageClient:
+    """In-memory stand-in for a GCS client with a single bucket."""
+
+    def __init__(self):
+        self.objects = {}
+        self.generations = {}
+        self.downloads = 0
+
+    def put(self, name, data):
+        self.objects[name] = data
+        self.generations[name] = self.generations.get(name, 0) + 1
+
+    def bucket(self, name):
+        return _FakeBucket(self)
+
+# --- SCRIPT LOGIC ---
+
+def main():
+    """Main function to generate a synthetic org."""
+    parser = argparse.ArgumentParser(description='Generate a synthetic organization for tests and benchmarks.')
+    parser.add_argument("--users", type=int, required=True, help="Number of users.")
+    parser.add_argument("--groups", type=int, help="Number of groups (default: users / 10).")
+    parser.add_argument("--projects", type=int, help="Number of projects (default: users / 50).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    parser.add_argument("--output-dir", required=True, help="Directory in which the org files are written.")
+    args = parser.parse_args()
+
+    org = generate_org(args.users, args.groups, args.projects, args.seed)
+    policy_dir = write_org(org, args.output_dir)
+    print(f"Generated {len(org['users'])} users, {len(org['groups'])} groups and {len(org['policies'])} projects.")
+    print(f"Policies written to '{policy_dir}', directory and audit files to '{args.output_dir}'.")
+
+if __name__ == '__main__':
+    main()
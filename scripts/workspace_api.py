@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the Google Workspace Admin SDK (Directory API).
+
+Used by 'gdpr-access-audit-local-json.py' and 'directory-snapshot.py' to build
+the service object, retry quota and server errors, and fan requests out over a
+bounded thread pool. Also holds the small helpers the scripts share, such as
+the atomic file replacement 'summary.py' uses for its reports.
+"""
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import google.auth
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from run_metrics import run_metrics
+
+# --- CONFIGURATION ---
+
+SCOPES = [
+    'https://www.googleapis.com/auth/admin.directory.user.readonly',
+    'https://www.googleapis.com/auth/admin.directory.group.readonly',
+    'https://www.googleapis.com/auth/admin.directory.group.member.readonly',
+]
+
+# Retry policy for quota (429, rate-limit 403) and server (5xx) errors.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded'}
+DEFAULT_MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 64.0
+
+USERS_PAGE_SIZE = 500    # Maximum allowed by users().list
+GROUPS_PAGE_SIZE = 200   # Maximum allowed by groups().list
+MEMBERS_PAGE_SIZE = 200  # Maximum allowed by members().list
+
+# httplib2 (used by googleapiclient) is not thread-safe, so each worker thread
+# gets its own service object.
+_thread_local = threading.local()
+
+# --- HELPERS ---
+
+def replace_file(path, write):
+    """
+    Writes `path` through a temporary file renamed over it, so that a crash
+    never leaves a truncated file behind, and readers (e.g. 'summary.py', or
+    the app watching the local json/ directory) never see a partial one.
+    """
+    temp_path = path + '.tmp'
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+class WorkspaceServiceError(RuntimeError):
+    """Raised when a worker thread could not build its Workspace service object."""
+
+
+def get_gws_service():
+    """Builds the Google Workspace Admin SDK service object."""
+    try:
+        creds, _ = google.auth.default(scopes=SCOPES)
+        service = build('admin', 'directory_v1', credentials=creds)
+        return service
+    except Exception as e:
+        print(f"ERROR: Could not build Google Workspace service: {e}")
+        return None
+
+def get_thread_gws_service():
+    """
+    Returns a Workspace service object private to the calling thread. It is
+    built once per thread: if that fails, every call raises WorkspaceServiceError.
+    """
+    if not hasattr(_thread_local, 'service'):
+        _thread_local.service = get_gws_service()
+    if _thread_local.service is None:
+        raise WorkspaceServiceError("A worker thread could not build its Google Workspace service (see the error above).")
+    return _thread_local.service
+
+def is_rate_limited(error):
+    """Tells whether an HttpError is a quota error (429, or 403 with a rate-limit reason)."""
+    status = error.resp.status
+    if status == 429:
+        return True
+    if status == 403:
+        try:
+            details = json.loads(error.content.decode('utf-8')).get('error', {}).get('errors', [])
+        except (ValueError, AttributeError):
+            return False
+        return any(d.get('reason') in RATE_LIMIT_REASONS for d in details)
+    return False
+
+def is_retryable(error):
+    """Tells whether an HttpError is a quota or transient server error worth retrying."""
+    return error.resp.status in RETRYABLE_STATUS_CODES or is_rate_limited(error)
+
+def execute_with_backoff(request, max_retries=DEFAULT_MAX_RETRIES):
+    """Executes an API request, retrying quota and 5xx errors with exponential backoff and jitter."""
+    for attempt in range(max_retries + 1):
+        run_metrics.increment('api_calls')
+        try:
+            return request.execute()
+        except HttpError as error:
+            if is_rate_limited(error):
+                run_metrics.increment('api_throttled')
+            if attempt == max_retries or not is_retryable(error):
+                run_metrics.increment('api_errors')
+                raise
+            run_metrics.increment('api_retries')
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) + random.uniform(0, 1)
+            print(f"  WARNING: API returned {error.resp.status}, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries}).")
+            time.sleep(delay)
+
+def map_with_service(func, items, service, workers):
+    """
+    Calls func(service, item) for every item and returns the results in input order.
+
+    With more than one worker, the calls run on a bounded thread pool and each
+    thread uses its own service object. Raises WorkspaceServiceError if a
+    thread could not build it.
+    """
+    if workers <= 1:
+        return [func(service, item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda item: func(get_thread_gws_service(), item), items))
+
+def list_all_pages(request_factory, item_key):
+    """Follows nextPageToken until the listing is exhausted and returns all items."""
+    items = []
+    page_token = None
+    while True:
+        results = execute_with_backoff(request_factory(page_token))
+        items.extend(results.get(item_key, []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return items
@@ -1,167 +1,315 @@
-let allData = {};
+const PAGE_SIZE = 200;
+const FILTER_DEBOUNCE_MS = 200;
+// Rows rendered above and below the visible window of a virtual list.
+const VIRTUAL_OVERSCAN = 10;
+const TABLE_ROW_HEIGHT = 48;
+const LIST_ROW_HEIGHT = 36;
+const MEMBER_ROW_HEIGHT = 24;
+const ACTIVITY_CHART_HEIGHT = 80;
 
-async function initialize() {
-    try {
-        const response = await fetch('/api/data');
-        if (!response.ok) throw new Error('Network response was not ok.');
-        allData = await response.json();
-        
-        // Déclenche l'initialisation spécifique à la page si elle existe
-        const page = document.body.dataset.page;
-        if (page === 'effective-access') setupEffectiveAccess();
-        if (page === 'by-user') setupUserView();
-        if (page === 'by-group') setupGroupView();
-        if (page === 'user-details') setupUserDetailsView();
+async function fetchJson(url) {
+    const response = await fetch(url);
+    if (!response.ok) throw new Error(`Request to ${url} failed with status ${response.status}.`);
+    return response.json();
+}
 
-    } catch (error) {
-        console.error('Failed to load data:', error);
-        alert("Error loading data from the API. Make sure the 'json' directory and its files exist, and the Flask app is running correctly.");
+function initialize() {
+    // Déclenche l'initialisation spécifique à la page si elle existe
+    const page = document.body.dataset.page;
+    if (page === 'effective-access') setupEffectiveAccess();
+    if (page === 'by-user') setupUserView();
+    if (page === 'by-group') setupGroupView();
+    if (page === 'user-details') setupUserDetailsView();
+    if (page === 'analytics') setupAnalyticsView();
+}
+
+function debounce(fn, delay) {
+    let timer = null;
+    return (...args) => {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn(...args), delay);
+    };
+}
+
+function escapeHtml(value) {
+    return String(value).replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[c]));
+}
+
+function showLoadError(error) {
+    console.error('Failed to load data:', error);
+    alert("Error loading data from the API. Make sure the 'json' directory and its files exist, and the Flask app is running correctly.");
+}
+
+/**
+ * Loads a paginated, server-side filtered collection (/api/users, /api/groups, /api/effective).
+ * Only the latest filter's responses are rendered, so fast typing cannot show stale results.
+ * `onPage(items, total, reset)` receives every item loaded so far.
+ */
+function createPagedLoader(endpoint, onPage) {
+    const state = { filter: '', items: [], total: 0, requestId: 0, loading: false };
+
+    async function load(reset) {
+        if (!reset && (state.loading || state.items.length >= state.total)) return;
+        const requestId = reset ? ++state.requestId : state.requestId;
+        const offset = reset ? 0 : state.items.length;
+        const params = new URLSearchParams({ filter: state.filter, offset, limit: PAGE_SIZE });
+        state.loading = true;
+        try {
+            const page = await fetchJson(`${endpoint}?${params}`);
+            if (requestId !== state.requestId) return;
+            state.items = reset ? page.items : state.items.concat(page.items);
+            state.total = page.total;
+            onPage(state.items, state.total, reset);
+        } catch (error) {
+            showLoadError(error);
+        } finally {
+            if (requestId === state.requestId) state.loading = false;
+        }
     }
+
+    return {
+        setFilter(filter) { state.filter = filter; return load(true); },
+        loadMore() { return load(false); },
+    };
 }
 
-function setupEffectiveAccess() {
-    renderEffectiveAccess(allData.effective);
-    document.getElementById('filter-input').addEventListener('input', (e) => {
-        renderEffectiveAccess(allData.effective, e.target.value);
-    });
+/**
+ * Loads a whole server-side filtered collection from an NDJSON stream (/api/stream/...).
+ * Rows are handed to `onItems(items, total, reset)` as each chunk arrives, so the first
+ * rows show up before the rest of the response is downloaded. Same interface as
+ * createPagedLoader; a new filter aborts the stream of the previous one.
+ */
+function createStreamLoader(endpoint, onItems) {
+    let controller = null;
+
+    async function load(filter) {
+        if (controller) controller.abort();
+        const current = controller = new AbortController();
+        const url = `${endpoint}?${new URLSearchParams({ filter })}`;
+        const items = [];
+        let reset = true;
+        try {
+            const response = await fetch(url, { signal: current.signal });
+            if (!response.ok) throw new Error(`Request to ${url} failed with status ${response.status}.`);
+            const total = Number(response.headers.get('X-Total-Count'));
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let pending = '';
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                const lines = (pending + value).split('\n');
+                pending = lines.pop();
+                for (const line of lines) {
+                    if (line) items.push(JSON.parse(line));
+                }
+                onItems(items, total, reset);
+                reset = false;
+            }
+            if (reset) onItems(items, total, reset);
+        } catch (error) {
+            if (error.name !== 'AbortError') showLoadError(error);
+        }
+    }
+
+    return {
+        setFilter: load,
+        // Everything is loaded by the stream.
+        loadMore() {},
+    };
 }
 
-function renderEffectiveAccess(data, filter = '') {
-    const tableBody = document.getElementById('data-table');
-    let html = '';
-    const lowerFilter = filter.toLowerCase();
-    Object.entries(data).forEach(([key, users]) => {
-        const [role, project] = key.split('@');
-        const userList = users.join(', ');
-        if (role.toLowerCase().includes(lowerFilter) || project.toLowerCase().includes(lowerFilter) || userList.toLowerCase().includes(lowerFilter)) {
-            html += `<tr><td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-slate-900">${role}</td><td class="px-6 py-4 whitespace-nowrap text-sm text-slate-500">${project}</td><td class="px-6 py-4 text-sm text-slate-500">${userList}</td></tr>`;
+/**
+ * Windowed renderer: only the rows visible in `viewport` (plus VIRTUAL_OVERSCAN
+ * rows on each side) are in the DOM. Rows have a fixed height, and two spacers
+ * stand in for the rows above and below the window so the scrollbar stays
+ * accurate. `onNearEnd` is called when the window reaches the last loaded rows.
+ */
+function createVirtualList({ viewport, container, rowHeight, renderRow, renderSpacer, emptyHtml, onNearEnd }) {
+    let items = [];
+    let frame = null;
+
+    function render() {
+        frame = null;
+        if (items.length === 0) {
+            container.innerHTML = emptyHtml;
+            return;
         }
+        const first = Math.max(0, Math.floor(viewport.scrollTop / rowHeight) - VIRTUAL_OVERSCAN);
+        const last = Math.min(items.length, first + Math.ceil(viewport.clientHeight / rowHeight) + 2 * VIRTUAL_OVERSCAN);
+        container.innerHTML = renderSpacer(first * rowHeight)
+            + items.slice(first, last).map(renderRow).join('')
+            + renderSpacer((items.length - last) * rowHeight);
+        if (onNearEnd && last >= items.length - VIRTUAL_OVERSCAN) onNearEnd();
+    }
+
+    function schedule() {
+        if (frame === null) frame = requestAnimationFrame(render);
+    }
+
+    viewport.addEventListener('scroll', schedule, { passive: true });
+    new ResizeObserver(schedule).observe(viewport);
+    return {
+        setItems(newItems, reset) {
+            items = newItems;
+            if (reset) viewport.scrollTop = 0;
+            schedule();
+        },
+        refresh: schedule,
+    };
+}
+
+function divSpacer(height) {
+    return height > 0 ? `<div style="height: ${height}px"></div>` : '';
+}
+
+function setupEffectiveAccess() {
+    const list = createVirtualList({
+        viewport: document.getElementById('data-table-viewport'),
+        container: document.getElementById('data-table'),
+        rowHeight: TABLE_ROW_HEIGHT,
+        renderRow: ({ role, project, users }) => {
+            const usersText = escapeHtml(users.join(', '));
+            return `<tr style="height: ${TABLE_ROW_HEIGHT}px"><td class="px-6 whitespace-nowrap text-sm font-medium text-slate-900">${escapeHtml(role)}</td><td class="px-6 whitespace-nowrap text-sm text-slate-500">${escapeHtml(project)}</td><td class="px-6 max-w-0 w-1/2 truncate text-sm text-slate-500" title="${usersText}"><span class="text-xs text-slate-400 mr-1">(${users.length})</span>${usersText}</td></tr>`;
+        },
+        renderSpacer: height => height > 0 ? `<tr style="height: ${height}px"><td colspan="3"></td></tr>` : '',
+        emptyHtml: '<tr><td colspan="3" class="text-center py-4">No results found.</td></tr>',
     });
-    tableBody.innerHTML = html || '<tr><td colspan="3" class="text-center py-4">No results found.</td></tr>';
+    const loader = createStreamLoader('/api/stream/effective', (rows, total, reset) => list.setItems(rows, reset));
+    loader.setFilter('');
+    document.getElementById('filter-input').addEventListener('input', debounce((e) => {
+        loader.setFilter(e.target.value);
+    }, FILTER_DEBOUNCE_MS));
 }
 
-function setupUserView() {
-    const userFilterInput = document.getElementById('user-filter');
-    const allUsers = Object.keys(allData.membership).sort();
-    renderUserList(allUsers);
-    userFilterInput.addEventListener('input', () => {
-        const filter = userFilterInput.value.toLowerCase();
-        const filteredUsers = allUsers.filter(user => user.toLowerCase().includes(filter));
-        renderUserList(filteredUsers);
+/**
+ * Wires a filterable list of users or groups to its details panel.
+ */
+function setupListView({ endpoint, filterInputId, containerId, itemClass, emptyText, onSelect }) {
+    const filterInput = document.getElementById(filterInputId);
+    const container = document.getElementById(containerId);
+    // The selection is kept outside the DOM: rows are re-created as the list scrolls.
+    let selectedKey = null;
+    const list = createVirtualList({
+        viewport: container,
+        container,
+        rowHeight: LIST_ROW_HEIGHT,
+        renderRow: item => `<button data-key="${escapeHtml(item)}" style="height: ${LIST_ROW_HEIGHT}px" class="${itemClass} ${item === selectedKey ? 'item-active' : ''} block w-full text-left px-2 text-sm truncate rounded-md hover:bg-indigo-100">${escapeHtml(item)}</button>`,
+        renderSpacer: divSpacer,
+        emptyHtml: `<p class="p-2 text-sm text-slate-500">${emptyText}</p>`,
+        onNearEnd: () => loader.loadMore(),
     });
-    document.getElementById('user-list-container').addEventListener('click', (e) => {
-        const targetButton = e.target.closest('button.user-item');
+    const loader = createPagedLoader(endpoint, (items, total, reset) => list.setItems(items, reset));
+    loader.setFilter('');
+    filterInput.addEventListener('input', debounce(() => loader.setFilter(filterInput.value), FILTER_DEBOUNCE_MS));
+    container.addEventListener('click', (e) => {
+        const targetButton = e.target.closest(`button.${itemClass}`);
         if (targetButton) {
-            const userEmail = targetButton.dataset.user;
-            renderUserDetails(userEmail);
-            document.querySelectorAll('.user-item').forEach(item => item.classList.remove('item-active'));
+            selectedKey = targetButton.dataset.key;
+            onSelect(selectedKey);
+            container.querySelectorAll(`.${itemClass}`).forEach(item => item.classList.remove('item-active'));
             targetButton.classList.add('item-active');
         }
     });
 }
 
-function renderUserList(users) {
-    const userListContainer = document.getElementById('user-list-container');
-    userListContainer.innerHTML = users.length ? users.map(user => `<button data-user="${user}" class="user-item block w-full text-left p-2 text-sm rounded-md hover:bg-indigo-100">${user}</button>`).join('') : '<p class="p-2 text-sm text-slate-500">No users found.</p>';
+function setupUserView() {
+    setupListView({
+        endpoint: '/api/users',
+        filterInputId: 'user-filter',
+        containerId: 'user-list-container',
+        itemClass: 'user-item',
+        emptyText: 'No users found.',
+        onSelect: async (user) => {
+            try {
+                renderUserDetails(await fetchJson(`/api/users/${encodeURIComponent(user)}`));
+            } catch (error) {
+                showLoadError(error);
+            }
+        },
+    });
 }
 
-function renderUserDetails(user) {
+function renderUserDetails(details) {
     const container = document.getElementById('user-details-container');
     let directHtml = '<li>No direct access found.</li>';
-    if (allData.direct[user] && allData.direct[user].length > 0) {
-        directHtml = allData.direct[user].map(p => `<li><span class="font-semibold">${p.role}</span> on <span class="text-indigo-600">${p.project}</span></li>`).join('');
+    if (details.direct.length > 0) {
+        directHtml = details.direct.map(p => `<li><span class="font-semibold">${p.role}</span> on <span class="text-indigo-600">${p.project}</span></li>`).join('');
     }
     let groupsHtml = '<li>Not a member of any groups.</li>';
-    if (allData.membership[user] && allData.membership[user].length > 0) {
-        groupsHtml = allData.membership[user].map(g => `<li>${g}</li>`).join('');
+    if (details.groups.length > 0) {
+        groupsHtml = details.groups.map(g => `<li>${g}</li>`).join('');
     }
-    container.innerHTML = `<div class="p-4 border rounded-lg bg-white"><h3 class="text-lg font-semibold text-slate-900">${user}</h3><div class="mt-4 grid grid-cols-1 md:grid-cols-2 gap-6"><div><h4 class="font-medium text-slate-700">Direct Access</h4><ul class="mt-2 list-disc list-inside text-sm text-slate-600 space-y-1">${directHtml}</ul></div><div><h4 class="font-medium text-slate-700">Group Memberships</h4><ul class="mt-2 list-disc list-inside text-sm text-slate-600 space-y-1">${groupsHtml}</ul></div></div></div>`;
+    container.innerHTML = `<div class="p-4 border rounded-lg bg-white"><h3 class="text-lg font-semibold text-slate-900">${details.email}</h3><div class="mt-4 grid grid-cols-1 md:grid-cols-2 gap-6"><div><h4 class="font-medium text-slate-700">Direct Access</h4><ul class="mt-2 list-disc list-inside text-sm text-slate-600 space-y-1">${directHtml}</ul></div><div><h4 class="font-medium text-slate-700">Group Memberships</h4><ul class="mt-2 list-disc list-inside text-sm text-slate-600 space-y-1">${groupsHtml}</ul></div></div></div>`;
 }
 
 function setupGroupView() {
-    const groupFilterInput = document.getElementById('group-filter');
-    const allGroups = Object.keys(allData.groupAccess).sort();
-    renderGroupList(allGroups);
-    groupFilterInput.addEventListener('input', () => {
-        const filter = groupFilterInput.value.toLowerCase();
-        const filteredGroups = allGroups.filter(group => group.toLowerCase().includes(filter));
-        renderGroupList(filteredGroups);
-    });
-    document.getElementById('group-list-container').addEventListener('click', (e) => {
-        const targetButton = e.target.closest('button.group-item');
-        if (targetButton) {
-            const groupEmail = targetButton.dataset.group;
-            renderGroupDetails(groupEmail);
-            document.querySelectorAll('.group-item').forEach(item => item.classList.remove('item-active'));
-            targetButton.classList.add('item-active');
-        }
+    setupListView({
+        endpoint: '/api/groups',
+        filterInputId: 'group-filter',
+        containerId: 'group-list-container',
+        itemClass: 'group-item',
+        emptyText: 'No groups found.',
+        onSelect: async (group) => {
+            try {
+                renderGroupDetails(await fetchJson(`/api/groups/${encodeURIComponent(group)}`));
+            } catch (error) {
+                showLoadError(error);
+            }
+        },
     });
 }
 
-function renderGroupList(groups) {
-    const groupListContainer = document.getElementById('group-list-container');
-    groupListContainer.innerHTML = groups.length ? groups.map(group => `<button data-group="${group}" class="group-item block w-full text-left p-2 text-sm rounded-md hover:bg-indigo-100">${group}</button>`).join('') : '<p class="p-2 text-sm text-slate-500">No groups found.</p>';
-}
-
-function renderGroupDetails(group) {
+function renderGroupDetails(details) {
     const container = document.getElementById('group-details-container');
-    const { groupAccess, membership } = allData;
-    const membersByGroup = {};
-    Object.entries(membership).forEach(([user, groups]) => {
-        groups.forEach(g => {
-            if (!membersByGroup[g]) membersByGroup[g] = [];
-            membersByGroup[g].push(user);
-        });
-    });
     let accessHtml = '<li>No GCP access found.</li>';
-    if (groupAccess[group] && groupAccess[group].length > 0) {
-        accessHtml = groupAccess[group].map(p => `<li><span class="font-semibold">${p.role}</span> on <span class="text-indigo-600">${p.project}</span></li>`).join('');
-    }
-    let membersHtml = '<li>No members found.</li>';
-    if (membersByGroup[group] && membersByGroup[group].length > 0) {
-        membersHtml = membersByGroup[group].map(m => `<li>${m}</li>`).join('');
+    if (details.access.length > 0) {
+        accessHtml = details.access.map(p => `<li><span class="font-semibold">${p.role}</span> on <span class="text-indigo-600">${p.project}</span></li>`).join('');
     }
-    container.innerHTML = `<div class="p-4 border rounded-lg bg-white"><h3 class="text-lg font-semibold text-slate-900">${group}</h3><div class="mt-4 grid grid-cols-1 md:grid-cols-2 gap-6"><div><h4 class="font-medium text-slate-700">GCP Access</h4><ul class="mt-2 list-disc list-inside text-sm text-slate-600 space-y-1">${accessHtml}</ul></div><div><h4 class="font-medium text-slate-700">Members</h4><ul class="mt-2 list-disc list-inside text-sm text-slate-600 space-y-1">${membersHtml}</ul></div></div></div>`;
+    container.innerHTML = `<div class="p-4 border rounded-lg bg-white"><h3 class="text-lg font-semibold text-slate-900">${details.email}</h3><div class="mt-4 grid grid-cols-1 md:grid-cols-2 gap-6"><div><h4 class="font-medium text-slate-700">GCP Access</h4><ul class="mt-2 list-disc list-inside text-sm text-slate-600 space-y-1">${accessHtml}</ul></div><div><h4 class="font-medium text-slate-700">Members (${details.members.length})</h4><ul id="group-members" class="mt-2 max-h-96 overflow-y-auto list-disc list-inside text-sm text-slate-600"></ul></div></div></div>`;
+
+    // Large groups can have thousands of members: only the visible ones are rendered.
+    const membersList = document.getElementById('group-members');
+    createVirtualList({
+        viewport: membersList,
+        container: membersList,
+        rowHeight: MEMBER_ROW_HEIGHT,
+        renderRow: m => `<li style="height: ${MEMBER_ROW_HEIGHT}px" class="truncate">${escapeHtml(m)}</li>`,
+        renderSpacer: height => height > 0 ? `<li style="height: ${height}px" class="list-none"></li>` : '',
+        emptyHtml: '<li>No members found.</li>',
+    }).setItems(details.members, true);
 }
 
 function setupUserDetailsView() {
-    const userFilterInput = document.getElementById('user-filter');
-    const allUsers = Object.keys(allData.userDetails).sort();
-    renderUserListForDetails(allUsers);
-    userFilterInput.addEventListener('input', () => {
-        const filter = userFilterInput.value.toLowerCase();
-        const filteredUsers = allUsers.filter(user => user.toLowerCase().includes(filter));
-        renderUserListForDetails(filteredUsers);
-    });
-    document.getElementById('user-list-container').addEventListener('click', (e) => {
-        const targetButton = e.target.closest('button.user-item');
-        if (targetButton) {
-            const userEmail = targetButton.dataset.user;
-            renderEffectiveUserDetails(userEmail);
-            document.querySelectorAll('.user-item').forEach(item => item.classList.remove('item-active'));
-            targetButton.classList.add('item-active');
-        }
+    setupListView({
+        endpoint: '/api/users',
+        filterInputId: 'user-filter',
+        containerId: 'user-list-container',
+        itemClass: 'user-item',
+        emptyText: 'No users found.',
+        onSelect: async (user) => {
+            try {
+                renderEffectiveUserDetails(await fetchJson(`/api/users/${encodeURIComponent(user)}`));
+            } catch (error) {
+                showLoadError(error);
+            }
+        },
     });
 }
 
-function renderUserListForDetails(users) {
-    const userListContainer = document.getElementById('user-list-container');
-    userListContainer.innerHTML = users.length ? users.map(user => `<button data-user="${user}" class="user-item block w-full text-left p-2 text-sm rounded-md hover:bg-indigo-100">${user}</button>`).join('') : '<p class="p-2 text-sm text-slate-500">No users found.</p>';
-}
-
-function renderEffectiveUserDetails(user) {
+function renderEffectiveUserDetails(details) {
     const container = document.getElementById('user-details-container');
+    const user = details.email;
     let detailsHtml = '<li class="text-slate-500">No effective access details found.</li>';
     let logLinksHtml = '<li class="text-slate-500">No projects with access found.</li>';
 
-    if (allData.userDetails[user] && allData.userDetails[user].length > 0) {
-        const userPermissions = allData.userDetails[user];
+    if (details.effective.length > 0) {
+        const userPermissions = details.effective;
         const cursorTimestamp = new Date().toISOString();
-        
+
         detailsHtml = userPermissions.map(p => {
             return `<li class="py-2 border-b border-slate-100">
-                        <span class="font-semibold">${p.role}</span> on 
-                        <span class="text-indigo-600">${p.project}</span> 
+                        <span class="font-semibold">${p.role}</span> on
+                        <span class="text-indigo-600">${p.project}</span>
                         <br>
                         <span class="text-xs text-slate-500">(Source: ${p.source})</span>
                     </li>`;
@@ -174,11 +322,9 @@ function renderEffectiveUserDetails(user) {
                 const logQuery = `protoPayload.authenticationInfo.principalEmail="${user}"`;
                 const encodedQuery = encodeURIComponent(logQuery);
                 const logUrl = `https://console.cloud.google.com/logs/query;query=${encodedQuery};cursorTimestamp=${cursorTimestamp};duration=P30D?project=${project}`;
-                
-                // Récupère le nombre de logs depuis les nouvelles données
-                const logCounts = allData.summary.log_counts_by_user || {};
-                const userLogData = logCounts[user] || {};
-                const count = userLogData[project];
+
+                // Récupère le nombre de logs renvoyé avec le détail de l'utilisateur
+                const count = details.logCounts[project];
                 let countText = '(N/A requests)';
                 if (typeof count === 'number' && count >= 0) {
                     countText = `(${count} requests)`;
@@ -211,7 +357,117 @@ function renderEffectiveUserDetails(user) {
                                        <ul class="mt-2 text-sm text-slate-600">${logLinksHtml}</ul>
                                    </div>
                                </div>
+                               <div id="user-activity" data-user="${escapeHtml(user)}" class="mt-6"></div>
                            </div>`;
+    loadUserActivity(user);
+}
+
+/**
+ * Charts the daily log entries of a user, summed over their projects. The
+ * series only exist when `summary.py` ran with `--log-store`: otherwise the
+ * API answers 404 and the chart is left out.
+ */
+async function loadUserActivity(user) {
+    let activity;
+    try {
+        const response = await fetch(`/api/users/${encodeURIComponent(user)}/activity`);
+        if (!response.ok) return;
+        activity = await response.json();
+    } catch (error) {
+        console.error('Failed to load the log activity:', error);
+        return;
+    }
+    const container = document.getElementById('user-activity');
+    // Another user may have been selected in the meantime.
+    if (!container || container.dataset.user !== user) return;
+    container.innerHTML = `<h4 class="font-medium text-slate-700">Daily Log Activity</h4>${renderActivityChart(activity)}`;
+}
+
+function renderActivityChart({ days, projects }) {
+    if (days.length === 0) return '<p class="mt-2 text-sm text-slate-500">No log entries in the counting window.</p>';
+    // Continuous day axis, so that days without entries show as gaps.
+    const axis = [];
+    const last = new Date(`${days[days.length - 1]}T00:00:00Z`);
+    for (const day = new Date(`${days[0]}T00:00:00Z`); day <= last; day.setUTCDate(day.getUTCDate() + 1)) {
+        axis.push(day.toISOString().slice(0, 10));
+    }
+    const series = Object.values(projects);
+    const totals = axis.map(day => series.reduce((sum, counts) => sum + (counts[day] || 0), 0));
+    const max = Math.max(1, ...totals);
+    const bars = totals.map((total, i) => {
+        const height = total / max * ACTIVITY_CHART_HEIGHT;
+        return `<rect x="${i + 0.1}" y="${ACTIVITY_CHART_HEIGHT - height}" width="0.8" height="${height}" class="fill-indigo-500"><title>${axis[i]}: ${total} requests</title></rect>`;
+    }).join('');
+    return `<svg viewBox="0 0 ${axis.length} ${ACTIVITY_CHART_HEIGHT}" preserveAspectRatio="none" class="mt-2 w-full bg-slate-50 rounded" style="height: ${ACTIVITY_CHART_HEIGHT}px">${bars}</svg>
+            <div class="flex justify-between text-xs text-slate-500 mt-1"><span>${axis[0]}</span><span>${totals.reduce((a, b) => a + b, 0)} requests</span><span>${axis[axis.length - 1]}</span></div>`;
+}
+
+// Columns of each /api/analytics/<section> list.
+const ANALYTICS_SECTIONS = {
+    'redundant-grants': {
+        headers: ['User', 'Direct Grant', 'Also Granted Through'],
+        cells: g => [g.user, `${g.role} on ${g.project}`, g.covered_by.join(', ')],
+    },
+    'similar-groups': {
+        headers: ['Groups', 'Similarity', 'Differences'],
+        cells: p => [
+            p.groups.join(' / '),
+            `${Math.round(p.similarity * 100)}% (${p.shared} shared)`,
+            [`${p.groups[0]} only: ${p.only_first.join(', ') || '-'}`, `${p.groups[1]} only: ${p.only_second.join(', ') || '-'}`].join('; '),
+        ],
+    },
+    'identical-profiles': {
+        headers: ['Users', 'Grants', 'Access'],
+        cells: p => [`(${p.users.length}) ${p.users.join(', ')}`, p.access.length, p.access.join(', ')],
+    },
+};
+
+async function setupAnalyticsView() {
+    const summaryContainer = document.getElementById('analytics-summary');
+    let summary;
+    try {
+        summary = await fetchJson('/api/analytics');
+    } catch (error) {
+        summaryContainer.innerHTML = `<p class="text-slate-500">Analytics are not available. Run summary.py with --analytics.</p>`;
+        return;
+    }
+    summaryContainer.innerHTML = `${summary.redundant_direct_grants} direct grants (${summary.users_with_redundant_grants} users) are also granted through a group,
+        ${summary.similar_group_pairs} pairs of groups have at least ${Math.round(summary.similarity_threshold * 100)}% of their grants in common,
+        and ${summary.users_in_identical_profiles} users share ${summary.identical_profiles} identical access profiles.`;
+
+    const head = document.getElementById('analytics-table-head');
+    const filterInput = document.getElementById('analytics-filter');
+    const tabs = document.querySelectorAll('.analytics-tab');
+    let section = null;
+    let loader = null;
+    const list = createVirtualList({
+        viewport: document.getElementById('analytics-table-viewport'),
+        container: document.getElementById('analytics-table'),
+        rowHeight: TABLE_ROW_HEIGHT,
+        renderRow: item => `<tr style="height: ${TABLE_ROW_HEIGHT}px">${ANALYTICS_SECTIONS[section].cells(item).map(cell => {
+            const text = escapeHtml(cell);
+            return `<td class="px-6 max-w-0 truncate text-sm text-slate-600" title="${text}">${text}</td>`;
+        }).join('')}</tr>`,
+        renderSpacer: height => height > 0 ? `<tr style="height: ${height}px"><td colspan="3"></td></tr>` : '',
+        emptyHtml: '<tr><td colspan="3" class="text-center py-4">No results found.</td></tr>',
+        onNearEnd: () => loader && loader.loadMore(),
+    });
+
+    function showSection(name) {
+        section = name;
+        head.innerHTML = ANALYTICS_SECTIONS[name].headers
+            .map(h => `<th class="px-6 py-3 text-left text-xs font-medium text-slate-500 uppercase tracking-wider">${h}</th>`).join('');
+        tabs.forEach(tab => tab.classList.toggle('item-active', tab.dataset.section === name));
+        // Pages of a previous section that arrive late are dropped.
+        loader = createPagedLoader(`/api/analytics/${name}`, (items, total, reset) => {
+            if (section === name) list.setItems(items, reset);
+        });
+        loader.setFilter(filterInput.value);
+    }
+
+    tabs.forEach(tab => tab.addEventListener('click', () => showSection(tab.dataset.section)));
+    filterInput.addEventListener('input', debounce(() => loader.setFilter(filterInput.value), FILTER_DEBOUNCE_MS));
+    showSection('redundant-grants');
 }
 
 document.addEventListener('DOMContentLoaded', initialize);